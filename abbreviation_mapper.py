@@ -1,5 +1,9 @@
 from colorama import Fore
 from normalization_utils import normalize_text
+from metrics import verbose_print
+from collections import Counter, deque
+from functools import lru_cache
+import threading
 
 # Morphology abbreviations
 MORPH_ABBREVIATIONS = {
@@ -54,27 +58,104 @@ POS_ABBREVIATIONS = {
     "subordonnant": "sub"
 }
 
+# Normalizer for incoming labels, memoized because the same few labels repeat on every page
+normalize_label = lru_cache(maxsize=4096)(normalize_text)
+
+# Resolver mapping a full label to its abbreviation with a single hash lookup
+class AbbreviationResolver:
+    def __init__(self, abbreviations):
+        # Dictionary keys are normalized once, when the resolver is built
+        self.table = {normalize_text(full_label): abbrev for full_label, abbrev in abbreviations.items()}
+
+    # Function to return the abbreviation of a label (None if unknown)
+    def resolve(self, label):
+        return self.table.get(normalize_label(label))
+
+MORPH_RESOLVER = AbbreviationResolver(MORPH_ABBREVIATIONS)
+POS_RESOLVER = AbbreviationResolver(POS_ABBREVIATIONS)
+
+# Thread-safe counter of the labels that have no abbreviation. Worker threads only append to a deque
+# (atomic, no lock); the records are folded into the counts when they are read.
+class UnmatchedAbbreviations:
+    def __init__(self, max_examples=10):
+        self.lock = threading.Lock()
+        self.pending = deque()
+        self.counts = Counter()
+        self.examples = {}
+        self.max_examples = max_examples
+
+    # Function to count an unmatched label, keeping a few example session IDs
+    def record(self, kind, label, session_id):
+        self.pending.append((kind, label, session_id))
+
+    # Function to fold the pending records into the counts (call with the lock held)
+    def fold(self):
+        while self.pending:
+            kind, label, session_id = self.pending.popleft()
+            key = (kind, label)
+            self.counts[key] += 1
+            examples = self.examples.setdefault(key, [])
+            if len(examples) < self.max_examples:
+                examples.append(session_id)
+
+    # Function to get the number of occurrences of each (kind, label)
+    def totals(self):
+        with self.lock:
+            self.fold()
+            return dict(self.counts)
+
+    # Function to add the counts collected elsewhere (e.g. in a worker process)
+    def merge(self, other):
+        with other.lock:
+            other.fold()
+            counts, other_examples = Counter(other.counts), dict(other.examples)
+        with self.lock:
+            self.fold()
+            self.counts.update(counts)
+            for key, session_ids in other_examples.items():
+                examples = self.examples.setdefault(key, [])
+                examples.extend(session_ids[:self.max_examples - len(examples)])
+
+    # Function to format one log line per unmatched label, most frequent first
+    def log_lines(self):
+        with self.lock:
+            self.fold()
+            return [f"No abbreviation found for {kind} '{label}' - {count} occurrence(s) - Session IDs: {', '.join(self.examples[(kind, label)])}"
+                    for (kind, label), count in self.counts.most_common()]
+
+    def __len__(self):
+        with self.lock:
+            self.fold()
+            return len(self.counts)
+
+    # The lock cannot be pickled, leave it out when sending the counts between processes
+    def __getstate__(self):
+        with self.lock:
+            self.fold()
+            return {"counts": self.counts, "examples": self.examples, "max_examples": self.max_examples}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        self.pending = deque()
+
 # Function to map a morphology label to its abbreviation
 def map_morph_to_abbreviation(label, unmatched_abbreviations, session_id):
-    normalized_label = normalize_text(label)
-    for full_label, abbrev in MORPH_ABBREVIATIONS.items():
-        if normalize_text(full_label) == normalized_label:
-            return abbrev
-    print(Fore.YELLOW + f"Warning: No abbreviation found for morphology label '{label}'")
-    unmatched_abbreviations.append(f"Session ID: {session_id} - No abbreviation found for morphology label '{label}'")
+    abbrev = MORPH_RESOLVER.resolve(label)
+    if abbrev is not None:
+        return abbrev
+    verbose_print(Fore.YELLOW + f"Warning: No abbreviation found for morphology label '{label}'")
+    unmatched_abbreviations.record("morphology label", label, session_id)
     return label  # Keep original if no match
 
 # Function to map a part of speech to its abbreviation
 def map_pos_to_abbreviation(pos_tags, unmatched_abbreviations, session_id):
     abbreviations = []
     for tag in pos_tags:
-        normalized_tag = normalize_text(tag)
-        for full_pos, abbrev in POS_ABBREVIATIONS.items():
-            if normalize_text(full_pos) == normalized_tag:
-                abbreviations.append(abbrev)
-                break
-        else:
-            print(Fore.YELLOW + f"Warning: No abbreviation found for part of speech '{tag}'")
-            unmatched_abbreviations.append(f"Session ID: {session_id} - No abbreviation found for part of speech '{tag}'")
-            abbreviations.append(tag)  # Keep original if no match
+        abbrev = POS_RESOLVER.resolve(tag)
+        if abbrev is None:
+            verbose_print(Fore.YELLOW + f"Warning: No abbreviation found for part of speech '{tag}'")
+            unmatched_abbreviations.record("part of speech", tag, session_id)
+            abbrev = tag  # Keep original if no match
+        abbreviations.append(abbrev)
     return abbreviations
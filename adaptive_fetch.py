@@ -0,0 +1,200 @@
+from fetch_html import build_session_url, log_http_failure, is_php_error_page
+from async_fetch import parse_and_extract, DEFAULT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT
+from metrics import metrics, verbose_print
+from colorama import Fore
+import asyncio
+import aiohttp
+import heapq
+import itertools
+import random
+
+# Statuses worth retrying (server overloaded or temporarily failing)
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+# Kinds of responses seen by the controller
+RESPONSE_OK = "ok"
+RESPONSE_PHP_ERROR = "php_error"
+RESPONSE_FAILURE = "failure"  # Retryable HTTP status, timeout or connection error
+
+# Additive-increase / multiplicative-decrease concurrency controller (like TCP congestion control):
+# every healthy response adds increase/limit (about +increase per round of requests), and a failure
+# or a slow response multiplies the limit by decrease, at most once per smoothed latency so that a
+# burst of failures from one round counts once. PHP error pages are also what the site returns for
+# session IDs that do not exist, so they only count as overload when their rate rises above its
+# long-term level (a burst), not because a range is sparse.
+class AimdController:
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1.0, decrease=0.5, target_latency=2.0, php_error_burst=0.25):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.target_latency = target_latency
+        self.php_error_burst = php_error_burst
+        self.smoothed_latency = None
+        self.error_rate = 0.0
+        self.php_error_rate = 0.0
+        self.php_error_baseline = 0.0
+        self.last_decrease = float("-inf")
+
+    # Function to update the limit with the result of one request
+    def record(self, kind, latency, now):
+        self.smoothed_latency = latency if self.smoothed_latency is None else 0.8 * self.smoothed_latency + 0.2 * latency
+        self.error_rate = 0.95 * self.error_rate + 0.05 * (kind == RESPONSE_FAILURE)
+        self.php_error_rate = 0.8 * self.php_error_rate + 0.2 * (kind == RESPONSE_PHP_ERROR)
+        self.php_error_baseline = 0.99 * self.php_error_baseline + 0.01 * (kind == RESPONSE_PHP_ERROR)
+
+        healthy = kind == RESPONSE_OK or (kind == RESPONSE_PHP_ERROR and self.php_error_rate <= self.php_error_baseline + self.php_error_burst)
+        if healthy and latency <= self.target_latency:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+        elif now - self.last_decrease >= self.smoothed_latency:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self.last_decrease = now
+
+    # Number of requests allowed in flight
+    @property
+    def concurrency(self):
+        return int(self.limit)
+
+# Queue of failed session IDs waiting for their retry time
+class RetryQueue:
+    def __init__(self, base_delay=1.0, max_delay=60.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.heap = []
+        self.counter = itertools.count()
+
+    # Function to schedule a retry with jittered exponential backoff
+    def push(self, session_id, attempt, now):
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        heapq.heappush(self.heap, (now + delay, next(self.counter), session_id, attempt))
+
+    # Function to take the next session ID whose retry time has come (None if there is none)
+    def pop_ready(self, now):
+        if self.heap and self.heap[0][0] <= now:
+            _, _, session_id, attempt = heapq.heappop(self.heap)
+            return session_id, attempt
+        return None
+
+    # Seconds until the next retry is due (None if the queue is empty)
+    def next_due_in(self, now):
+        return max(0.0, self.heap[0][0] - now) if self.heap else None
+
+    def __len__(self):
+        return len(self.heap)
+
+# Crawler wrapping the async fetcher with the AIMD controller and the retry queue
+class AdaptiveFetcher:
+    def __init__(self, http, unmatched_abbreviations, controller, retry_queue, max_retries=3, php_error_retries=1):
+        self.http = http
+        self.unmatched_abbreviations = unmatched_abbreviations
+        self.controller = controller
+        self.retry_queue = retry_queue
+        self.max_retries = max_retries
+        self.php_error_retries = php_error_retries
+        self.retries = 0
+
+    # Function to download a page without logging anything: (status, html, error name)
+    async def download(self, session_id):
+        try:
+            with metrics.time("http_request_seconds"):
+                async with self.http.get(build_session_url(session_id)) as response:
+                    metrics.increment("http_responses_total", status=response.status)
+                    html = await response.text() if response.status == 200 else None
+                    return response.status, html, None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.increment("http_responses_total", status=type(e).__name__)
+            return None, None, type(e).__name__
+
+    # Function to run one attempt; only the last attempt of a session is logged
+    async def attempt(self, session_id, attempt):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        status, html, error = await self.download(session_id)
+        now = loop.time()
+
+        if error is not None or status in RETRYABLE_STATUSES:
+            kind, allowed_retries = RESPONSE_FAILURE, self.max_retries
+        elif html is not None and is_php_error_page(html):
+            kind, allowed_retries = RESPONSE_PHP_ERROR, self.php_error_retries
+        else:
+            kind, allowed_retries = RESPONSE_OK, 0
+        self.controller.record(kind, now - started, now)
+
+        if attempt < allowed_retries:
+            reason = "PHP error page" if kind == RESPONSE_PHP_ERROR else (error or f"status {status}")
+            verbose_print(Fore.YELLOW + f"Session {session_id} failed ({reason}), retry {attempt + 1} of {allowed_retries} queued")
+            metrics.increment("retries_total", kind=kind)
+            self.retries += 1
+            self.retry_queue.push(session_id, attempt + 1, now)
+            return None
+
+        if html is None:
+            log_http_failure(session_id, error or status)
+            return None
+        return await loop.run_in_executor(None, parse_and_extract, session_id, html, self.unmatched_abbreviations)
+
+    # Function to crawl session IDs, starting new requests while the controller allows it
+    async def run(self, session_ids, on_result=None):
+        loop = asyncio.get_running_loop()
+        fresh_ids = iter(session_ids)
+        fresh_left = True
+        running = set()
+        results = []
+
+        while True:
+            # Start requests up to the current limit, due retries first
+            while len(running) < self.controller.concurrency:
+                next_attempt = self.retry_queue.pop_ready(loop.time())
+                if next_attempt is None and fresh_left:
+                    session_id = next(fresh_ids, None)
+                    if session_id is None:
+                        fresh_left = False
+                    else:
+                        verbose_print(Fore.CYAN + f"Processing session_id: {session_id}")
+                        next_attempt = (session_id, 0)
+                if next_attempt is None:
+                    break
+                running.add(asyncio.ensure_future(self.guarded_attempt(*next_attempt)))
+
+            if not running and not fresh_left and not self.retry_queue:
+                break
+
+            # Wait for a request to finish or for the next retry to be due
+            if not running:
+                await asyncio.sleep(self.retry_queue.next_due_in(loop.time()))
+                continue
+            done, running = await asyncio.wait(running, timeout=self.retry_queue.next_due_in(loop.time()), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                session_data = task.result()
+                if session_data and on_result:
+                    on_result(session_data)  # Hand the result to the output sink as soon as it is ready
+                elif session_data:
+                    results.append(session_data)
+
+        return results
+
+    # Function to run an attempt without letting an exception stop the crawl
+    async def guarded_attempt(self, session_id, attempt):
+        try:
+            return await self.attempt(session_id, attempt)
+        except Exception as exc:
+            print(Fore.RED + f"Session {session_id} generated an exception: {exc}")
+            return None
+
+# Function to crawl session IDs with adaptive concurrency and retries
+async def fetch_sessions_adaptive(session_ids, unmatched_abbreviations, max_concurrency=64, initial_concurrency=4, max_retries=3,
+                                  php_error_retries=1, target_latency=2.0, timeout=DEFAULT_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT, on_result=None):
+    connector = aiohttp.TCPConnector(limit=max_concurrency, limit_per_host=max_concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as http:
+        controller = AimdController(initial=initial_concurrency, maximum=max_concurrency, target_latency=target_latency)
+        fetcher = AdaptiveFetcher(http, unmatched_abbreviations, controller, RetryQueue(), max_retries=max_retries,
+                                php_error_retries=php_error_retries)
+        results = await fetcher.run(session_ids, on_result=on_result)
+        print(Fore.GREEN + f"Adaptive concurrency ended at {controller.concurrency} (error rate {controller.error_rate:.0%}), {fetcher.retries} retries")
+        return results
+
+# Function to run the adaptive engine from synchronous code (same interface as fetch_sessions_parallel)
+def fetch_sessions_adaptive_blocking(session_ids, unmatched_abbreviations, **options):
+    return asyncio.run(fetch_sessions_adaptive(session_ids, unmatched_abbreviations, **options))
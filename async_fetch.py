@@ -0,0 +1,82 @@
+from fetch_html import build_session_url, parse_result_div, log_http_failure, store_page, record_outcome, OUTCOME_EXTRACT_ERROR
+from data_extractors import extract_entry
+from metrics import metrics, verbose_print
+from colorama import Fore
+import asyncio
+import aiohttp
+
+# Default number of simultaneous connections to the dictionary host
+DEFAULT_CONCURRENCY = 16
+
+# Default timeouts in seconds (whole request / connection setup)
+DEFAULT_TIMEOUT = 30
+DEFAULT_CONNECT_TIMEOUT = 10
+
+# Function to download the raw HTML of a session page over the shared pool
+async def fetch_html_async(http, session_id):
+    try:
+        with metrics.time("http_request_seconds"):
+            async with http.get(build_session_url(session_id)) as response:
+                metrics.increment("http_responses_total", status=response.status)
+                if response.status != 200:
+                    log_http_failure(session_id, response.status)
+                    return None
+                return await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        metrics.increment("http_responses_total", status=type(e).__name__)
+        log_http_failure(session_id, type(e).__name__)
+        return None
+
+# Function to parse a downloaded page and run the extractors on it
+def parse_and_extract(session_id, html, unmatched_abbreviations):
+    store_page(session_id, html)
+    result_div = parse_result_div(session_id, html)
+    if not result_div:
+        return None
+    try:
+        with metrics.time("extract_seconds"):
+            entry = extract_entry(result_div, unmatched_abbreviations, session_id)
+    except Exception as e:
+        print(Fore.RED + f"Error processing session_id {session_id}: {e}")
+        record_outcome(session_id, OUTCOME_EXTRACT_ERROR)
+        return None
+    return {session_id: entry}  # Journaled as ok by the consumer, once the entry is written
+
+# Function to fetch and extract a single session ID
+async def process_session_async(http, session_id, unmatched_abbreviations):
+    verbose_print(Fore.CYAN + f"Processing session_id: {session_id}")
+    html = await fetch_html_async(http, session_id)
+    if html is None:
+        return None
+
+    # Parsing is CPU-bound, keep it off the event loop so downloads keep flowing
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, parse_and_extract, session_id, html, unmatched_abbreviations)
+
+# Function to process a session ID without letting an exception cancel the others
+async def guarded_process_session(http, session_id, unmatched_abbreviations):
+    try:
+        return await process_session_async(http, session_id, unmatched_abbreviations)
+    except Exception as exc:
+        print(Fore.RED + f"Session {session_id} generated an exception: {exc}")
+        return None
+
+# Function to fetch a list of session IDs through one pooled keep-alive client
+async def fetch_sessions_async(session_ids, unmatched_abbreviations, concurrency=DEFAULT_CONCURRENCY,
+                               timeout=DEFAULT_TIMEOUT, connect_timeout=DEFAULT_CONNECT_TIMEOUT, on_result=None):
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout, connect=connect_timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as http:
+        tasks = [guarded_process_session(http, session_id, unmatched_abbreviations) for session_id in session_ids]
+        results = []
+        for next_result in asyncio.as_completed(tasks):
+            session_data = await next_result
+            if session_data and on_result:
+                on_result(session_data)  # Hand the result to the output sink as soon as it is ready
+            elif session_data:
+                results.append(session_data)
+        return results
+
+# Function to run the async engine from synchronous code (same interface as fetch_sessions_parallel)
+def fetch_sessions_async_blocking(session_ids, unmatched_abbreviations, **options):
+    return asyncio.run(fetch_sessions_async(session_ids, unmatched_abbreviations, **options))
@@ -0,0 +1,342 @@
+from jsonl_results import iter_result_records, default_result_files
+from colorama import Fore, init
+from array import array
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+import unicodedata
+
+# Default location of the compiled completions
+DEFAULT_AUTOCOMPLETE_PATH = "autocomplete.amzc"
+
+# Completion file: a minimized automaton (DAWG) of every headword and transcription, laid out to be
+# memory-mapped (all integers little-endian u32 columns):
+#   header          magic, version, state count, transition count, key count, value count
+#   states          first transition, transition count, final flag, keys accepted from the state
+#   transitions     label (code point), target state, keys below the earlier labels (for numbering keys)
+#   weights         weight of each key, keys numbered in sorted order
+#   ranked keys     key numbers from the highest weight down (ties in key order)
+#   best            segment tree of the best (lowest) rank of each range of key numbers
+#   value offsets   u32 x (key count + 1), into the values: the session IDs of each key
+# The keys starting with a prefix are a contiguous range of key numbers, so the top completions
+# are the best ranks of that range, taken from the segment tree.
+MAGIC = b"AMZC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHIIII")
+
+# Function to normalize a key
+def normalize_key(text):
+    return unicodedata.normalize('NFC', text.strip())
+
+# Function to normalize a typed prefix (a trailing space is kept: it starts the next word of multi-word keys)
+def normalize_prefix(text):
+    return unicodedata.normalize('NFC', text.lstrip())
+
+# Default weight of an entry: how much it has to show (senses, related phrases), so fuller entries come first
+def entry_weight(entry):
+    return 1 + len(entry["sens"]) + len(entry["rp"])
+
+# Function to gather the keys of the entries, their session IDs and summed weights (overrides: {key: weight})
+def collect_keys(records, overrides=None):
+    keys = {}
+    for session_id, entry in dict(records).items():
+        for field in ("mw", "tr"):
+            key = normalize_key(entry[field])
+            if key:
+                weight, session_ids = keys.get(key, (0, []))
+                session_ids.append(int(session_id))
+                keys[key] = (weight + entry_weight(entry), session_ids)
+    for key, weight in (overrides or {}).items():
+        if normalize_key(key) in keys:
+            keys[normalize_key(key)] = (weight, keys[normalize_key(key)][1])
+    return keys
+
+# Builder of the minimized automaton from sorted keys (Daciuk et al.: a state is replaced by an equivalent
+# registered one as soon as no more keys can be added below it)
+class DawgBuilder:
+    def __init__(self):
+        self.states = [[False, {}]]  # [final, {label: state}], state 0 is the root
+        self.register = {}
+        self.previous = ""
+
+    def signature(self, state):
+        final, transitions = self.states[state]
+        return final, tuple(sorted(transitions.items()))
+
+    # Function to replace the states below a position of the previous key by their registered equivalents
+    def minimize(self, path, down_to):
+        for depth in range(len(path) - 1, down_to, -1):
+            parent, label, child = path[depth - 1], self.previous[depth - 1], path[depth]
+            signature = self.signature(child)
+            registered = self.register.get(signature)
+            if registered is None:
+                self.register[signature] = child
+            else:
+                self.states[parent][1][label] = registered
+
+    def add(self, key, path):
+        if key <= self.previous and self.previous:
+            raise ValueError("Keys must be added in sorted order, without duplicates")
+        common = 0
+        while common < min(len(key), len(self.previous)) and key[common] == self.previous[common]:
+            common += 1
+        self.minimize(path, common)
+        del path[common + 1:]
+        for label in key[common:]:
+            self.states.append([False, {}])
+            self.states[path[-1]][1][label] = len(self.states) - 1
+            path.append(len(self.states) - 1)
+        self.states[path[-1]][0] = True
+        self.previous = key
+
+    # Function to build the automaton of sorted keys; returns the reachable states renumbered from 0
+    def build(self, keys):
+        path = [0]
+        for key in keys:
+            self.add(key, path)
+        self.minimize(path, 0)
+
+        numbers, order, stack = {0: 0}, [0], [0]
+        while stack:
+            state = stack.pop()
+            for label, target in sorted(self.states[state][1].items()):
+                if target not in numbers:
+                    numbers[target] = len(order)
+                    order.append(target)
+                    stack.append(target)
+        return [(self.states[state][0], [(ord(label), numbers[target]) for label, target in sorted(self.states[state][1].items())]) for state in order]
+
+# Function to count the keys accepted from every state (children first)
+def count_keys(states):
+    counts = [None] * len(states)
+    for start in range(len(states)):
+        stack = [start]
+        while stack:
+            state = stack[-1]
+            if counts[state] is not None:
+                stack.pop()
+                continue
+            pending = [target for _, target in states[state][1] if counts[target] is None]
+            if pending:
+                stack.extend(pending)
+                continue
+            counts[state] = int(states[state][0]) + sum(counts[target] for _, target in states[state][1])
+            stack.pop()
+    return counts
+
+# Function to rank the keys (highest weight first, then in key order) and build the segment tree of the
+# best rank of every range of key numbers; returns (ranked key numbers, tree)
+def build_rank_tree(weights):
+    size = len(weights)
+    ranked = array('I', sorted(range(size), key=lambda number: -weights[number]))  # Stable: key order among ties
+    ranks = array('I', [0] * size)
+    for rank, number in enumerate(ranked):
+        ranks[number] = rank
+    tree = array('I', [0] * size) + ranks
+    for node in range(size - 1, 0, -1):
+        tree[node] = min(tree[2 * node], tree[2 * node + 1])
+    return ranked, tree
+
+# Function to compile the keys of result files into a completion file (overrides: {key: weight} priorities)
+def build_autocomplete(path=DEFAULT_AUTOCOMPLETE_PATH, result_files=None, overrides=None):
+    keys = collect_keys(iter_result_records(default_result_files() if result_files is None else result_files), overrides)
+    sorted_keys = sorted(keys)
+    states = DawgBuilder().build(sorted_keys)
+    counts = count_keys(states)
+
+    state_columns = array('I')
+    labels, targets, keys_before = array('I'), array('I'), array('I')
+    for state, (final, transitions) in enumerate(states):
+        state_columns.extend((len(labels), len(transitions), int(final), counts[state]))
+        below = int(final)
+        for label, target in transitions:
+            labels.append(label)
+            targets.append(target)
+            keys_before.append(below)
+            below += counts[target]
+
+    weights = array('I', (min(keys[key][0], 0xFFFFFFFF) for key in sorted_keys))
+    value_offsets, values = array('I', [0]), array('I')
+    for key in sorted_keys:
+        values.extend(sorted(keys[key][1]))
+        value_offsets.append(len(values))
+
+    columns = [state_columns, labels, targets, keys_before, weights, *build_rank_tree(weights), value_offsets, values]
+    if sys.byteorder != "little":
+        for column in columns:
+            column.byteswap()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(states), len(labels), len(sorted_keys), len(values)))
+        for column in columns:
+            f.write(column.tobytes())
+    os.replace(temp_path, path)
+    return len(sorted_keys), len(states)
+
+# Memory-mapped completion file: a query walks the prefix, then reads the best keys of its range
+class Autocomplete:
+    def __init__(self, path=DEFAULT_AUTOCOMPLETE_PATH):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self.map)
+        magic, version, state_count, transition_count, self.key_count, value_count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} completion file")
+
+        position = HEADER.size
+        self.states, position = self.column(data, position, 4 * state_count)
+        self.labels, position = self.column(data, position, transition_count)
+        self.targets, position = self.column(data, position, transition_count)
+        self.keys_before, position = self.column(data, position, transition_count)
+        self.weights, position = self.column(data, position, self.key_count)
+        self.ranked, position = self.column(data, position, self.key_count)
+        self.best, position = self.column(data, position, 2 * self.key_count)
+        self.value_offsets, position = self.column(data, position, self.key_count + 1)
+        self.values, position = self.column(data, position, value_count)
+
+    # Function to read a u32 column in place (copied only on big-endian machines)
+    def column(self, data, position, length):
+        end = position + 4 * length
+        if sys.byteorder == "little":
+            return data[position:end].cast('I'), end
+        column = array('I', data[position:end])
+        column.byteswap()
+        return column, end
+
+    def close(self):
+        for view in (self.states, self.labels, self.targets, self.keys_before, self.weights, self.ranked, self.best, self.value_offsets, self.values):
+            if isinstance(view, memoryview):
+                view.release()
+        self.map.close()
+
+    # Function to follow a transition of a state (None if there is none for the character)
+    def transition(self, state, character):
+        first, count = self.states[4 * state], self.states[4 * state + 1]
+        label = ord(character)
+        low, high = first, first + count
+        while low < high:
+            middle = (low + high) // 2
+            if self.labels[middle] < label:
+                low = middle + 1
+            else:
+                high = middle
+        if low < first + count and self.labels[low] == label:
+            return low
+        return None
+
+    # Function to find the keys starting with a prefix: (state reached, first key number, end key number), None when none
+    def prefix_range(self, prefix):
+        state, number = 0, 0
+        for character in prefix:
+            transition = self.transition(state, character)
+            if transition is None:
+                return None
+            number += self.keys_before[transition]
+            state = self.targets[transition]
+        return state, number, number + self.states[4 * state + 3]
+
+    # Function to spell the key of a key number (the suffix, when counted among the keys accepted from a state)
+    def key(self, number, state=0):
+        states, keys_before, labels, targets = self.states, self.keys_before, self.labels, self.targets
+        characters = []
+        while True:
+            first, count, final = states[4 * state], states[4 * state + 1], states[4 * state + 2]
+            if final and number == 0:
+                return ''.join(map(chr, characters))
+            low, high = first, first + count - 1
+            while low < high:  # Last transition with keys_before <= number (most states have only one)
+                middle = (low + high + 1) // 2
+                if keys_before[middle] <= number:
+                    low = middle
+                else:
+                    high = middle - 1
+            number -= keys_before[low]
+            characters.append(labels[low])
+            state = targets[low]
+
+    # Function to find the best rank of a range of key numbers in the segment tree
+    def best_rank(self, first, end):
+        best, tree = self.key_count, self.best
+        first += self.key_count
+        end += self.key_count
+        while first < end:
+            if first & 1:
+                if tree[first] < best:
+                    best = tree[first]
+                first += 1
+            if end & 1:
+                end -= 1
+                if tree[end] < best:
+                    best = tree[end]
+            first >>= 1
+            end >>= 1
+        return best
+
+    # Function to get the top k completions of a prefix, as (key, weight, session IDs), best first
+    def complete(self, prefix, k=10):
+        prefix = normalize_prefix(prefix)
+        found = self.prefix_range(prefix)
+        if found is None or found[1] == found[2]:  # No key starts with the prefix (or the index is empty)
+            return []
+        state, first, end = found
+        start = first  # The completions are spelled from the state the prefix leads to
+        heap = [(self.best_rank(first, end), first, end)]
+        completions = []
+        while heap and len(completions) < k:
+            rank, first, end = heapq.heappop(heap)
+            number = self.ranked[rank]
+            session_ids = [str(session_id) for session_id in self.values[self.value_offsets[number]:self.value_offsets[number + 1]]]
+            completions.append((prefix + self.key(number - start, state), self.weights[number], session_ids))
+            # The rest of the range: the keys before and after the one just taken
+            if first < number:
+                heapq.heappush(heap, (self.best_rank(first, number), first, number))
+            if number + 1 < end:
+                heapq.heappush(heap, (self.best_rank(number + 1, end), number + 1, end))
+        return completions
+
+    def __contains__(self, key):
+        found = self.prefix_range(normalize_key(key))
+        return found is not None and bool(self.states[4 * found[0] + 2])
+
+    def __len__(self):
+        return self.key_count
+
+# Function to read "key<TAB>weight" priority overrides
+def load_overrides(path):
+    overrides = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) == 2:
+                if not parts[1].isdecimal():
+                    raise ValueError(f"{path}: the weight of {parts[0]!r} is not a non-negative integer: {parts[1]!r}")
+                overrides[parts[0]] = int(parts[1])
+    return overrides
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Compile the headwords and transcriptions into a memory-mapped completion file, and complete prefixes")
+    parser.add_argument("--file", default=DEFAULT_AUTOCOMPLETE_PATH, help="completion file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="compile extracted_data.json and every result file under logs/")
+    build.add_argument("--weights", help='"key<TAB>weight" lines overriding the default weights (e.g. from search logs)')
+    complete = subparsers.add_parser("complete", help="top completions of a prefix")
+    complete.add_argument("prefix")
+    complete.add_argument("-k", type=int, default=10, help="number of completions")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        try:
+            overrides = load_overrides(args.weights) if args.weights else None
+        except ValueError as e:
+            parser.error(str(e))
+        key_count, state_count = build_autocomplete(args.file, overrides=overrides)
+        print(Fore.GREEN + f"Compiled {key_count} keys into {state_count} states in {args.file}")
+    else:
+        autocomplete = Autocomplete(args.file)
+        for key, weight, session_ids in autocomplete.complete(args.prefix, args.k):
+            print(f"{weight:5}  {key}  {', '.join(session_ids)}")
@@ -0,0 +1,66 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from abbreviation_mapper import MORPH_ABBREVIATIONS, POS_ABBREVIATIONS, UnmatchedAbbreviations, map_morph_to_abbreviation, map_pos_to_abbreviation
+from normalization_utils import normalize_text
+from jsonl_results import iter_result_records, find_result_files
+from stand_in_server import POS_LABELS, MORPH_LABELS, display_label
+import contextlib
+import io
+
+# Previous implementation: normalize every dictionary key on every lookup
+def legacy_map_morph(label):
+    normalized_label = normalize_text(label)
+    for full_label, abbrev in MORPH_ABBREVIATIONS.items():
+        if normalize_text(full_label) == normalized_label:
+            return abbrev
+    return label
+
+def legacy_map_pos(pos_tags):
+    abbreviations = []
+    for tag in pos_tags:
+        normalized_tag = normalize_text(tag)
+        for full_pos, abbrev in POS_ABBREVIATIONS.items():
+            if normalize_text(full_pos) == normalized_tag:
+                abbreviations.append(abbrev)
+                break
+        else:
+            abbreviations.append(tag)
+    return abbreviations
+
+# Function to rebuild the labels displayed on the pages from the extracted entries
+def load_labels(limit=5000):
+    samples = []
+    for session_id, entry in iter_result_records(find_result_files()):
+        pos_tags = [display_label(POS_LABELS, pos) for pos in entry["pos"]]
+        morph_labels = [display_label(MORPH_LABELS, key) for form in entry["morph"] for key in form]
+        samples.append((session_id, pos_tags, morph_labels))
+        if len(samples) >= limit:
+            break
+    return samples
+
+def run_legacy(samples):
+    for session_id, pos_tags, morph_labels in samples:
+        legacy_map_pos(pos_tags)
+        for label in morph_labels:
+            legacy_map_morph(label)
+
+def run_resolver(samples):
+    unmatched = UnmatchedAbbreviations()
+    for session_id, pos_tags, morph_labels in samples:
+        map_pos_to_abbreviation(pos_tags, unmatched, session_id)
+        for label in morph_labels:
+            map_morph_to_abbreviation(label, unmatched, session_id)
+
+# Main execution
+if __name__ == "__main__":
+    samples = load_labels()
+    print(f"Mapping the POS tags and morphology labels of {len(samples)} entries")
+    for name, run in (("before (linear scan)", run_legacy), ("after (resolver)", run_resolver)):
+        # Silence the unmatched-label warnings while timing
+        with contextlib.redirect_stdout(io.StringIO()):
+            best = min(timeit.repeat(lambda: run(samples), number=1, repeat=5))
+        print(f"{name:22} {best * 1e6 / len(samples):8.2f} us per entry")
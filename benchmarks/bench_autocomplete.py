@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from autocomplete import Autocomplete, build_autocomplete, collect_keys
+from jsonl_results import iter_result_records, default_result_files
+import json
+import random
+import tempfile
+import tracemalloc
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(fraction * len(values)))]
+
+# Reference: every key starting with the prefix, best weight first (then in key order)
+def scan_keys(keys, prefix, k):
+    found = [(key, weight, [str(session_id) for session_id in sorted(session_ids)]) for key, (weight, session_ids) in keys.items() if key.startswith(prefix)]
+    return sorted(found, key=lambda completion: (-completion[1], completion[0]))[:k]
+
+# Main execution
+if __name__ == "__main__":
+    results = dict(iter_result_records(default_result_files()))
+    keys = collect_keys(results.items())
+    with tempfile.TemporaryDirectory() as folder:
+        json_path = os.path.join(folder, "extracted_data.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        path = os.path.join(folder, "autocomplete.amzc")
+        started = time.perf_counter()
+        key_count, state_count = build_autocomplete(path, [json_path])
+        build_time = time.perf_counter() - started
+        json_size, file_size = os.path.getsize(json_path), os.path.getsize(path)
+        print(f"{key_count} keys in {state_count} states, built in {build_time:.2f} s: {file_size / 1e6:.2f} MB "
+              f"({file_size / json_size:.0%} of the {json_size / 1e6:.1f} MB JSON)")
+
+        # Python memory of the type-ahead: the mapped file vs the entries loaded from the JSON
+        tracemalloc.start()
+        started = time.perf_counter()
+        autocomplete = Autocomplete(path)
+        open_time = time.perf_counter() - started
+        mapped_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        tracemalloc.start()
+        with open(json_path, encoding='utf-8') as f:
+            loaded = json.load(f)
+        json_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del loaded
+        print(f"Open: {open_time * 1e3:.2f} ms and {mapped_memory / 1e3:.1f} kB of Python objects (file pages are shared and loaded on demand), "
+              f"json.load: {json_memory / 1e6:.1f} MB")
+
+        # Every keystroke of 500 random keys, checked against a scan of every key
+        random.seed(0)
+        keystroke_times, scan_times = [], []
+        for key in random.sample(sorted(keys), 500):
+            for length in range(len(key) + 1):
+                prefix = key[:length]
+                started = time.perf_counter()
+                completions = autocomplete.complete(prefix, 10)
+                keystroke_times.append(time.perf_counter() - started)
+                if length % 3 == 1:
+                    started = time.perf_counter()
+                    expected = scan_keys(keys, prefix, 10)
+                    scan_times.append(time.perf_counter() - started)
+                    assert completions == expected, prefix
+        print(f"Top 10 per keystroke ({len(keystroke_times)} prefixes): p50 {percentile(keystroke_times, .5) * 1e6:.0f} µs, "
+              f"p95 {percentile(keystroke_times, .95) * 1e6:.0f} µs, p99 {percentile(keystroke_times, .99) * 1e6:.0f} µs; "
+              f"scan of every key p50 {percentile(scan_times, .5) * 1e3:.1f} ms (same completions)")
+        autocomplete.close()
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compact_export import CompactDictionary, export_compact
+from jsonl_results import iter_result_records, default_result_files
+import json
+import random
+import tempfile
+
+# Function to time a callable and return (seconds, result)
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, result
+
+def load_json(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+# Main execution
+if __name__ == "__main__":
+    results = dict(iter_result_records(default_result_files()))
+    with tempfile.TemporaryDirectory() as folder:
+        # The chunk outputs, as written by save_data_to_file, and the compact export of the same entries
+        json_path = os.path.join(folder, "extracted_data.json")
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=4)
+        compact_path = os.path.join(folder, "dictionary.amzd")
+        export_time, _ = timed(lambda: export_compact(results, compact_path))
+
+        json_size, compact_size = os.path.getsize(json_path), os.path.getsize(compact_path)
+        print(f"{len(results)} entries: JSON {json_size / 1e6:.2f} MB, compact {compact_size / 1e6:.2f} MB ({json_size / compact_size:.1f}x smaller), exported in {export_time:.2f} s")
+
+        random.seed(0)
+        ids = random.sample(list(results), 100)
+        load_time, loaded = timed(lambda: load_json(json_path))
+        open_time, dictionary = timed(lambda: CompactDictionary(compact_path))
+        lookup_time, looked_up = timed(lambda: [dictionary.get(session_id) for session_id in ids])
+        assert looked_up == [loaded[session_id] for session_id in ids]
+        print(f"Cold start and 100 lookups: json.load {load_time * 1e3:8.1f} ms, compact {(open_time + lookup_time) * 1e3:8.2f} ms")
+
+        decode_time, decoded = timed(dictionary.to_dict)
+        assert decoded == loaded
+        print(f"Full decode: json.load {load_time * 1e3:8.1f} ms, compact {decode_time * 1e3:8.1f} ms (lossless)")
+        dictionary.close()
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dictionary_store import DictionaryStore, build_store
+from jsonl_results import iter_result_records, default_result_files
+import random
+import tempfile
+
+# Previous workflow: load every result file into memory, then scan it
+def load_json_outputs():
+    return dict(iter_result_records(default_result_files()))
+
+def scan_headword(entries, mw):
+    return {session_id: entry for session_id, entry in entries.items() if entry["mw"] == mw or mw in entry["var"]}
+
+# Function to time a callable and return (seconds, result)
+def timed(run):
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, result
+
+# Main execution
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "dictionary.sqlite")
+        build_time, count = timed(lambda: build_store(path))
+        print(f"Built the store with {count} entries in {build_time:.2f} s ({os.path.getsize(path) / 1e6:.1f} MB)")
+
+        load_time, entries = timed(load_json_outputs)
+        open_time, store = timed(lambda: DictionaryStore(path))
+        print(f"Startup: loading the JSON outputs {load_time * 1e3:8.1f} ms, opening the store {open_time * 1e3:8.3f} ms")
+
+        random.seed(0)
+        words = [entry["mw"] for entry in random.sample(list(entries.values()), 200)]
+        ids = random.sample(list(entries), 2000)
+
+        scan_time, scanned = timed(lambda: [scan_headword(entries, word) for word in words])
+        lookup_time, looked_up = timed(lambda: [store.lookup(word) for word in words])
+        assert scanned == looked_up
+        print(f"Headword lookup: scanning the loaded JSON {scan_time * 1e6 / len(words):8.1f} us, store {lookup_time * 1e6 / len(words):8.1f} us")
+
+        get_time, fetched = timed(lambda: [store.get(session_id) for session_id in ids])
+        assert fetched == [entries[session_id] for session_id in ids]
+        print(f"Session ID lookup: store {get_time * 1e6 / len(ids):8.1f} us")
+        store.close()
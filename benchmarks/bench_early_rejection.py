@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser_backends import PARSER_BACKENDS, find_result_div
+from bench_extractors import load_fixtures
+import argparse
+import fetch_html
+
+# Header, menus and scripts around the result section, as on the real site (the fixtures only hold the section)
+PAGE_HEAD = ("<html><head><meta charset=\"utf-8\"><title>Dictionnaire</title>"
+             + "<script>var menu = {};" + "menu.item = 'x';" * 600 + "</script>"
+             + "<style>.ddoc_funfact_detail_haut { margin: 0 } " + "div.c { color: red } " * 300 + "</style></head><body>"
+             + "<nav><ul>" + "<li><a href=\"/dglai/page\">Lien</a></li>" * 150 + "</ul></nav>")
+PAGE_FOOT = "<footer>" + "<p>Institut Royal de la Culture Amazighe</p>" * 100 + "</footer></body></html>"
+
+# Function to wrap a fixture page body in the site's page chrome
+def wrap_page(html):
+    body = html.split("<body>", 1)[-1].rsplit("</body>", 1)[0]
+    return PAGE_HEAD + body + PAGE_FOOT
+
+# Former path: every page is parsed whole to look for the result div
+def parse_full_page(session_id, html):
+    if fetch_html.is_php_error_page(html):
+        return None
+    return find_result_div(html, fetch_html.parser_backend)[1]
+
+def time_pages(pages, parse, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for session_id, html in pages:
+            parse(session_id, html)
+    fetch_html.failure_collector.drain()
+    return (time.perf_counter() - started) / (repeat * len(pages))
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost of the result section fast path vs parsing whole pages, per kind of page (offline)")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the pages")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    kinds = {
+        "entry": [(session_id, wrap_page(html)) for session_id, html in fixtures.items() if session_id.isdigit()],
+        "php_error": [("php_error", wrap_page(fixtures["php_error"]))],
+        "no_result": [("no_result", wrap_page(fixtures["no_result"]))],
+    }
+    print(f"Pages of {len(kinds['entry'][0][1]) / 1024:.0f} KiB (fixture sections wrapped in the page chrome)")
+    print(f"{'backend':12} {'page':10} {'full page us':>13} {'fast path us':>13} {'speedup':>8}")
+    for backend in PARSER_BACKENDS:
+        try:
+            find_result_div("", backend)
+        except ImportError:
+            continue
+        fetch_html.set_parser_backend(backend)
+        for kind, pages in kinds.items():
+            full = time_pages(pages, parse_full_page, args.repeat)
+            fast = time_pages(pages, fetch_html.parse_result_div, args.repeat)
+            print(f"{backend:12} {kind:10} {full * 1e6:13.1f} {fast * 1e6:13.1f} {full / fast:7.1f}x")
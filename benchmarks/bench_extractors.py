@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from abbreviation_mapper import UnmatchedAbbreviations
+from data_extractors import extract_entry, extract_entry_by_parts
+from parser_backends import PARSER_BACKENDS, find_result_div
+import contextlib
+import glob
+import io
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures")
+
+# Function to load the fixture pages that have a result div
+def load_fixtures():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html"))):
+        with open(path, encoding='utf-8') as f:
+            pages[os.path.basename(path)[:-5]] = f.read()
+    return pages
+
+# Reference: the separate extract_* functions on an html.parser tree
+def extract_reference(session_id, html):
+    _, result_div = find_result_div(html, "html.parser")
+    return extract_entry_by_parts(result_div, UnmatchedAbbreviations(), session_id) if result_div else None
+
+def extract_single_pass(session_id, html, backend):
+    _, result_div = find_result_div(html, backend)
+    return extract_entry(result_div, UnmatchedAbbreviations(), session_id) if result_div else None
+
+# Function to check that a backend gives the reference output on every fixture
+def check_backend(pages, backend):
+    mismatches = [session_id for session_id, html in pages.items()
+                  if extract_single_pass(session_id, html, backend) != extract_reference(session_id, html)]
+    return mismatches
+
+def time_pages(pages, extract, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for session_id, html in pages.items():
+            extract(session_id, html)
+    return (time.perf_counter() - started) * 1e3 / (repeat * len(pages))
+
+# Main execution
+if __name__ == "__main__":
+    pages = load_fixtures()
+    print(f"{len(pages)} fixture pages")
+    with contextlib.redirect_stdout(io.StringIO()):
+        reference_ms = time_pages(pages, extract_reference)
+    print(f"{'reference (extract_* on html.parser)':40} {reference_ms:7.3f} ms per page")
+
+    for backend in PARSER_BACKENDS:
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                mismatches = check_backend(pages, backend)
+                elapsed_ms = time_pages(pages, lambda session_id, html: extract_single_pass(session_id, html, backend))
+        except ImportError as e:
+            print(f"{'single pass, ' + backend:40} skipped ({e})")
+            continue
+        status = "output matches" if not mismatches else f"MISMATCH on {', '.join(mismatches)}"
+        print(f"{'single pass, ' + backend:40} {elapsed_ms:7.3f} ms per page  {status}")
@@ -0,0 +1,61 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fuzzy_search import build_fuzzy_index, fold_key, edit_distance, latin_to_tifinagh
+import random
+
+# Function to add typos to a word: substituted, inserted or deleted letters
+def add_typos(word, count, alphabet):
+    for _ in range(count):
+        position = random.randrange(len(word) + 1)
+        typo = random.choice(("substitute", "insert", "delete")) if position < len(word) else "insert"
+        if typo == "substitute":
+            word = word[:position] + random.choice(alphabet) + word[position + 1:]
+        elif typo == "insert":
+            word = word[:position] + random.choice(alphabet) + word[position:]
+        elif len(word) > 1:
+            word = word[:position] + word[position + 1:]
+    return word
+
+# Reference: the edit distance to every key
+def scan_keys(index, query, max_distance):
+    key = fold_key(query)
+    return {found for found in index.keys if edit_distance(key, found, max_distance) <= max_distance}
+
+def percentile(values, fraction):
+    return sorted(values)[min(len(values) - 1, int(fraction * len(values)))]
+
+# Main execution
+if __name__ == "__main__":
+    started = time.perf_counter()
+    index = build_fuzzy_index()
+    print(f"Indexed {len(index)} entries ({len(index.keys)} distinct keys) in {time.perf_counter() - started:.1f} s")
+
+    random.seed(0)
+    entries = list(index.headwords.values())
+    queries = []
+    for mw, tr in random.sample(entries, 300):
+        typos = random.choice((0, 1, 2))
+        if random.random() < .5:
+            queries.append(add_typos(tr, typos, "abcdefghijklmnqrstuwxyzɣɛḍṭṣẓ"))
+        else:
+            queries.append(latin_to_tifinagh(add_typos(tr, typos, "abdfgiklmnrstuwyzɣ")))
+
+    for max_distance in (1, 2):
+        index_times, scan_times = [], []
+        for query in queries:
+            started = time.perf_counter()
+            index.search(query, limit=10, max_distance=max_distance)
+            index_times.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            expected = scan_keys(index, query, max_distance)
+            scan_times.append(time.perf_counter() - started)
+            found = {index.keys[number] for _, number in index.matching_keys(fold_key(query), max_distance)} if fold_key(query) else set()
+            assert found == expected, query
+
+        print(f"max distance {max_distance}: index p50 {percentile(index_times, .5) * 1e3:.2f} ms, p95 {percentile(index_times, .95) * 1e3:.2f} ms; "
+              f"scan of every key p50 {percentile(scan_times, .5) * 1e3:.1f} ms (same matches on {len(queries)} queries)")
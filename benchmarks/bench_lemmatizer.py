@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lemmatizer import build_lemmatizer, lemmatize_lines
+import random
+
+# Function to build a text of known forms mixed with unknown words, as lines of words
+def build_corpus(lemmatizer, token_count, unknown_share=.2, words_per_line=12):
+    forms = [form for form in lemmatizer.forms if " " not in form]
+    random.seed(0)
+    tokens = [random.choice(forms) if random.random() > unknown_share else "ⵓⵔⵜⵜⵢⴰⵙⵙⵏ" + random.choice("ⴰⵉⵓ") for _ in range(token_count)]
+    return [" ".join(tokens[i:i + words_per_line]) for i in range(0, token_count, words_per_line)], tokens
+
+def timed(run):
+    started = time.perf_counter()
+    result = run()
+    return time.perf_counter() - started, result
+
+# Main execution
+if __name__ == "__main__":
+    build_time, lemmatizer = timed(build_lemmatizer)
+    print(f"Indexed {len(lemmatizer)} surface forms of {len(lemmatizer.headwords)} entries in {build_time:.1f} s")
+
+    lines, tokens = build_corpus(lemmatizer, 2_000_000)
+    per_token_time, _ = timed(lambda: [lemmatizer.analyses(token) for token in tokens])
+    batch_time, analysed = timed(lambda: lemmatizer.lemmatize(tokens))
+    ids_time, _ = timed(lambda: lemmatizer.lemma_ids(tokens))
+    text_time, _ = timed(lambda: sum(1 for _ in lemmatize_lines(lemmatizer, lines)))
+    known = sum(1 for analyses in analysed if analyses)
+
+    print(f"{len(tokens):,} tokens, {known / len(tokens):.0%} known")
+    for name, seconds in (("analyses() per token", per_token_time), ("lemmatize() batch", batch_time),
+                          ("lemma_ids() batch", ids_time), ("text lines, tokenized", text_time)):
+        print(f"{name:24} {len(tokens) / seconds * 60 / 1e6:8.1f} M tokens/min")
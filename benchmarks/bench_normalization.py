@@ -0,0 +1,54 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from normalization_utils import DELIMITERS, TATWEEL, normalize_text, normalize_arabic, normalize_texts, normalize_arabic_texts, split_by_delimiters, split_texts
+from jsonl_results import iter_result_records, find_result_files
+import re
+import unicodedata
+
+# Previous implementation: NFD and a category lookup per character, the split pattern rebuilt on every call
+def legacy_normalize_text(text):
+    text = unicodedata.normalize('NFD', text)
+    text = ''.join([c for c in text if unicodedata.category(c) != 'Mn'])
+    return text.lower().strip()
+
+def legacy_normalize_arabic(text):
+    return legacy_normalize_text(text.replace(TATWEEL, ''))
+
+def legacy_split_by_delimiters(text):
+    return [part.strip() for part in re.split(r'[{},/،؛]+'.format("|".join(map(re.escape, DELIMITERS))), text) if part.strip()]
+
+# Function to rebuild the French and Arabic sense texts of the pages from the extracted entries under logs/
+def load_senses():
+    french, arabic = [], []
+    for _, entry in iter_result_records(find_result_files()):
+        for sense in entry["sens"]:
+            french.append(", ".join(sense["fr"]))
+            arabic.append("، ".join(sense["ar"]))
+    return french, arabic
+
+# Function to time a run over every string, in ns per string (best of 5)
+def per_string(run, texts):
+    return min(timeit.repeat(lambda: run(texts), number=1, repeat=5)) * 1e9 / len(texts)
+
+# Main execution
+if __name__ == "__main__":
+    french, arabic = load_senses()
+    print(f"{len(french)} French and {len(arabic)} Arabic sense texts from logs/")
+    assert [normalize_text(text) for text in french] == [legacy_normalize_text(text) for text in french] == normalize_texts(french)
+    assert [normalize_arabic(text) for text in arabic] == [legacy_normalize_arabic(text) for text in arabic] == normalize_arabic_texts(arabic)
+    assert [split_by_delimiters(text) for text in french + arabic] == [legacy_split_by_delimiters(text) for text in french + arabic] == split_texts(french + arabic)
+
+    print(f"{'ns per string':>30} {'before':>8} {'after':>8}")
+    for name, legacy, single, texts in (
+        ("normalize_text (French)", legacy_normalize_text, normalize_text, french),
+        ("normalize_arabic (Arabic)", legacy_normalize_arabic, normalize_arabic, arabic),
+        ("split_by_delimiters (French)", legacy_split_by_delimiters, split_by_delimiters, french),
+        ("split_by_delimiters (Arabic)", legacy_split_by_delimiters, split_by_delimiters, arabic),
+    ):
+        before = per_string(lambda texts: [legacy(text) for text in texts], texts)
+        after = per_string(lambda texts: [single(text) for text in texts], texts)
+        print(f"{name:>30} {before:8.0f} {after:8.0f}")
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reverse_index import ReverseIndex, entry_terms
+from jsonl_results import iter_result_records, default_result_files
+import random
+
+# Previous workflow: scan the senses and related phrases of every entry for the query words
+def linear_scan(entries, words):
+    return {session_id for session_id, entry in entries.items() if all(word in entry_terms(entry) for word in words)}
+
+# Main execution
+if __name__ == "__main__":
+    entries = dict(iter_result_records(default_result_files()))
+    start = time.perf_counter()
+    index = ReverseIndex.build(entries.items())
+    print(f"Indexed {len(entries)} entries, {len(index.terms)} words in {time.perf_counter() - start:.2f} s")
+
+    random.seed(0)
+    queries = [" ".join(random.sample(sorted(entry_terms(entry)), min(2, len(entry_terms(entry)))))
+               for entry in random.sample(list(entries.values()), 50) if entry_terms(entry)]
+
+    start = time.perf_counter()
+    scanned = [linear_scan(entries, query.split()) for query in queries[:10]]
+    scan_time = (time.perf_counter() - start) / 10
+    start = time.perf_counter()
+    found = [index.search(query, limit=len(entries)) for query in queries]
+    search_time = (time.perf_counter() - start) / len(queries)
+    assert scanned == [{session_id for session_id, _, _ in results} for results in found[:10]]
+    print(f"Two-word query: linear scan {scan_time * 1e3:8.2f} ms, index {search_time * 1e3:8.3f} ms")
+
+    prefixes = [query.split()[0][:3] + "*" for query in queries]
+    start = time.perf_counter()
+    for query in prefixes:
+        index.search(query)
+    print(f"Three-letter prefix query: index {(time.perf_counter() - start) * 1e3 / len(prefixes):8.3f} ms")
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from abbreviation_mapper import UnmatchedAbbreviations, map_morph_to_abbreviation, map_pos_to_abbreviation
+from data_extractors import extract_main_word_and_pos, extract_morphology, extract_senses, extract_related_phrases, extract_entry, extract_entry_by_parts
+from normalization_utils import split_by_delimiters
+from parser_backends import PARSER_BACKENDS, find_result_div
+from stand_in_server import POS_LABELS, MORPH_LABELS, display_label
+from bench_extractors import load_fixtures
+import argparse
+import contextlib
+import fetch_html
+import io
+import json
+import platform
+import tracemalloc
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Function to build the inputs of every stage from the fixture pages (no network access)
+def load_stage_inputs():
+    pages = load_fixtures()
+    divs, strings, pos_tags, morph_labels = [], [], [], []
+    for session_id, html in pages.items():
+        _, result_div = find_result_div(html, "html.parser")
+        if result_div is None:
+            continue
+        divs.append((session_id, result_div))
+
+        # The texts the extractors split: variants, morphology forms, French and Arabic senses
+        for li in result_div.find_all('li'):
+            texts = list(li.stripped_strings)
+            if 'Sens' in li.text and len(texts) >= 3:
+                strings.extend((texts[1], texts[2]))
+            elif li.find('b'):
+                strings.append(li.find('b').text)
+
+        # The labels the mappers resolve, as the pages display them
+        entry = extract_entry_by_parts(result_div, UnmatchedAbbreviations(), session_id)
+        pos_tags.append((session_id, [display_label(POS_LABELS, pos) for pos in entry["pos"]]))
+        morph_labels.extend((session_id, display_label(MORPH_LABELS, key)) for form in entry["morph"] for key in form)
+    return pages, divs, strings, pos_tags, morph_labels
+
+# Function to list the stages to measure, as (name, function of one input, inputs)
+def build_stages():
+    pages, divs, strings, pos_tags, morph_labels = load_stage_inputs()
+    unmatched = UnmatchedAbbreviations()
+    stages = [("fetch_html.parse_result_div", lambda page: fetch_html.parse_result_div(*page), list(pages.items()))]
+    for backend in PARSER_BACKENDS:
+        try:
+            find_result_div("", backend)
+        except ImportError:
+            continue
+        stages.append((f"find_result_div[{backend}]", lambda page, backend=backend: find_result_div(page[1], backend), list(pages.items())))
+    stages += [
+        ("extract_main_word_and_pos", lambda div: extract_main_word_and_pos(div[1], unmatched, div[0]), divs),
+        ("extract_morphology", lambda div: extract_morphology(div[1], unmatched, div[0]), divs),
+        ("extract_senses", lambda div: extract_senses(div[1]), divs),
+        ("extract_related_phrases", lambda div: extract_related_phrases(div[1]), divs),
+        ("extract_entry (single pass)", lambda div: extract_entry(div[1], unmatched, div[0]), divs),
+        ("split_by_delimiters", split_by_delimiters, strings),
+        ("map_pos_to_abbreviation", lambda tags: map_pos_to_abbreviation(tags[1], unmatched, tags[0]), pos_tags),
+        ("map_morph_to_abbreviation", lambda label: map_morph_to_abbreviation(label[1], unmatched, label[0]), morph_labels),
+    ]
+    return stages
+
+# Function to time every call of a stage and measure its allocations
+def measure_stage(run, inputs, rounds=50, warmup=3):
+    for _ in range(warmup):
+        for item in inputs:
+            run(item)
+
+    latencies = []
+    for _ in range(rounds):
+        for item in inputs:
+            started = time.perf_counter_ns()
+            run(item)
+            latencies.append(time.perf_counter_ns() - started)
+        fetch_html.failure_collector.drain()  # parse_result_div logs the error pages on every round
+    latencies.sort()
+
+    # Allocations in a separate pass, tracemalloc slows every allocation down
+    peak_bytes = 0
+    tracemalloc.start()
+    for item in inputs:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        run(item)
+        peak_bytes += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] / 1e3
+
+    return {
+        "calls_per_s": len(latencies) / (sum(latencies) / 1e9),
+        "p50_us": percentile(.5),
+        "p95_us": percentile(.95),
+        "p99_us": percentile(.99),
+        "peak_kib_per_call": peak_bytes / 1024 / len(inputs),
+    }
+
+# Function to compare results with a saved baseline, returning the stages that got slower or allocate more
+# (allocation changes under min_kib are noise from caches warming up)
+def compare_with_baseline(results, baseline, threshold, min_kib=1):
+    regressions = []
+    print(f"\n{'stage':34} {'p50 vs baseline':>16} {'peak KiB vs baseline':>21}")
+    for name, result in results.items():
+        if name not in baseline["stages"]:
+            continue
+        base = baseline["stages"][name]
+        latency_change = result["p50_us"] / base["p50_us"] - 1
+        memory_change = result["peak_kib_per_call"] / base["peak_kib_per_call"] - 1 if base["peak_kib_per_call"] else 0
+        memory_growth = result["peak_kib_per_call"] - base["peak_kib_per_call"]
+        regressed = latency_change > threshold or (memory_change > threshold and memory_growth > min_kib)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:34} {latency_change:+15.0%} {memory_change:+20.0%}  {'REGRESSION' if regressed else ''}")
+    return regressions
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-stage throughput, latency percentiles and allocations on the fixture pages (offline)")
+    parser.add_argument("--rounds", type=int, default=50, help="passes over the inputs of each stage")
+    parser.add_argument("--stage", help="only run the stages whose name contains this text")
+    parser.add_argument("--save", metavar="NAME", help="save the results as benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with benchmarks/baselines/NAME.json, exit with status 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=.2, help="relative slowdown or allocation growth counted as a regression")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        stages = build_stages()
+    results = {}
+    print(f"{'stage':34} {'inputs':>6} {'calls/s':>10} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9} {'peak KiB':>9}")
+    for name, run, inputs in stages:
+        if args.stage and args.stage not in name:
+            continue
+        # Silence the warnings and failure messages printed by the stages
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = results[name] = measure_stage(run, inputs, args.rounds)
+        print(f"{name:34} {len(inputs):6} {result['calls_per_s']:10.0f} {result['p50_us']:9.2f} {result['p95_us']:9.2f} {result['p99_us']:9.2f} {result['peak_kib_per_call']:9.2f}")
+
+    if args.save:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{args.save}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"python": platform.python_version(), "machine": platform.platform(), "stages": results}, f, indent=4)
+        print(f"\nBaseline saved to {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f"{args.compare}.json"), encoding='utf-8') as f:
+            regressions = compare_with_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            raise SystemExit(1)
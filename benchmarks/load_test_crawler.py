@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stand_in_server import load_entries, synthesize_entry
+from crawl_journal import CrawlJournal
+from jsonl_results import iter_result_records, find_result_files
+from collections import Counter
+import argparse
+import json
+import subprocess
+import tempfile
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Options passed on to the stand-in server, as (option, attribute of the parsed arguments)
+SERVER_OPTIONS = [("--connect-delay", "connect_delay"), ("--latency", "latency"), ("--synthesize", "synthesize"),
+                  ("--server-error-rate", "server_error_rate"), ("--server-error-status", "server_error_status"),
+                  ("--php-error-rate", "php_error_rate"), ("--no-result-rate", "no_result_rate"), ("--seed", "seed")]
+
+def fetch_json(url):
+    with urllib.request.urlopen(url, timeout=10) as response:
+        return json.load(response)
+
+# Function to start the stand-in server and wait until it answers
+def start_server(args):
+    command = [sys.executable, "stand_in_server.py", "--port", str(args.port)]
+    for option, attribute in SERVER_OPTIONS:
+        if getattr(args, attribute) is not None:
+            command += [option, str(getattr(args, attribute))]
+    for folder in args.replay:
+        command += ["--replay", folder]
+    server = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)  # Connections reset by the crawler on exit
+    for _ in range(600):
+        try:
+            fetch_json(f"http://127.0.0.1:{args.port}/stand-in/stats")
+            return server
+        except OSError:
+            time.sleep(.1)
+    server.kill()
+    raise RuntimeError("The stand-in server did not start")
+
+# Function to crawl the range with an engine into a temporary folder; returns (seconds, journal outcomes, extracted entries, metrics)
+def run_crawler(args, engine, folder):
+    log_folder, journal_path = os.path.join(folder, "run"), os.path.join(folder, "journal.tsv")
+    command = [sys.executable, "index.py", "--engine", engine, "--start", str(args.start), "--end", str(args.end),
+               "--concurrency", str(args.concurrency), "--base-url", f"http://127.0.0.1:{args.port}/dglai/search/indexs",
+               "--log-folder", log_folder, "--journal", journal_path, "--no-cache", "--metrics-format", "json"] + args.index_args
+    started = time.perf_counter()
+    subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+    elapsed = time.perf_counter() - started
+    journal = CrawlJournal(journal_path)
+    journal.close()
+    extracted = dict(iter_result_records(find_result_files(log_folder)))
+    with open(os.path.join(log_folder, "metrics.json"), encoding='utf-8') as f:
+        metrics = json.load(f)
+    return elapsed, journal.outcomes, extracted, metrics
+
+def counter_total(metrics, name):
+    return sum(counter["value"] for counter in metrics["counters"] if counter["name"] == name)
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl a range against the stand-in server with latency and injected faults, "
+                                                 "and report each engine's throughput and how it handled the faults",
+                                     epilog="Arguments after -- are passed to index.py, e.g. -- --parser selectolax --max-retries 5")
+    parser.add_argument("--engines", default="threaded,async,adaptive", help="comma-separated index.py engines to measure")
+    parser.add_argument("--start", type=int, default=143000)
+    parser.add_argument("--end", type=int, default=144000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--port", type=int, default=8001, help="port of the stand-in server started by the script")
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--latency", default="lognormal:0.02,0.5", help="stand-in server latency distribution")
+    parser.add_argument("--synthesize", type=float, help="share of the session IDs without an entry given a made-up one")
+    parser.add_argument("--replay", action="append", default=[], metavar="FOLDER", help="recorded pages to replay (raw HTML cache or <session_id>.html files)")
+    parser.add_argument("--server-error-rate", type=float, default=0.05)
+    parser.add_argument("--server-error-status", type=int)
+    parser.add_argument("--php-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-result-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("index_args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    args.index_args = args.index_args[1:] if args.index_args[:1] == ["--"] else args.index_args
+
+    # The entries the server renders, to check what the crawler extracted from them
+    entries = load_entries()
+    templates = [entries[session_id] for session_id in sorted(entries, key=int)]
+
+    print(f"{'engine':>9} {'sessions/s':>11} {'requests':>9} {'injected':>9} {'retries':>8} {'right outcome':>14} {'same entry':>11}  outcomes")
+    for engine in args.engines.split(","):
+        server = start_server(args)
+        try:
+            with tempfile.TemporaryDirectory() as folder:
+                elapsed, outcomes, extracted, metrics = run_crawler(args, engine, folder)
+            stats = fetch_json(f"http://127.0.0.1:{args.port}/stand-in/stats?sessions")
+        finally:
+            server.terminate()
+            server.wait()
+
+        # Right outcome: the crawler recorded what the last response of the session called for (a failed
+        # session keeps an injected 5xx once its retries are spent). Same entry: the extracted entry is the one rendered.
+        sessions = stats["sessions"]
+        right = sum(1 for session_id, outcome in outcomes.items() if session_id in sessions and sessions[session_id][1] == outcome)
+        rendered = {session_id: entries[session_id] if kind == "entry" else synthesize_entry(session_id, templates)
+                    for session_id, (kind, outcome) in sessions.items() if outcome == "ok" and kind in ("entry", "synthesized")}
+        same = sum(1 for session_id, entry in rendered.items() if extracted.get(session_id) == entry)
+        injected = sum(count for kind, count in stats["responses"].items() if kind in ("server_error", "injected_php_error", "injected_no_result"))
+        summary = ", ".join(f"{outcome} {count}" for outcome, count in Counter(outcomes.values()).most_common())
+        print(f"{engine:>9} {len(outcomes) / elapsed:11.0f} {stats['requests']:9} {injected:9} {counter_total(metrics, 'retries_total'):8} "
+              f"{right:7}/{len(outcomes):<6} {same:5}/{len(rendered):<5}  {summary}")
+        missing = args.end - args.start - len(outcomes)
+        if missing:
+            print(f"{'':>9} {missing} session IDs of the range have no outcome in the journal")
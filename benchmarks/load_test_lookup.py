@@ -0,0 +1,104 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jsonl_results import iter_result_records, default_result_files
+from lookup_service import DEFAULT_PORT
+from urllib.parse import quote
+import aiohttp
+import argparse
+import asyncio
+import multiprocessing
+import random
+import subprocess
+import urllib.request
+
+SERVICE_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lookup_service.py")
+
+# Function to build a mix of lookup paths from the extracted entries: headwords, transcriptions, forms and session IDs
+def build_paths(count, seed=0):
+    entries = dict(iter_result_records(default_result_files()))
+    random.seed(seed)
+    paths = []
+    for session_id in random.choices(list(entries), k=count):
+        entry = entries[session_id]
+        forms = [value for form in entry["morph"] for values in form.values() for value in values] + entry["var"]
+        kind = random.choice(("mw", "tr", "form", "id") if forms else ("mw", "tr", "id"))
+        word = {"mw": entry["mw"], "tr": entry["tr"], "id": session_id}.get(kind) or random.choice(forms)
+        paths.append(f"/lookup?{kind}={quote(word)}")
+    return paths
+
+# Function to send requests over concurrent keep-alive connections for a while, returning the latencies (seconds)
+async def send_requests(url, paths, connections, duration):
+    latencies = []
+    deadline = time.perf_counter() + duration
+    connector = aiohttp.TCPConnector(limit=connections)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        async def client(offset):
+            position = offset
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                async with http.get(url + paths[position % len(paths)]) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                position += connections
+        await asyncio.gather(*(client(offset) for offset in range(connections)))
+    return latencies
+
+def run_client(url, paths, connections, duration, results):
+    results.put(asyncio.run(send_requests(url, paths, connections, duration)))
+
+# Function to load the service from several client processes (one client process cannot saturate several server cores)
+def load(url, paths, clients, connections, duration):
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=run_client, args=(url, paths[offset::clients], connections, duration, results)) for offset in range(clients)]
+    for process in processes:
+        process.start()
+    latencies = []
+    for _ in processes:
+        latencies.extend(results.get())
+    for process in processes:
+        process.join()
+    latencies.sort()
+    return latencies
+
+# Function to start the service with a number of processes and wait until it answers
+def start_service(port, workers):
+    service = subprocess.Popen([sys.executable, SERVICE_SCRIPT, "--port", str(port), "--workers", str(workers), "--reload-interval", "0"],
+                               stdout=subprocess.DEVNULL)
+    for _ in range(600):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+            time.sleep(1)  # Let the other processes finish loading their index
+            return service
+        except OSError:
+            time.sleep(.1)
+    service.kill()
+    raise RuntimeError("The lookup service did not start")
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Requests per second of the lookup service, with one server process and with several")
+    parser.add_argument("--url", help="load an already running service instead of starting one per --workers setting")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count()}", help="comma-separated numbers of server processes to measure")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT + 1, help="port of the services started by the script")
+    parser.add_argument("--clients", type=int, default=max(1, os.cpu_count() // 2), help="load generating processes")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent connections per client process")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load per measurement")
+    parser.add_argument("--distinct", type=int, default=2000, help="distinct lookups in the mix (fewer: more LRU cache hits)")
+    args = parser.parse_args()
+
+    paths = build_paths(args.distinct)
+    settings = [(None, args.url)] if args.url else [(int(workers), f"http://127.0.0.1:{args.port}") for workers in args.workers.split(",")]
+    print(f"{'server processes':>16} {'requests/s':>11} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers, url in settings:
+        service = start_service(args.port, workers) if workers else None
+        try:
+            latencies = load(url, paths, args.clients, args.connections, args.duration)
+        finally:
+            if service:
+                service.terminate()
+                service.wait()
+        print(f"{workers or '?':>16} {len(latencies) / args.duration:11.0f} {latencies[len(latencies) // 2] * 1e3:8.2f} {latencies[int(len(latencies) * .99)] * 1e3:8.2f}")
@@ -0,0 +1,301 @@
+from jsonl_results import iter_result_records, default_result_files
+from colorama import Fore, init
+from array import array
+from collections import Counter
+import argparse
+import bisect
+import json
+import mmap
+import struct
+import sys
+
+# Compact export of the extracted dictionary, laid out to be memory-mapped (all integers little-endian):
+#   header          magic, version, entry count, string count, string blob size, record blob size
+#   string offsets  u32 x (string count + 1), into the string blob (most frequent strings first)
+#   session IDs     u32 x entry count, ascending
+#   mw, tr          u32 x entry count each, string numbers (NO_STRING when the entry is not {mw, tr, ...})
+#   record offsets  u32 x (entry count + 1), into the record blob
+#   record blob     the other fields of each entry, as tagged varints referring to the string table
+MAGIC = b"AMZD"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHIIII")
+NO_STRING = 0xFFFFFFFF
+
+# Strings are stored one byte per character when they fit ASCII plus one 128-character window of a script:
+# a first byte selects the window (or plain UTF-8), then bytes >= 0x80 stand for window characters
+STRING_WINDOWS = {1: 0x0080, 2: 0x0600, 3: 0x2D30}  # Latin-1 (French), Arabic, Tifinagh
+WINDOW_UTF8 = 0
+ENCODE_TABLES = {window: {base + i: 0x80 + i for i in range(0x80)} for window, base in STRING_WINDOWS.items()}
+DECODE_TABLES = {window: {0x80 + i: base + i for i in range(0x80)} for window, base in STRING_WINDOWS.items()}
+
+def encode_string(string):
+    for window, table in ENCODE_TABLES.items():
+        try:
+            encoded = string.translate(table).encode('latin-1')
+        except UnicodeEncodeError:
+            continue
+        if encoded.decode('latin-1').translate(DECODE_TABLES[window]) == string:
+            return bytes([window]) + encoded
+    return bytes([WINDOW_UTF8]) + string.encode('utf-8')
+
+def decode_string(data):
+    window = data[0]
+    if window == WINDOW_UTF8:
+        return str(data[1:], 'utf-8')
+    return str(data[1:], 'latin-1').translate(DECODE_TABLES[window])
+
+# Value tags of the record blob
+TAG_STRING, TAG_LIST, TAG_DICT, TAG_INT, TAG_NULL, TAG_TRUE, TAG_FALSE, TAG_FLOAT, TAG_STRINGS = range(9)
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def read_varint(data, position):
+    value = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+# Function to list every string of a value (dict keys included), for the string table
+def collect_strings(value, counts):
+    if isinstance(value, str):
+        counts[value] += 1
+    elif isinstance(value, list):
+        for item in value:
+            collect_strings(item, counts)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            counts[key] += 1
+            collect_strings(item, counts)
+
+# Function to append the tagged encoding of a JSON value
+def encode_value(out, value, string_numbers):
+    if isinstance(value, str):
+        out.append(TAG_STRING)
+        write_varint(out, string_numbers[value])
+    elif isinstance(value, list) and value and all(isinstance(item, str) for item in value):
+        out.append(TAG_STRINGS)  # Lists of strings (pos, var, forms, senses) need no tag per item
+        write_varint(out, len(value))
+        for item in value:
+            write_varint(out, string_numbers[item])
+    elif isinstance(value, list):
+        out.append(TAG_LIST)
+        write_varint(out, len(value))
+        for item in value:
+            encode_value(out, item, string_numbers)
+    elif isinstance(value, dict):
+        out.append(TAG_DICT)
+        write_varint(out, len(value))
+        for key, item in value.items():
+            write_varint(out, string_numbers[key])
+            encode_value(out, item, string_numbers)
+    elif value is None:
+        out.append(TAG_NULL)
+    elif value is True or value is False:
+        out.append(TAG_TRUE if value else TAG_FALSE)
+    elif isinstance(value, int):
+        out.append(TAG_INT)
+        write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)  # Zigzag
+    else:
+        out.append(TAG_FLOAT)
+        out.extend(struct.pack("<d", value))
+
+# Function to split an entry into its mw/tr columns and the rest (the whole entry when it does not start with them)
+def split_entry(entry):
+    keys = list(entry)[:2]
+    if keys == ["mw", "tr"] and isinstance(entry["mw"], str) and isinstance(entry["tr"], str):
+        return entry["mw"], entry["tr"], {key: value for key, value in entry.items() if key not in ("mw", "tr")}
+    return None, None, entry
+
+# Function to write {session_id: entry} results to a compact export file
+def export_compact(results, path):
+    session_ids = sorted(results, key=int)
+    for session_id in session_ids:
+        if str(int(session_id)) != session_id:
+            raise ValueError(f"Session ID {session_id!r} cannot be stored as a number")
+
+    split = [split_entry(results[session_id]) for session_id in session_ids]
+    counts = Counter()
+    for mw, tr, rest in split:
+        collect_strings([mw, tr, rest] if mw is not None else rest, counts)
+    strings = [string for string, _ in counts.most_common()]  # Frequent strings get one-byte numbers
+    string_numbers = {string: number for number, string in enumerate(strings)}
+
+    string_blob = bytearray()
+    string_offsets = array('I', [0])
+    for string in strings:
+        string_blob += encode_string(string)
+        string_offsets.append(len(string_blob))
+
+    record_blob = bytearray()
+    record_offsets = array('I', [0])
+    mw_column, tr_column = array('I'), array('I')
+    for mw, tr, rest in split:
+        mw_column.append(NO_STRING if mw is None else string_numbers[mw])
+        tr_column.append(NO_STRING if tr is None else string_numbers[tr])
+        encode_value(record_blob, rest, string_numbers)
+        record_offsets.append(len(record_blob))
+
+    columns = [string_offsets, array('I', map(int, session_ids)), mw_column, tr_column, record_offsets]
+    if sys.byteorder != "little":
+        for column in columns:
+            column.byteswap()
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(session_ids), len(strings), len(string_blob), len(record_blob)))
+        f.write(columns[0].tobytes())
+        f.write(string_blob)
+        for column in columns[1:]:
+            f.write(column.tobytes())
+        f.write(record_blob)
+    return len(session_ids)
+
+# Memory-mapped reader of a compact export: entries and strings are only decoded when asked for
+class CompactDictionary:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self.map)
+        magic, version, self.count, string_count, string_size, record_size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} compact export")
+
+        position = HEADER.size
+        self.string_offsets, position = self.column(data, position, string_count + 1)
+        self.string_blob = data[position:position + string_size]
+        position += string_size
+        self.session_ids, position = self.column(data, position, self.count)
+        self.mw_column, position = self.column(data, position, self.count)
+        self.tr_column, position = self.column(data, position, self.count)
+        self.record_offsets, position = self.column(data, position, self.count + 1)
+        self.record_blob = data[position:position + record_size]
+        self.strings = [None] * string_count
+
+    # Function to read a u32 column in place (copied only on big-endian machines)
+    def column(self, data, position, length):
+        end = position + 4 * length
+        if sys.byteorder == "little":
+            return data[position:end].cast('I'), end
+        column = array('I', data[position:end])
+        column.byteswap()
+        return column, end
+
+    def close(self):
+        for view in (self.string_offsets, self.string_blob, self.session_ids, self.mw_column, self.tr_column, self.record_offsets, self.record_blob):
+            if isinstance(view, memoryview):
+                view.release()
+        self.map.close()
+
+    def string(self, number):
+        string = self.strings[number]
+        if string is None:
+            string = self.strings[number] = decode_string(self.string_blob[self.string_offsets[number]:self.string_offsets[number + 1]])
+        return string
+
+    def decode_value(self, position):
+        data = self.record_blob
+        tag = data[position]
+        position += 1
+        if tag == TAG_STRING:
+            number, position = read_varint(data, position)
+            return self.string(number), position
+        if tag == TAG_STRINGS:
+            length, position = read_varint(data, position)
+            items = []
+            for _ in range(length):
+                number, position = read_varint(data, position)
+                items.append(self.string(number))
+            return items, position
+        if tag == TAG_LIST:
+            length, position = read_varint(data, position)
+            items = []
+            for _ in range(length):
+                item, position = self.decode_value(position)
+                items.append(item)
+            return items, position
+        if tag == TAG_DICT:
+            length, position = read_varint(data, position)
+            items = {}
+            for _ in range(length):
+                key, position = read_varint(data, position)
+                items[self.string(key)], position = self.decode_value(position)
+            return items, position
+        if tag == TAG_INT:
+            value, position = read_varint(data, position)
+            return (value >> 1) ^ -(value & 1), position
+        if tag == TAG_FLOAT:
+            return struct.unpack_from("<d", data, position)[0], position + 8
+        return {TAG_NULL: None, TAG_TRUE: True, TAG_FALSE: False}[tag], position
+
+    # Function to decode the entry stored at a position of the columns
+    def entry_at(self, index):
+        rest = self.decode_value(self.record_offsets[index])[0]
+        if self.mw_column[index] == NO_STRING:
+            return rest
+        return {"mw": self.string(self.mw_column[index]), "tr": self.string(self.tr_column[index]), **rest}
+
+    # Function to find the position of a session ID in the columns (None when missing)
+    def index_of(self, session_id):
+        session_id = int(session_id)
+        index = bisect.bisect_left(self.session_ids, session_id)
+        if index < self.count and self.session_ids[index] == session_id:
+            return index
+        return None
+
+    # Function to get the entry of a session ID (None if unknown)
+    def get(self, session_id):
+        index = self.index_of(session_id)
+        return None if index is None else self.entry_at(index)
+
+    def __contains__(self, session_id):
+        return self.index_of(session_id) is not None
+
+    def __len__(self):
+        return self.count
+
+    # Function to iterate over (session_id, entry) pairs, in session ID order
+    def items(self):
+        for index in range(self.count):
+            yield str(self.session_ids[index]), self.entry_at(index)
+
+    # Function to decode the whole export back to the {session_id: entry} JSON schema
+    def to_dict(self):
+        return dict(self.items())
+
+# Function to convert JSON/JSONL result files into one compact export (later files win for a session ID)
+def json_to_compact(result_files, path):
+    return export_compact(dict(iter_result_records(result_files)), path)
+
+# Function to convert a compact export back into an indented JSON file, as written by save_data_to_file
+def compact_to_json(path, json_path):
+    dictionary = CompactDictionary(path)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(dictionary.to_dict(), f, ensure_ascii=False, indent=4)
+    count = len(dictionary)
+    dictionary.close()
+    return count
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Convert the extracted entries to and from the compact export format")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="compact JSON/JSONL result files (default: extracted_data.json and every result file under logs/)")
+    export.add_argument("result_files", nargs="*")
+    export.add_argument("--output", default="dictionary.amzd")
+    to_json = subparsers.add_parser("to-json", help="convert a compact export back to JSON")
+    to_json.add_argument("path")
+    to_json.add_argument("--output", required=True, help="JSON file to write (not extracted_data.json, which holds the crawled entries)")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        count = json_to_compact(args.result_files or default_result_files(), args.output)
+    else:
+        count = compact_to_json(args.path, args.output)
+    print(Fore.GREEN + f"Wrote {count} entries to {args.output}")
@@ -0,0 +1,96 @@
+from fetch_html import OUTCOME_OK, OUTCOME_PHP_ERROR, OUTCOME_NO_RESULT
+from jsonl_results import iter_result_records, find_result_files
+import glob
+import os
+import re
+import threading
+
+# Default location of the crawl journal
+DEFAULT_JOURNAL_PATH = "logs/crawl_journal.tsv"
+
+# Outcomes that will not change on a retry: extracted entries and known-dead session IDs
+FINAL_OUTCOMES = {OUTCOME_OK, OUTCOME_PHP_ERROR, OUTCOME_NO_RESULT, "http_404"}
+
+# The site answers dead session IDs with a PHP error page, but also live ones while it struggles
+# (retry_php_errors reschedules them, e.g. after a run during a bad-server period)
+RETRYABLE_OUTCOMES = {OUTCOME_PHP_ERROR}
+
+# Patterns of the lines written to the failed_sessions_*.log files
+FAILED_LOG_PATTERNS = [
+    (re.compile(r"Session ID: (\d+) - PHP error encountered"), lambda match: OUTCOME_PHP_ERROR),
+    (re.compile(r"Session ID: (\d+) - No 'div\.(?:result|titreamz)' found"), lambda match: OUTCOME_NO_RESULT),
+    (re.compile(r"Session ID: (\d+) - Status code: (\S+)"), lambda match: f"http_{match.group(2)}"),
+]
+
+# Append-only journal of session outcomes, one "session_id<TAB>outcome" line each (last one wins)
+class CrawlJournal:
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, batch_size=100, retry_php_errors=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.final_outcomes = FINAL_OUTCOMES - RETRYABLE_OUTCOMES if retry_php_errors else FINAL_OUTCOMES
+        self.lock = threading.Lock()
+        self.outcomes = {}
+        self.pending = 0
+        self.load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    # Function to load the journal in a single pass
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 2:  # Ignore a torn last line after a crash
+                    self.outcomes[parts[0]] = parts[1]
+
+    # Function to append the outcome of a session (fsync'd every batch_size records)
+    def record(self, session_id, outcome):
+        with self.lock:
+            self.outcomes[session_id] = outcome
+            self.file.write(f"{session_id}\t{outcome}\n")
+            self.pending += 1
+            if self.pending >= self.batch_size:
+                self.sync()
+
+    # Function to force the buffered records to disk (call with the lock held)
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.sync()
+            self.file.close()
+
+    # Function to check whether a session ID still has to be crawled
+    def is_outstanding(self, session_id):
+        return self.outcomes.get(session_id) not in self.final_outcomes
+
+    # Function to keep only the session IDs that still have to be crawled
+    def outstanding(self, session_ids):
+        return [session_id for session_id in session_ids if self.is_outstanding(session_id)]
+
+# Function to seed a journal from the outputs of earlier runs under logs/
+def seed_from_logs(journal, logs_root="logs"):
+    outcomes = {}
+
+    # Failures first, so a session that succeeded in a later run ends up as ok
+    for filename in sorted(glob.glob(f"{logs_root}/*/*/failed_sessions_*.log")):
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                for pattern, outcome in FAILED_LOG_PATTERNS:
+                    match = pattern.search(line)
+                    if match:
+                        outcomes[match.group(1)] = outcome(match)
+                        break
+
+    for session_id, _ in iter_result_records(find_result_files(logs_root)):
+        outcomes[session_id] = OUTCOME_OK
+
+    for session_id, outcome in outcomes.items():
+        if journal.outcomes.get(session_id) != outcome:
+            journal.record(session_id, outcome)
+    return len(outcomes)
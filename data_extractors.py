@@ -1,16 +1,23 @@
 from normalization_utils import split_by_delimiters
 from abbreviation_mapper import map_morph_to_abbreviation, map_pos_to_abbreviation
+from parser_backends import walk_result_div
+from metrics import verbose_print
 import re
 
+# First Tifinagh character, where the variants start in the word section
+TIFINAGH_PATTERN = re.compile(r"[ⴰ-⵿]")
+
 # Function to extract the main word, transcription, part of speech, and variant
 def extract_main_word_and_pos(result_div, unmatched_abbreviations, session_id):
     word_section = result_div.find('h5', class_='titreamz')
     word_tifinagh = word_section.find('b').text  # The main word
     word_transcription = word_section.find('i').text.strip("[]")  # Remove brackets
-    
-    remaining_text = word_section.get_text().replace(word_tifinagh, "").replace(f"[{word_transcription}]", "").strip()
-    tifinagh_pattern = re.compile(r"[ⴰ-⵿]")
-    match = tifinagh_pattern.search(remaining_text)
+    return split_word_section(word_section.get_text(), word_tifinagh, word_transcription, unmatched_abbreviations, session_id)
+
+# Function to split the text of the word section into POS tags and variants
+def split_word_section(section_text, word_tifinagh, word_transcription, unmatched_abbreviations, session_id):
+    remaining_text = section_text.replace(word_tifinagh, "").replace(f"[{word_transcription}]", "").strip()
+    match = TIFINAGH_PATTERN.search(remaining_text)
     
     if match:
         tifinagh_start_index = match.start()
@@ -66,7 +73,7 @@ def extract_senses(result_div):
     if senses:
         return senses
     else:
-        print("No senses found in the document.")
+        verbose_print("No senses found in the document.")
         return []
 
 # Function to extract related phrases
@@ -105,3 +112,172 @@ def extract_related_phrases(result_div):
         return related_phrases
     else:
         return []  # Return empty if no valid related phrases found
+
+# Marker for a <br> followed by an element or by nothing (the extractors need a text)
+NOT_TEXT = object()
+
+# Collector filled by a single walk over the result div (see parser_backends.walk_result_div).
+# It records what the extract_* functions look up: the first h5.titreamz with its first <b>/<i>,
+# every <ul> with the <li> inside it, and for each <li> its text, first <b> and <br> siblings.
+class EntryBuilder:
+    def __init__(self):
+        self.word_section = None
+        self.word_section_open = False
+        self.lists = []
+        self.open_lists = []
+        self.open_items = []
+        self.captures = []   # Text buffers of the elements currently open
+        self.frames = []     # (tag, number of captures opened by the element)
+        self.pending_brs = []
+
+    # Function to give the <br> elements just closed their next sibling
+    def resolve_brs(self, sibling):
+        for br in self.pending_brs:
+            br[0] = sibling
+        self.pending_brs = []
+
+    def start(self, tag, classes):
+        if self.pending_brs:
+            self.resolve_brs(NOT_TEXT)
+        opened = 0
+        if tag == 'li':
+            item = {"text": [], "b": None, "brs": []}
+            for ul in self.open_lists:
+                ul["items"].append(item)
+            self.open_items.append(item)
+            self.captures.append(item["text"])
+            opened += 1
+        elif tag == 'b':
+            if self.word_section_open and self.word_section["b"] is None:
+                self.word_section["b"] = []
+                self.captures.append(self.word_section["b"])
+                opened += 1
+            for item in self.open_items:
+                if item["b"] is None:
+                    item["b"] = []
+                    self.captures.append(item["b"])
+                    opened += 1
+        elif tag == 'br':
+            self.pending_brs = []
+            for item in self.open_items:
+                br = [None]
+                item["brs"].append(br)
+                self.pending_brs.append(br)
+        elif tag == 'ul':
+            ul = {"titreamz": 'titreamz' in classes, "items": []}
+            self.lists.append(ul)
+            self.open_lists.append(ul)
+        elif tag == 'i':
+            if self.word_section_open and self.word_section["i"] is None:
+                self.word_section["i"] = []
+                self.captures.append(self.word_section["i"])
+                opened += 1
+        elif tag == 'h5' and self.word_section is None and 'titreamz' in classes:
+            self.word_section = {"text": [], "b": None, "i": None}
+            self.word_section_open = True
+            self.captures.append(self.word_section["text"])
+            opened += 1
+        self.frames.append((tag, opened))
+
+    def text(self, data):
+        if self.pending_brs:
+            self.resolve_brs(data)
+        for capture in self.captures:
+            capture.append(data)
+
+    # Function for nodes that are neither elements nor text (e.g. comments)
+    def other(self):
+        if self.pending_brs:
+            self.resolve_brs(NOT_TEXT)
+
+    def end(self):
+        tag, opened = self.frames.pop()
+        if tag == 'br':
+            return  # Its next sibling is the next node seen
+        if self.pending_brs:
+            self.resolve_brs(NOT_TEXT)
+        if opened:
+            del self.captures[-opened:]
+        if tag == 'li':
+            self.open_items.pop()
+        elif tag == 'ul':
+            self.open_lists.pop()
+        elif tag == 'h5' and self.word_section_open and not any(frame[0] == 'h5' for frame in self.frames):
+            self.word_section_open = False
+
+# Function to extract a full dictionary entry from the result div in a single pass
+def extract_entry(result_div, unmatched_abbreviations, session_id):
+    builder = EntryBuilder()
+    walk_result_div(result_div, builder)
+    return build_entry(builder, unmatched_abbreviations, session_id)
+
+# Function to turn what the walk collected into the same entry as the extract_* functions
+def build_entry(builder, unmatched_abbreviations, session_id):
+    # Main word, transcription, part of speech, and variant
+    word_section = builder.word_section
+    if word_section is None or word_section["b"] is None or word_section["i"] is None:
+        raise ValueError("No 'h5.titreamz' word section with a main word and a transcription")
+    word_tifinagh = ''.join(word_section["b"])
+    word_transcription = ''.join(word_section["i"]).strip("[]")
+    word_tifinagh, word_transcription, pos_tag, variants = split_word_section(
+        ''.join(word_section["text"]), word_tifinagh, word_transcription, unmatched_abbreviations, session_id)
+
+    # Morphology, from the first ul.titreamz
+    morphology = []
+    morphology_list = next((ul for ul in builder.lists if ul["titreamz"]), None)
+    if morphology_list:
+        for item in morphology_list["items"]:
+            form_text = ''.join(item["text"]).split(':')
+            if len(form_text) == 2:
+                if item["b"] is None:
+                    raise ValueError("Morphology form without a <b> value")
+                key_abbreviated = map_morph_to_abbreviation(form_text[0].strip(), unmatched_abbreviations, session_id)
+                morphology.append({key_abbreviated: split_by_delimiters(''.join(item["b"]).strip())})
+
+    # Senses, from every <li> mentioning 'Sens'
+    senses = []
+    for ul in builder.lists:
+        for item in ul["items"]:
+            if 'Sens' in ''.join(item["text"]):
+                sense_text = [text.strip() for text in item["text"] if text.strip()]
+                if len(sense_text) >= 3:
+                    senses.append({"fr": split_by_delimiters(sense_text[1]), "ar": split_by_delimiters(sense_text[2])})
+    if not senses:
+        verbose_print("No senses found in the document.")
+
+    # Related phrases, from the <li> with a <b> phrase in the lists other than ul.titreamz
+    related_phrases = []
+    for ul in builder.lists:
+        if ul["titreamz"]:
+            continue
+        for item in ul["items"]:
+            if item["b"] is None:
+                continue
+            if len(item["brs"]) >= 2:
+                french, arabic = item["brs"][0][0], item["brs"][1][0]
+                if not isinstance(french, str) or not isinstance(arabic, str):
+                    raise ValueError("Related phrase translation is not a text")
+                related_phrases.append({"zgh": ''.join(item["b"]).strip(), "fr": french.strip(), "ar": arabic.strip()})
+
+    return {
+        "mw": word_tifinagh,
+        "tr": word_transcription,
+        "pos": pos_tag,
+        "var": variants,
+        "morph": morphology,
+        "sens": senses,
+        "rp": related_phrases
+    }
+
+# Function to extract a full dictionary entry with the separate extract_* functions (BeautifulSoup trees only)
+def extract_entry_by_parts(result_div, unmatched_abbreviations, session_id):
+    word_tifinagh, word_transcription, pos_tag, variants = extract_main_word_and_pos(result_div, unmatched_abbreviations, session_id)
+    return {
+        "mw": word_tifinagh,
+        "tr": word_transcription,
+        "pos": pos_tag,
+        "var": variants,
+        "morph": extract_morphology(result_div, unmatched_abbreviations, session_id),
+        "sens": extract_senses(result_div),
+        "rp": extract_related_phrases(result_div)
+    }
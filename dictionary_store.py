@@ -0,0 +1,135 @@
+from jsonl_results import iter_result_records, default_result_files
+from colorama import Fore, init
+import argparse
+import json
+import os
+import sqlite3
+
+# Default location of the compiled dictionary
+DEFAULT_STORE_PATH = "dictionary.sqlite"
+
+SCHEMA = """
+CREATE TABLE entries (session_id INTEGER PRIMARY KEY, mw TEXT NOT NULL, tr TEXT NOT NULL, data TEXT NOT NULL);
+CREATE TABLE pos (session_id INTEGER NOT NULL, pos TEXT NOT NULL);
+CREATE TABLE variants (session_id INTEGER NOT NULL, variant TEXT NOT NULL);
+"""
+
+# Secondary indexes, created once the rows are in (faster than maintaining them during the inserts)
+INDEXES = """
+CREATE INDEX entries_mw ON entries (mw);
+CREATE INDEX entries_tr ON entries (tr);
+CREATE INDEX pos_pos ON pos (pos, session_id);
+CREATE INDEX variants_variant ON variants (variant);
+"""
+
+# Function to compile result files into one indexed SQLite store (later files win for a session ID)
+def build_store(path=DEFAULT_STORE_PATH, result_files=None, batch_size=5000):
+    # Later runs override earlier ones: keep the last entry of each session ID
+    entries = {}
+    for session_id, entry in iter_result_records(default_result_files() if result_files is None else result_files):
+        entries[int(session_id)] = entry
+
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.executescript(SCHEMA)
+
+    rows, pos_rows, variant_rows = [], [], []
+    for session_id in sorted(entries):
+        entry = entries[session_id]
+        rows.append((session_id, entry["mw"], entry["tr"], json.dumps(entry, ensure_ascii=False, separators=(',', ':'))))
+        pos_rows.extend((session_id, pos) for pos in entry["pos"])
+        variant_rows.extend((session_id, variant) for variant in entry["var"])
+        if len(rows) >= batch_size:
+            insert_rows(connection, rows, pos_rows, variant_rows)
+            rows, pos_rows, variant_rows = [], [], []
+    insert_rows(connection, rows, pos_rows, variant_rows)
+
+    connection.executescript(INDEXES)
+    connection.execute("ANALYZE")
+    connection.commit()
+    connection.close()
+    os.replace(temp_path, path)  # Readers never see a half-built store
+    return len(entries)
+
+def insert_rows(connection, rows, pos_rows, variant_rows):
+    connection.executemany("INSERT INTO entries VALUES (?, ?, ?, ?)", rows)
+    connection.executemany("INSERT INTO pos VALUES (?, ?)", pos_rows)
+    connection.executemany("INSERT INTO variants VALUES (?, ?)", variant_rows)
+
+# Read-only query API over the compiled store; entries are decoded only when returned
+class DictionaryStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, mmap_size=256 * 1024 * 1024):
+        self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self.connection.execute(f"PRAGMA mmap_size = {mmap_size}")
+
+    def close(self):
+        self.connection.close()
+
+    def rows_to_entries(self, rows):
+        return {str(session_id): json.loads(data) for session_id, data in rows}
+
+    # Function to get the entry of a session ID (None if unknown)
+    def get(self, session_id):
+        row = self.connection.execute("SELECT data FROM entries WHERE session_id = ?", (int(session_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Function to find the entries of a Tifinagh headword
+    def by_headword(self, mw):
+        return self.rows_to_entries(self.connection.execute("SELECT session_id, data FROM entries WHERE mw = ?", (mw,)))
+
+    # Function to find the entries of a Latin transcription
+    def by_transcription(self, tr):
+        return self.rows_to_entries(self.connection.execute("SELECT session_id, data FROM entries WHERE tr = ?", (tr,)))
+
+    # Function to find the entries listing a word as a variant
+    def by_variant(self, variant):
+        return self.rows_to_entries(self.connection.execute(
+            "SELECT e.session_id, e.data FROM variants v JOIN entries e ON e.session_id = v.session_id WHERE v.variant = ?", (variant,)))
+
+    # Function to list the entries with a part of speech (e.g. 'nfem'), in session ID order
+    def by_pos(self, pos, limit=100, offset=0):
+        return self.rows_to_entries(self.connection.execute(
+            "SELECT e.session_id, e.data FROM pos p JOIN entries e ON e.session_id = p.session_id WHERE p.pos = ? ORDER BY p.session_id LIMIT ? OFFSET ?",
+            (pos, limit, offset)))
+
+    # Function to find a Tifinagh word as a headword or as a variant
+    def lookup(self, word):
+        entries = self.by_headword(word)
+        entries.update(self.by_variant(word))
+        return entries
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Compile the extracted entries into an indexed SQLite store and query it")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="store file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("build", help="compile extracted_data.json and every result file under logs/")
+    query = subparsers.add_parser("query", help="look entries up")
+    query.add_argument("--id", help="session ID")
+    query.add_argument("--mw", help="Tifinagh headword or variant")
+    query.add_argument("--tr", help="Latin transcription")
+    query.add_argument("--pos", help="part of speech abbreviation")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        print(Fore.GREEN + f"Compiled {build_store(args.store)} entries into {args.store}")
+    else:
+        store = DictionaryStore(args.store)
+        if args.id:
+            entry = store.get(args.id)
+            found = {args.id: entry} if entry else {}
+        elif args.mw:
+            found = store.lookup(args.mw)
+        elif args.tr:
+            found = store.by_transcription(args.tr)
+        else:
+            found = store.by_pos(args.pos or "", limit=20)
+        print(json.dumps(found, ensure_ascii=False, indent=4))
@@ -1,44 +1,236 @@
 from colorama import Fore
+from collections import Counter, deque
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from parser_backends import find_result_div, DEFAULT_PARSER_BACKEND
+from metrics import metrics, verbose_print
+import re
 
-# Initialize a list to store failed session retrievals
-failed_sessions = []
+# Base URL of the dictionary search page (can be pointed at the local stand-in server)
+BASE_URL = "https://tal.ircam.ma/dglai/search/indexs"
 
-# Function to fetch HTML and return the result div inside titreamz
-def fetch_html(session_id):
-    url = f"https://tal.ircam.ma/dglai/search/indexs?session={session_id}"
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        html = response.text
-        
-        # Check for any PHP errors in the content
-        if "A PHP Error was encountered" in html or "Fatal error" in html:
-            print(Fore.RED + f"PHP error found in session {session_id}. Logging as a failed session.")
-            failed_sessions.append(f"Content Error: Session ID: {session_id} - PHP error encountered.")
-            return None
-        
-        soup = BeautifulSoup(html, 'html.parser')
-
-        # Find the div with class 'titreamz'
-        titreamz_div = soup.find('section', class_='ddoc_funfact_detail_haut')
-        if titreamz_div:
-            # Find the div with class 'result' inside titreamz
-            result_div = titreamz_div.find('div', class_='result')
-            if result_div:
-                return result_div
-            else:
-                # Log failure if result_div is not found
-                print(Fore.RED + f"No 'div.result' found inside 'div.titreamz' for session_id {session_id}")
-                failed_sessions.append(f"Content Error: Session ID: {session_id} - No 'div.result' found inside 'div.titreamz'")
+# Timeout in seconds for a single page request (None waits forever)
+REQUEST_TIMEOUT = 30
+
+# Texts of the pages the site answers with when its PHP code fails
+PHP_ERROR_MARKERS = ("A PHP Error was encountered", "Fatal error")
+PHP_ERROR_MARKERS_BYTES = tuple(marker.encode('utf-8') for marker in PHP_ERROR_MARKERS)
+
+# Result section of a page: only this part is parsed, the rest of the page (header, menus, scripts) is skipped
+RESULT_SECTION_CLASS = "ddoc_funfact_detail_haut"
+RESULT_SECTION_START_PATTERN = re.compile(r'<section\b[^>]*\bclass\s*=\s*["\'][^"\']*\bddoc_funfact_detail_haut\b', re.I)
+
+# A div with "result" among its classes, quoted or not, as the parsers match div.result (a string search that never
+# misses one: a match the parser does not confirm is still checked by parsing)
+RESULT_DIV_PATTERN = re.compile(r'<div\b[^>]*\bclass\s*=\s*(?:"[^"]*|\'[^\']*|)(?<![\w-])result(?![\w-])', re.I)
+
+# Pages are downloaded in pieces of this size; once an error page is recognized, at most MAX_DRAIN_BYTES
+# more are read to keep the keep-alive connection (a new connection costs more), beyond that it is dropped
+DOWNLOAD_CHUNK_SIZE = 16 * 1024
+MAX_DRAIN_BYTES = 256 * 1024
+
+# Collector of the failed session retrievals of a chunk (or run): one (session_id, reason, log line) record each.
+# deque.append is atomic, so the worker threads append without taking a lock.
+class FailureCollector:
+    def __init__(self):
+        self.records = deque()
+
+    def add(self, session_id, reason, message):
+        self.records.append((session_id, reason, message))
+
+    def extend(self, records):
+        self.records.extend(records)
+
+    # Function to take the records out (e.g. to send them from a worker process to the parent)
+    def drain(self):
+        records = []
+        while self.records:
+            records.append(self.records.popleft())
+        return records
+
+    # Function to count the failures by reason, most frequent first
+    def counts(self):
+        return Counter(reason for _, reason, _ in list(self.records)).most_common()
+
+    def log_lines(self):
+        return [message for _, _, message in list(self.records)]
+
+    def __len__(self):
+        return len(self.records)
+
+# Collector the failures are added to (index.py sets a new one for every chunk)
+failure_collector = FailureCollector()
+
+# Outcomes of a session fetch (HTTP failures are recorded as "http_<status>")
+OUTCOME_OK = "ok"
+OUTCOME_PHP_ERROR = "php_error"
+OUTCOME_NO_RESULT = "no_result"
+OUTCOME_EXTRACT_ERROR = "extract_error"
+
+# Listener told about the outcome of every session (e.g. the crawl journal), None disables it
+outcome_listener = None
+
+# HTML parser used on the fetched pages (see parser_backends.PARSER_BACKENDS)
+parser_backend = DEFAULT_PARSER_BACKEND
+
+# Raw HTML cache every fetched page is stored in (None disables caching)
+page_cache = None
+
+# Shared HTTP session so that all worker threads reuse keep-alive connections
+http_session = requests.Session()
+
+# Function to size the shared connection pool and set the target site
+def configure_http(base_url=None, timeout=None, pool_size=32):
+    global BASE_URL, REQUEST_TIMEOUT
+    if base_url:
+        BASE_URL = base_url
+    if timeout:
+        REQUEST_TIMEOUT = timeout
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    http_session.mount("http://", adapter)
+    http_session.mount("https://", adapter)
+
+# Function to select the HTML parser
+def set_parser_backend(backend):
+    global parser_backend
+    parser_backend = backend
+
+# Function to enable the raw HTML cache
+def set_page_cache(cache):
+    global page_cache
+    page_cache = cache
+
+# Function to keep a copy of a fetched page in the raw HTML cache
+def store_page(session_id, html):
+    if page_cache is not None:
+        page_cache.put(session_id, html)
+
+# Function to set the collector of the failed session retrievals
+def set_failure_collector(collector):
+    global failure_collector
+    failure_collector = collector
+
+# Function to log a failed session and report its outcome
+def record_failure(session_id, outcome, message):
+    failure_collector.add(session_id, outcome, message)
+    record_outcome(session_id, outcome)
+
+# Function to add failures recorded elsewhere (e.g. in a worker process) to the current collector
+def merge_failures(records):
+    failure_collector.extend(records)
+
+# Function to set the listener told about every session outcome
+def set_outcome_listener(listener):
+    global outcome_listener
+    outcome_listener = listener
+
+# Function to report the outcome of a session to the listener
+def record_outcome(session_id, outcome):
+    if outcome_listener is not None:
+        outcome_listener.record(session_id, outcome)
+
+# Function to build the URL of a session page
+def build_session_url(session_id):
+    return f"{BASE_URL}?session={session_id}"
+
+# Function to log a failed HTTP retrieval
+def log_http_failure(session_id, status):
+    verbose_print(Fore.RED + f"HTTP Error: Failed to retrieve HTML from {session_id}. Status code: {status}")
+    record_failure(session_id, f"http_{status}", f"HTTP Error: Session ID: {session_id} - Status code: {status}")
+
+# Function to check whether the site answered with a PHP error page
+def is_php_error_page(html):
+    return any(marker in html for marker in PHP_ERROR_MARKERS)
+
+# Function to cut the result section out of a page with string searches, without parsing it
+# (None when it cannot be cut reliably, e.g. nested sections: the whole page is parsed then)
+def slice_result_section(html):
+    match = RESULT_SECTION_START_PATTERN.search(html)
+    if match is None:
+        return None
+    end = html.find("</section>", match.end())
+    if end < 0 or "<section" in html[match.end():end]:
+        return None
+    return html[match.start():end + len("</section>")]
+
+# Function to return the result div inside titreamz from the page HTML
+def parse_result_div(session_id, html):
+    # Check for any PHP errors in the content
+    if is_php_error_page(html):
+        verbose_print(Fore.RED + f"PHP error found in session {session_id}. Logging as a failed session.")
+        record_failure(session_id, OUTCOME_PHP_ERROR, f"Content Error: Session ID: {session_id} - PHP error encountered.")
+        return None
+
+    # Find the div with class 'titreamz' and the div with class 'result' inside it:
+    # a page without the result section is rejected without parsing, otherwise only the section is parsed
+    if RESULT_SECTION_CLASS not in html:
+        titreamz_div = result_div = None
+    else:
+        with metrics.time("parse_seconds"):
+            titreamz_div, result_div = find_result_div(slice_result_section(html) or html, parser_backend)
+    if titreamz_div:
+        if result_div:
+            return result_div
         else:
-            # Log failure if titreamz_div is not found
-            print(Fore.RED + f"No 'div.titreamz' found for session_id {session_id}")
-            failed_sessions.append(f"Content Error: Session ID: {session_id} - No 'div.titreamz' found")
+            # Log failure if result_div is not found
+            verbose_print(Fore.RED + f"No 'div.result' found inside 'div.titreamz' for session_id {session_id}")
+            record_failure(session_id, OUTCOME_NO_RESULT, f"Content Error: Session ID: {session_id} - No 'div.result' found inside 'div.titreamz'")
     else:
-        # Log failure if HTML cannot be retrieved
-        print(Fore.RED + f"HTTP Error: Failed to retrieve HTML from {session_id}. Status code: {response.status_code}")
-        failed_sessions.append(f"HTTP Error: Session ID: {session_id} - Status code: {response.status_code}")
+        # Log failure if titreamz_div is not found
+        verbose_print(Fore.RED + f"No 'div.titreamz' found for session_id {session_id}")
+        record_failure(session_id, OUTCOME_NO_RESULT, f"Content Error: Session ID: {session_id} - No 'div.titreamz' found")
+
+    return None
+
+# Function to send the request for a session page over the shared session (headers: e.g. conditional request headers;
+# stream: only send the request, the body is read afterwards)
+def request_page(session_id, headers=None, stream=False):
+    return http_session.get(build_session_url(session_id), headers=headers, timeout=REQUEST_TIMEOUT, stream=stream)
+
+# Function to read the body of a streamed response, stopping at the PHP error message of an error page
+# (read to the end when the raw HTML cache keeps every page)
+def read_page(response):
+    body = bytearray()
+    overlap = max(len(marker) for marker in PHP_ERROR_MARKERS_BYTES) - 1  # A marker can straddle two pieces
+    pieces = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+    for piece in pieces:
+        searched_from = max(0, len(body) - overlap)
+        body += piece
+        if page_cache is None and any(body.find(marker, searched_from) >= 0 for marker in PHP_ERROR_MARKERS_BYTES):
+            metrics.increment("early_rejections_total")
+            length = response.headers.get("Content-Length")
+            if length is not None and int(length) - len(body) <= MAX_DRAIN_BYTES:
+                for _ in pieces:
+                    pass  # Drained without decoding, the connection goes back to the pool
+            else:
+                response.close()
+            break
+    return body.decode(response.encoding or 'utf-8', errors='replace')
 
-    return None  # Return None if any of the steps fail
+# Function to download the HTML of a session page (None if it cannot be retrieved)
+def download_html(session_id):
+    try:
+        with metrics.time("http_request_seconds"):
+            response = request_page(session_id, stream=True)
+            html = read_page(response) if response.status_code == 200 else None
+    except requests.RequestException as e:
+        metrics.increment("http_responses_total", status=type(e).__name__)
+        log_http_failure(session_id, type(e).__name__)
+        return None
+    metrics.increment("http_responses_total", status=response.status_code)
+
+    if html is not None:
+        store_page(session_id, html)
+        return html
+
+    # Log failure if HTML cannot be retrieved
+    response.close()  # The body of an HTTP error is not read
+    log_http_failure(session_id, response.status_code)
+    return None
+
+# Function to fetch HTML and return the result div inside titreamz
+def fetch_html(session_id):
+    html = download_html(session_id)
+    if html is None:
+        return None  # Return None if any of the steps fail
+    return parse_result_div(session_id, html)
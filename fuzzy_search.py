@@ -0,0 +1,211 @@
+from jsonl_results import iter_result_records, default_result_files
+from collections import Counter
+import argparse
+import re
+import unicodedata
+
+# IRCAM Tifinagh letters and their Latin transcription (the tr field is a letter by letter transcription of mw)
+TIFINAGH_LETTERS = {
+    'ⴰ': 'a', 'ⴱ': 'b', 'ⴳ': 'g', 'ⴷ': 'd', 'ⴹ': 'ḍ', 'ⴻ': 'e', 'ⴼ': 'f', 'ⴽ': 'k', 'ⵀ': 'h', 'ⵃ': 'ḥ', 'ⵄ': 'ɛ',
+    'ⵅ': 'x', 'ⵇ': 'q', 'ⵉ': 'i', 'ⵊ': 'j', 'ⵍ': 'l', 'ⵎ': 'm', 'ⵏ': 'n', 'ⵓ': 'u', 'ⵔ': 'r', 'ⵕ': 'ṛ', 'ⵖ': 'ɣ',
+    'ⵙ': 's', 'ⵚ': 'ṣ', 'ⵛ': 'c', 'ⵜ': 't', 'ⵟ': 'ṭ', 'ⵡ': 'w', 'ⵢ': 'y', 'ⵣ': 'z', 'ⵥ': 'ẓ', 'ⵯ': 'ʷ',
+}
+TIFINAGH_TO_LATIN = str.maketrans(TIFINAGH_LETTERS)
+LATIN_TO_TIFINAGH = str.maketrans({latin: tifinagh for tifinagh, latin in TIFINAGH_LETTERS.items()})
+
+# Folding of what users type for the letters without an ASCII key: ɣ as "gh", ɛ as "e", ʷ as "w",
+# the emphatics without their dot (removed with the accents), and the French digraphs for x and c
+FOLD_TABLE = str.maketrans({'ɣ': 'gh', 'ɛ': 'e', 'ʷ': 'w'})
+DIGRAPHS = (("kh", "x"), ("ch", "c"), ("sh", "c"))
+NON_LETTERS_PATTERN = re.compile(r"[^a-z]+")
+
+# Length of the character n-grams the candidates of long queries are generated from
+NGRAM_SIZE = 3
+
+# Largest distance the deletion index of the short keys covers (short queries allowing more typos scan every key)
+INDEXED_DISTANCE = 2
+
+# Order of the fields among results at the same distance
+FIELD_PRIORITY = {"tr": 0, "mw": 0, "var": 1}
+
+# Function to transcribe Tifinagh text to Latin (other characters are kept)
+def tifinagh_to_latin(text):
+    return text.translate(TIFINAGH_TO_LATIN)
+
+# Function to write a Latin transcription in Tifinagh (other characters are kept)
+def latin_to_tifinagh(text):
+    return unicodedata.normalize('NFC', text).translate(LATIN_TO_TIFINAGH)
+
+# Function to turn a Tifinagh or Latin word into the ASCII key words are compared on
+def fold_key(text):
+    text = unicodedata.normalize('NFD', tifinagh_to_latin(text).lower())
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn').translate(FOLD_TABLE)
+    for digraph, letter in DIGRAPHS:
+        text = text.replace(digraph, letter)
+    return NON_LETTERS_PATTERN.sub('', text)
+
+# Function to list the distinct n-grams of a key, with ^ and $ marking its start and end
+def key_ngrams(key):
+    padded = f"^{key}$"
+    return {padded[i:i + NGRAM_SIZE] for i in range(max(1, len(padded) - NGRAM_SIZE + 1))}
+
+# Function to compute the Levenshtein distance of two keys, stopping at bound + 1 once it is exceeded.
+# Bit-parallel (Myers/Hyyrö): one column of the distance matrix is a pair of bit vectors over the shorter key,
+# updated with a few integer operations per character of the longer one.
+def edit_distance(a, b, bound=None):
+    if len(a) < len(b):
+        a, b = b, a
+    if bound is not None and len(a) - len(b) > bound:
+        return bound + 1
+    if not b:
+        return len(a)
+    masks = {}
+    for i, c in enumerate(b):
+        masks[c] = masks.get(c, 0) | (1 << i)
+    full = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    vp, vn, distance = full, 0, len(b)
+    remaining = len(a)
+    for c in a:
+        eq = masks.get(c, 0)
+        xv = eq | vn
+        xh = (((eq & vp) + vp) ^ vp) | eq
+        hp = vn | (~(xh | vp) & full)
+        hn = vp & xh
+        if hp & last:
+            distance += 1
+        elif hn & last:
+            distance -= 1
+        remaining -= 1
+        if bound is not None and distance - remaining > bound:
+            return bound + 1  # Each remaining character lowers the distance by one at most
+        hp = ((hp << 1) | 1) & full
+        hn = (hn << 1) & full
+        vp = hn | (~(xv | hp) & full)
+        vn = hp & xv
+    return distance
+
+# Function to list the strings left by removing up to count characters of a key
+def key_deletions(key, count):
+    deletions, frontier = {key}, {key}
+    for _ in range(count):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        deletions |= frontier
+    return deletions
+
+# Fuzzy index of the headwords, transcriptions and variants of every entry, all folded to Latin keys.
+# Long queries get their candidates from the n-grams they share with the keys (q-gram count filter). Short ones share
+# too few n-grams to filter on: two words within distance d both reduce to a same string by removing at most d
+# characters each, so the short keys are indexed by their deletions. Candidates are then checked with the edit distance.
+class FuzzyIndex:
+    def __init__(self):
+        self.keys = []        # Key number -> key
+        self.key_numbers = {}
+        self.postings = []    # Key number -> [(session_id, field, indexed word)]
+        self.ngrams = {}      # n-gram -> key numbers
+        self.ngram_counts = []  # Key number -> number of distinct n-grams
+        self.deletions = {}   # Deletion of a short key -> key numbers
+        self.headwords = {}   # session_id -> (mw, tr)
+        # Queries too short for the count filter to prune much (at most one shared n-gram required) have at most
+        # this length, and their matches this one
+        self.short_query_length = NGRAM_SIZE * INDEXED_DISTANCE + 1
+        self.short_key_length = self.short_query_length + INDEXED_DISTANCE
+
+    def add_word(self, key, session_id, field, word):
+        if not key:
+            return
+        number = self.key_numbers.get(key)
+        if number is None:
+            number = self.key_numbers[key] = len(self.keys)
+            self.keys.append(key)
+            self.postings.append([])
+            ngrams = key_ngrams(key)
+            self.ngram_counts.append(len(ngrams))
+            for ngram in ngrams:
+                self.ngrams.setdefault(ngram, []).append(number)
+            if len(key) <= self.short_key_length:
+                for deletion in key_deletions(key, INDEXED_DISTANCE):
+                    self.deletions.setdefault(deletion, []).append(number)
+        self.postings[number].append((session_id, field, word))
+
+    # Function to index (session_id, entry) records (later records win for a session ID)
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        for session_id, entry in dict(records).items():
+            index.headwords[session_id] = (entry["mw"], entry["tr"])
+            tr_key, mw_key = fold_key(entry["tr"]), fold_key(entry["mw"])
+            index.add_word(tr_key, session_id, "tr", entry["tr"])
+            if mw_key != tr_key:  # Only when the transcription does not match the headword
+                index.add_word(mw_key, session_id, "mw", entry["mw"])
+            for variant in entry["var"]:
+                index.add_word(fold_key(variant), session_id, "var", variant)
+        return index
+
+    # Function to find the keys within max_distance of a folded query, as (distance, key number) pairs
+    def matching_keys(self, key, max_distance):
+        query_ngrams = key_ngrams(key)
+        destroyed = NGRAM_SIZE * max_distance  # Each edit destroys at most NGRAM_SIZE n-grams of either word
+        if max_distance <= INDEXED_DISTANCE and len(key) <= self.short_query_length:
+            candidates = set()
+            for deletion in key_deletions(key, max_distance):
+                candidates.update(self.deletions.get(deletion, ()))
+        elif len(query_ngrams) > destroyed:
+            shared = Counter()
+            for ngram in query_ngrams:
+                shared.update(self.ngrams.get(ngram, ()))
+            ngram_counts = self.ngram_counts
+            candidates = [number for number, count in shared.items() if count >= max(len(query_ngrams), ngram_counts[number]) - destroyed]
+        else:
+            candidates = range(len(self.keys))  # More typos than indexed: scan the keys
+
+        matches = []
+        for number in candidates:
+            if abs(len(self.keys[number]) - len(key)) <= max_distance:
+                distance = edit_distance(key, self.keys[number], max_distance)
+                if distance <= max_distance:
+                    matches.append((distance, number))
+        return matches
+
+    # Function to search a Tifinagh or Latin word, e.g. "asnwi" or "ⴰⵙⵏⵡⵉ", allowing typos.
+    # Returns up to limit (session_id, mw, tr, distance, matched word) tuples, closest first, one per entry.
+    def search(self, query, limit=10, max_distance=2):
+        key = fold_key(query)
+        if not key:
+            return []
+        exact = unicodedata.normalize('NFC', query.strip().lower())
+        ranked = []
+        for distance, number in self.matching_keys(key, max_distance):
+            for session_id, field, word in self.postings[number]:
+                # At the same distance: the word as typed (with its dots and special letters) first, then headwords before variants
+                as_typed = 0 if exact in (word.lower(), tifinagh_to_latin(word)) else 1
+                ranked.append(((distance, as_typed, FIELD_PRIORITY[field], int(session_id)), session_id, distance, word))
+        ranked.sort()
+
+        results, seen = [], set()
+        for _, session_id, distance, word in ranked:
+            if session_id not in seen:
+                seen.add(session_id)
+                results.append((session_id, *self.headwords[session_id], distance, word))
+                if len(results) == limit:
+                    break
+        return results
+
+    def __len__(self):
+        return len(self.headwords)
+
+# Function to index every extracted entry
+def build_fuzzy_index(result_files=None):
+    return FuzzyIndex.build(iter_result_records(default_result_files() if result_files is None else result_files))
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find entries from an approximate transcription or a misspelled Tifinagh word")
+    parser.add_argument("query", help='word to look for, e.g. "asnwi", "awcch" or "ⴰⵙⵏⵡⵉ"')
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--max-distance", type=int, default=2, help="largest number of typos (edit distance on the folded words)")
+    args = parser.parse_args()
+
+    index = build_fuzzy_index()
+    for session_id, mw, tr, distance, word in index.search(args.query, args.limit, args.max_distance):
+        print(f"{distance}  {session_id}  {mw}  {tr}" + (f"  (variant {word})" if word not in (mw, tr) else ""))
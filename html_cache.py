@@ -0,0 +1,69 @@
+import gzip
+import hashlib
+import os
+import threading
+
+# Default folder of the raw HTML cache
+DEFAULT_CACHE_DIR = "cache"
+
+# Content-addressed store of raw result pages, indexed by session ID
+#   <root>/objects/<sha[:2]>/<sha>.html.gz  one compressed copy per distinct page
+#   <root>/index.tsv                       append-only "session_id<TAB>sha" lines (last one wins)
+class HtmlCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR):
+        self.root = root
+        self.index_path = os.path.join(root, "index.tsv")
+        self.lock = threading.Lock()
+        self.index = {}
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self.load_index()
+
+    # Function to load the session ID -> content hash index
+    def load_index(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 2:  # Ignore a torn last line after a crash
+                    self.index[parts[0]] = parts[1]
+
+    def object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], f"{digest}.html.gz")
+
+    # Function to store a fetched page (identical pages are written only once)
+    def put(self, session_id, html):
+        raw = html.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(gzip.compress(raw, compresslevel=6))
+            os.replace(temp_path, path)
+
+        with self.lock:
+            if self.index.get(session_id) != digest:
+                self.index[session_id] = digest
+                with open(self.index_path, 'a', encoding='utf-8') as f:
+                    f.write(f"{session_id}\t{digest}\n")
+        return digest
+
+    # Function to read a cached page back (None if the session was never fetched)
+    def get(self, session_id):
+        digest = self.index.get(session_id)
+        if digest is None:
+            return None
+        with open(self.object_path(digest), 'rb') as f:
+            return gzip.decompress(f.read()).decode('utf-8')
+
+    # Function to list the cached session IDs in numeric order
+    def session_ids(self):
+        return sorted(self.index, key=int)
+
+    def __contains__(self, session_id):
+        return session_id in self.index
+
+    def __len__(self):
+        return len(self.index)
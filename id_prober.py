@@ -0,0 +1,197 @@
+from fetch_html import request_page, configure_http, is_php_error_page
+from parser_backends import find_result_div
+from colorama import Fore, init
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import json
+import requests
+import threading
+import time
+
+# Default location of the live/dead map of the session ID space
+DEFAULT_LIVE_MAP_PATH = "logs/live_map.bin"
+
+# Retries of a probe that failed (timeout, connection error, 5xx), and the delay before the first one (doubled each time)
+DEFAULT_PROBE_RETRIES = 3
+PROBE_RETRY_DELAY = 0.5
+
+# Bitmap of the session ID space, one bit per block of block_size IDs:
+# known blocks have been probed, live blocks hold at least one dictionary entry.
+# Saved as one JSON header line followed by the two bitmaps.
+class LiveMap:
+    def __init__(self, start, end, block_size=64):
+        self.start = start
+        self.end = end
+        self.block_size = block_size
+        self.block_count = (end - start + block_size - 1) // block_size
+        self.known = bytearray((self.block_count + 7) // 8)
+        self.live = bytearray((self.block_count + 7) // 8)
+        self.lock = threading.Lock()
+
+    def block_of(self, session_id):
+        return (int(session_id) - self.start) // self.block_size
+
+    # Function to mark the blocks covering [first, last] as probed (a block seen live stays live)
+    def mark(self, first, last, is_live):
+        with self.lock:
+            for block in range(max(0, self.block_of(first)), min(self.block_count, self.block_of(last) + 1)):
+                self.known[block >> 3] |= 1 << (block & 7)
+                if is_live:
+                    self.live[block >> 3] |= 1 << (block & 7)
+
+    # Function to tell whether a session ID is worth crawling (live, never probed, or outside the map)
+    def should_crawl(self, session_id):
+        block = self.block_of(session_id)
+        if block < 0 or block >= self.block_count:
+            return True
+        bit = 1 << (block & 7)
+        return not self.known[block >> 3] & bit or bool(self.live[block >> 3] & bit)
+
+    # Function to list the live ranges as (first, last) session IDs
+    def live_ranges(self):
+        ranges = []
+        for block in range(self.block_count):
+            if self.live[block >> 3] & (1 << (block & 7)):
+                first = self.start + block * self.block_size
+                last = min(self.end, first + self.block_size) - 1
+                if ranges and ranges[-1][1] == first - 1:
+                    ranges[-1] = (ranges[-1][0], last)
+                else:
+                    ranges.append((first, last))
+        return ranges
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(json.dumps({"start": self.start, "end": self.end, "block_size": self.block_size}).encode('utf-8') + b'\n')
+            f.write(bytes(self.known))
+            f.write(bytes(self.live))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            live_map = cls(header["start"], header["end"], header["block_size"])
+            size = len(live_map.known)
+            live_map.known = bytearray(f.read(size))
+            live_map.live = bytearray(f.read(size))
+        return live_map
+
+# Prober sampling the ID space at a coarse stride and bisecting between samples that disagree
+class IdSpaceProber:
+    def __init__(self, width=16, resolution=64, workers=16, retries=DEFAULT_PROBE_RETRIES):
+        self.width = width              # Consecutive IDs probed at each point (entries are not contiguous)
+        self.resolution = resolution    # Stop bisecting when the boundary is known within this many IDs
+        self.workers = workers
+        self.retries = retries
+        self.requests_made = 0
+        self.unknown_points = 0
+        self.lock = threading.Lock()
+
+    # Function to check one session ID without logging it as a failure: True (entry), False (no entry),
+    # or None when it could not be told (request failures and 5xx answers, after the retries)
+    def probe_id(self, session_id):
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(PROBE_RETRY_DELAY * 2 ** (attempt - 1))
+            with self.lock:
+                self.requests_made += 1
+            try:
+                response = request_page(session_id)
+            except requests.RequestException:
+                continue
+            if response.status_code == 404:
+                return False
+            if response.status_code != 200:
+                continue  # 5xx, 429: the site is struggling, not telling the ID is dead
+            if is_php_error_page(response.text):
+                return False
+            return find_result_div(response.text)[1] is not None
+        return None
+
+    # Function to check whether the point starting at session_id is live (any of the next width IDs has an entry);
+    # None when no entry was found but some IDs could not be probed
+    def probe_point(self, session_id):
+        unknown = False
+        for offset in range(self.width):
+            found = self.probe_id(session_id + offset)
+            if found:
+                return True
+            unknown = unknown or found is None
+        if unknown:
+            with self.lock:
+                self.unknown_points += 1
+            return None
+        return False
+
+    # Function to find the live/dead boundary between two probed points (an interval left unknown is not marked,
+    # so the crawler visits it)
+    def bisect(self, low, low_live, high, high_live, live_map):
+        while high - low > self.resolution:
+            middle = (low + high) // 2
+            middle_live = self.probe_point(middle)
+            if middle_live is None:
+                return
+            if middle_live == low_live:
+                live_map.mark(low, middle, low_live)
+                low = middle
+            else:
+                live_map.mark(middle, high, high_live)
+                high, high_live = middle, middle_live
+        live_map.mark(low, high, True)  # Keep the uncertain boundary interval, so no entry is missed
+
+    # Function to probe [start, end) and return its live map
+    def probe(self, start, end, stride=1024, block_size=None):
+        if start >= end:
+            raise ValueError(f"Empty range: start ({start}) must be below end ({end})")
+        live_map = LiveMap(start, end, block_size or self.resolution)
+        points = list(range(start, end, stride))
+        if points[-1] != end - 1:
+            points.append(end - 1)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            states = list(executor.map(self.probe_point, points))
+            print(Fore.CYAN + f"Coarse pass: {states.count(True)} live points out of {len(points)}, {states.count(None)} unknown")
+
+            # Intervals between two samples that agree take their state, the others are bisected;
+            # the intervals next to an unknown point stay unprobed, so the crawler visits them
+            bisections = []
+            for (low, low_live), (high, high_live) in zip(zip(points, states), zip(points[1:], states[1:])):
+                if low_live is None or high_live is None:
+                    continue
+                if low_live == high_live:
+                    live_map.mark(low, high, low_live)
+                else:
+                    bisections.append(executor.submit(self.bisect, low, low_live, high, high_live, live_map))
+            for future in bisections:
+                future.result()
+        return live_map
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Find the live session ID ranges before crawling them")
+    parser.add_argument("--start", type=int, default=0)
+    parser.add_argument("--end", type=int, default=150000)
+    parser.add_argument("--stride", type=int, default=1024, help="distance between the points of the coarse pass")
+    parser.add_argument("--width", type=int, default=16, help="consecutive IDs probed at each point")
+    parser.add_argument("--resolution", type=int, default=64, help="size of the blocks of the map, and bisection precision")
+    parser.add_argument("--workers", type=int, default=16, help="simultaneous probes")
+    parser.add_argument("--retries", type=int, default=DEFAULT_PROBE_RETRIES, help="retries of a probe after a timeout, connection error or 5xx")
+    parser.add_argument("--base-url", help="search page URL, e.g. http://127.0.0.1:8000/dglai/search/indexs for the stand-in server")
+    parser.add_argument("--output", default=DEFAULT_LIVE_MAP_PATH, help="live map file")
+    args = parser.parse_args()
+    if args.start >= args.end:
+        parser.error("--start must be below --end")
+
+    configure_http(args.base_url, pool_size=args.workers)
+    prober = IdSpaceProber(width=args.width, resolution=args.resolution, workers=args.workers, retries=args.retries)
+    live_map = prober.probe(args.start, args.end, stride=args.stride)
+    live_map.save(args.output)
+
+    ranges = live_map.live_ranges()
+    live_ids = sum(last - first + 1 for first, last in ranges)
+    for first, last in ranges:
+        print(Fore.GREEN + f"Live range: {first}-{last}")
+    print(Fore.GREEN + f"{prober.requests_made} requests, {live_ids} of {args.end - args.start} session IDs live, map saved to {args.output}")
+    if prober.unknown_points:
+        print(Fore.YELLOW + f"{prober.unknown_points} points could not be probed: their intervals stay unprobed and will be crawled (run again to probe them)")
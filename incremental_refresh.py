@@ -0,0 +1,236 @@
+from fetch_html import request_page, configure_http, set_parser_backend, is_php_error_page, slice_result_section, log_http_failure, record_failure, store_page, failure_collector, RESULT_SECTION_CLASS, RESULT_DIV_PATTERN, OUTCOME_PHP_ERROR
+from parser_backends import find_result_div, PARSER_BACKENDS, DEFAULT_PARSER_BACKEND
+from data_extractors import extract_entry
+from abbreviation_mapper import UnmatchedAbbreviations
+from jsonl_results import JsonlResultWriter, iter_result_records, default_result_files
+from metrics import metrics, MetricsExporter
+from colorama import Fore, init
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse
+import atexit
+import datetime
+import hashlib
+import json
+import os
+import re
+import requests
+import threading
+
+# Default location of the per-session fingerprints
+DEFAULT_FINGERPRINTS_PATH = "logs/fingerprints.tsv"
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Changes of an entry between two crawls
+ADDED = "added"
+CHANGED = "changed"
+REMOVED = "removed"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+# Function to fingerprint the result section of a page, cut out without parsing the page (None for pages without an entry)
+def fingerprint_page(html):
+    if is_php_error_page(html) or RESULT_SECTION_CLASS not in html:
+        return None
+    section = slice_result_section(html) or html  # The whole page when the section cannot be cut, as parse_result_div does
+    if not RESULT_DIV_PATTERN.search(section):
+        return None
+    section = WHITESPACE_PATTERN.sub(" ", section)
+    return hashlib.blake2b(section.encode('utf-8'), digest_size=16).hexdigest()
+
+# Append-only store of "session_id<TAB>fingerprint<TAB>etag<TAB>last_modified" lines (last one wins; "-" for none)
+class FingerprintStore:
+    def __init__(self, path=DEFAULT_FINGERPRINTS_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = {}
+        self.load()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 4:  # Ignore a torn last line after a crash
+                    self.records[parts[0]] = tuple(None if part == "-" else part for part in parts[1:])
+
+    # Function to get the (fingerprint, etag, last_modified) of a session ID
+    def get(self, session_id):
+        return self.records.get(session_id, (None, None, None))
+
+    def record(self, session_id, fingerprint, etag=None, last_modified=None):
+        values = (fingerprint, etag, last_modified)
+        with self.lock:
+            if self.records.get(session_id) != values:
+                self.records[session_id] = values
+                self.file.write("\t".join([session_id] + [value or "-" for value in values]) + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __contains__(self, session_id):
+        return session_id in self.records
+
+# Function to fingerprint the pages of the raw HTML cache, so the first refresh does not re-extract them
+def seed_fingerprints(store, cache):
+    for session_id in cache.session_ids():
+        if session_id not in store:
+            store.record(session_id, fingerprint_page(cache.get(session_id)))
+    return len(cache)
+
+# Refresher comparing each page with the previous crawl: conditional request, then fingerprint, then extraction
+class IncrementalRefresher:
+    def __init__(self, fingerprints, previous_entries, parser_backend=DEFAULT_PARSER_BACKEND):
+        self.fingerprints = fingerprints
+        self.previous_entries = previous_entries
+        self.parser_backend = parser_backend
+        self.unmatched_abbreviations = UnmatchedAbbreviations()
+        self.lock = threading.Lock()
+        self.not_modified = 0  # Pages answered with 304 Not Modified
+        self.parsed = 0        # Pages whose result section changed, parsed and extracted again
+
+    # Function to refresh one session ID: returns (change, entry or None)
+    def refresh_session(self, session_id):
+        fingerprint, etag, last_modified = self.fingerprints.get(session_id)
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        try:
+            with metrics.time("http_request_seconds"):
+                response = request_page(session_id, headers)
+        except requests.RequestException as e:
+            log_http_failure(session_id, type(e).__name__)
+            return FAILED, None
+        metrics.increment("http_responses_total", status=response.status_code)
+        if response.status_code == 304:
+            with self.lock:
+                self.not_modified += 1
+            return UNCHANGED, None  # Not even downloaded
+        if response.status_code != 200:
+            log_http_failure(session_id, response.status_code)
+            return FAILED, None  # Keep the previous entry, it will be checked again next time
+
+        html = response.text
+        previous = self.previous_entries.get(session_id)
+        # The site also answers live sessions with a PHP error page when it struggles: keep the stored
+        # fingerprint and the previous entry, the session is checked again next time
+        if is_php_error_page(html) and (previous or fingerprint is not None):
+            record_failure(session_id, OUTCOME_PHP_ERROR, f"Content Error: Session ID: {session_id} - PHP error encountered.")
+            return FAILED, None
+        new_fingerprint = fingerprint_page(html)
+        validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        was_removed = fingerprint is None and session_id in self.fingerprints  # Found without an entry last time
+        result_div = None
+        if new_fingerprint is not None and (new_fingerprint != fingerprint or not previous):
+            store_page(session_id, html)
+            _, result_div = find_result_div(slice_result_section(html) or html, self.parser_backend)
+            if result_div is None:
+                new_fingerprint = None  # Matched by the string search only: the parser finds no entry
+        if new_fingerprint is None or result_div is None:
+            # A removed entry stays in the earlier outputs: only report it the first time its page is found empty
+            self.fingerprints.record(session_id, new_fingerprint, *validators)
+            if new_fingerprint is None:
+                return (REMOVED if previous and not was_removed else UNCHANGED), None
+            return UNCHANGED, None  # Same result section, no need to parse it
+
+        with self.lock:
+            self.parsed += 1
+        with metrics.time("extract_seconds"):
+            entry = extract_entry(result_div, self.unmatched_abbreviations, session_id)
+        self.fingerprints.record(session_id, new_fingerprint, *validators)  # Only once the entry is extracted
+        if previous is None or was_removed:
+            return ADDED, entry  # Also an entry reported removed that came back, even if it did not change
+        return (UNCHANGED if entry == previous else CHANGED), entry
+
+    # Function to refresh session IDs, writing added/changed entries to the writer and every change to the delta file
+    def refresh(self, session_ids, writer, delta_file, workers=16):
+        counts = dict.fromkeys([ADDED, CHANGED, REMOVED, UNCHANGED, FAILED], 0)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_session = {executor.submit(self.refresh_session, session_id): session_id for session_id in session_ids}
+            for future in as_completed(future_to_session):
+                session_id = future_to_session[future]
+                try:
+                    change, entry = future.result()
+                except Exception as exc:
+                    print(Fore.RED + f"Session {session_id} generated an exception: {exc}")
+                    change, entry = FAILED, None
+                counts[change] += 1
+                metrics.increment("refresh_total", change=change)
+                if change in (ADDED, CHANGED):
+                    writer.write({session_id: entry})
+                if change in (ADDED, CHANGED, REMOVED):
+                    delta = {"session_id": session_id, "change": change}
+                    if entry is not None:
+                        delta["entry"] = entry
+                    if change != ADDED:
+                        delta["previous"] = self.previous_entries[session_id]
+                    delta_file.write(json.dumps(delta, ensure_ascii=False, separators=(',', ':')) + '\n')
+        return counts
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Refresh the extracted entries, only re-extracting the pages that changed")
+    parser.add_argument("--start", type=int, help="also check this range for new entries (default: only the extracted session IDs)")
+    parser.add_argument("--end", type=int, help="end of the range (excluded)")
+    parser.add_argument("--fingerprints", default=DEFAULT_FINGERPRINTS_PATH, help="per-session fingerprints of the previous crawls")
+    parser.add_argument("--seed-from-cache", metavar="CACHE_DIR", help="fingerprint the pages of a raw HTML cache first")
+    parser.add_argument("--parser", choices=PARSER_BACKENDS, default=DEFAULT_PARSER_BACKEND, help="HTML parser used on the changed pages")
+    parser.add_argument("--concurrency", type=int, default=16, help="simultaneous connections to the dictionary host")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    parser.add_argument("--base-url", help="search page URL, e.g. http://127.0.0.1:8000/dglai/search/indexs for the stand-in server")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json", "none"], default="prometheus",
+                        help="format of the metrics file written to the run folder (metrics.prom or metrics.json)")
+    parser.add_argument("--metrics-interval", type=float, default=10, help="seconds between two writes of the metrics file")
+    args = parser.parse_args()
+
+    configure_http(args.base_url, args.timeout, pool_size=args.concurrency)
+    set_parser_backend(args.parser)
+    previous_entries = dict(iter_result_records(default_result_files()))
+    fingerprints = FingerprintStore(args.fingerprints)
+    if args.seed_from_cache:
+        from html_cache import HtmlCache
+        print(Fore.GREEN + f"Fingerprinted {seed_fingerprints(fingerprints, HtmlCache(args.seed_from_cache))} cached pages")
+
+    session_ids = set(previous_entries)
+    if args.start is not None and args.end is not None:
+        session_ids.update(str(i) for i in range(args.start, args.end))
+    session_ids = sorted(session_ids, key=int)
+
+    now = datetime.datetime.now()
+    log_folder = f"logs/{now.strftime('%Y-%m-%d_%H-%M')}"
+    os.makedirs(log_folder, exist_ok=True)
+    exporter = None
+    if args.metrics_format != "none":
+        exporter = MetricsExporter(f"{log_folder}/metrics.{'prom' if args.metrics_format == 'prometheus' else 'json'}", args.metrics_interval).start()
+        atexit.register(exporter.close)  # Also written if the refresh is interrupted
+    delta_path = f"{log_folder}/delta_{now.strftime('%H-%M-%S')}.jsonl"
+    refresher = IncrementalRefresher(fingerprints, previous_entries, args.parser)
+    with JsonlResultWriter(log_folder) as writer, open(delta_path, 'w', encoding='utf-8') as delta_file:
+        counts = refresher.refresh(session_ids, writer, delta_file, workers=args.concurrency)
+    fingerprints.close()
+
+    if failure_collector:
+        with open(f"{log_folder}/failed_sessions_refresh.log", 'w', encoding='utf-8') as f:
+            for failure in failure_collector.log_lines():
+                f.write(failure + '\n')
+    for (kind, label), count in refresher.unmatched_abbreviations.totals().items():
+        metrics.increment("unmatched_abbreviations_total", count, kind=kind)
+    if refresher.unmatched_abbreviations:
+        output_file_warnings = f"{log_folder}/abbreviations_not_found_refresh.log"
+        with open(output_file_warnings, 'w', encoding='utf-8') as f:
+            for warning in refresher.unmatched_abbreviations.log_lines():
+                f.write(warning + '\n')
+        print(Fore.GREEN + f"Unmatched abbreviations saved to {output_file_warnings}")
+    if exporter is not None:
+        exporter.close()  # Final values, with the unmatched abbreviations
+    print(Fore.GREEN + f"Refreshed {len(session_ids)} session IDs: " + ", ".join(f"{count} {change}" for change, count in counts.items()))
+    print(Fore.GREEN + f"{refresher.not_modified} pages not modified (304), {refresher.parsed} parsed and extracted again")
+    print(Fore.GREEN + f"Delta saved to {delta_path}")
@@ -1,52 +1,50 @@
-from fetch_html import fetch_html, failed_sessions
-from data_extractors import extract_main_word_and_pos, extract_morphology, extract_senses, extract_related_phrases
+from fetch_html import fetch_html, FailureCollector, set_failure_collector, configure_http, set_page_cache, set_parser_backend, set_outcome_listener, record_outcome, OUTCOME_OK, OUTCOME_EXTRACT_ERROR
+from parser_backends import PARSER_BACKENDS, DEFAULT_PARSER_BACKEND
+from html_cache import HtmlCache, DEFAULT_CACHE_DIR
+from jsonl_results import JsonlResultWriter, DEFAULT_SHARD_SIZE
+from id_prober import LiveMap
+from crawl_journal import CrawlJournal, DEFAULT_JOURNAL_PATH, seed_from_logs
+from data_extractors import extract_entry
+from abbreviation_mapper import UnmatchedAbbreviations
+from metrics import metrics, set_verbose, verbose_print, OutcomeCounter, MetricsExporter
 from colorama import Fore, init
+import argparse
+import atexit
+import itertools
 import json
 import os
+import time
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Initialize colorama for Windows
 init(autoreset=True)
 
-# List of session_ids to process (range from 10000 to 100000)
-session_ids = [str(i) for i in range(143752, 144752)]
+# Default range of session_ids to process (end excluded)
+DEFAULT_START = 143752
+DEFAULT_END = 144752
 
 # Get the current date and time
 current_time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M")
 
-# Create logs folder with date information
+# Logs folder with date information (created when the crawl starts, --log-folder overrides it)
 log_folder = f"logs/{current_time}"
-os.makedirs(log_folder, exist_ok=True)
 
 # Define a function to process a single session ID
 def process_session(session_id, unmatched_abbreviations):
-    print(Fore.CYAN + f"Processing session_id: {session_id}")
+    verbose_print(Fore.CYAN + f"Processing session_id: {session_id}")
     result_div = fetch_html(session_id)
     
     if result_div:
         try:
-            # Step 1: Extract main word, transcription, POS, and variant
-            word_tifinagh, word_transcription, pos_tag, variants = extract_main_word_and_pos(result_div, unmatched_abbreviations, session_id)
-            morphology = extract_morphology(result_div, unmatched_abbreviations, session_id)
-            senses = extract_senses(result_div)
-            related_phrases = extract_related_phrases(result_div)
-            
-            # Save the extracted data for this session
-            return {
-                session_id: {
-                    "mw": word_tifinagh,
-                    "tr": word_transcription,
-                    "pos": pos_tag,
-                    "var": variants,
-                    "morph": morphology,
-                    "sens": senses,
-                    "rp": related_phrases
-                }
-            }
+            # Extract main word, transcription, POS, variant, morphology, senses and related phrases
+            with metrics.time("extract_seconds"):
+                entry = extract_entry(result_div, unmatched_abbreviations, session_id)
         except Exception as e:
             print(Fore.RED + f"Error processing session_id {session_id}: {e}")
+            record_outcome(session_id, OUTCOME_EXTRACT_ERROR)
             return None
+        return {session_id: entry}  # Journaled as ok by the consumer, once the entry is written
     else:
         return None
 
@@ -55,33 +53,198 @@ def save_data_to_file(data, filename):
     with open(filename, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
 
-# Parallelize execution using ThreadPoolExecutor
-def fetch_sessions_parallel(session_ids, unmatched_abbreviations):
+# Parallelize execution using ThreadPoolExecutor, with a bounded window of tasks: session IDs are pulled lazily
+# from any iterable, at most max_in_flight sessions are submitted at a time, and the next ones are only submitted
+# once the finished records have been handed to the sink (a slow sink holds the downloads back)
+def fetch_sessions_parallel(session_ids, unmatched_abbreviations, max_workers=None, on_result=None, max_in_flight=None):
+    max_workers = max_workers or min(32, (os.cpu_count() or 1) + 4)  # ThreadPoolExecutor's default
+    max_in_flight = max_in_flight or 2 * max_workers
+    pending_ids = iter(session_ids)
     results = []
-    with ThreadPoolExecutor() as executor:
-        # Submit tasks for each session_id
-        future_to_session = {executor.submit(process_session, session_id, unmatched_abbreviations): session_id for session_id in session_ids}
-        
-        for future in as_completed(future_to_session):
-            session_id = future_to_session[future]
-            try:
-                session_data = future.result()
-                if session_data:
-                    results.append(session_data)  # Add the processed data to the results
-            except Exception as exc:
-                print(Fore.RED + f"Session {session_id} generated an exception: {exc}")
-    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_session = {}
+
+        # Function to top the window up with the next session IDs
+        def submit_next():
+            for session_id in itertools.islice(pending_ids, max_in_flight - len(future_to_session)):
+                future_to_session[executor.submit(process_session, session_id, unmatched_abbreviations)] = session_id
+
+        submit_next()
+        while future_to_session:
+            done, _ = wait(future_to_session, return_when=FIRST_COMPLETED)
+            for future in done:
+                session_id = future_to_session.pop(future)
+                try:
+                    session_data = future.result()
+                    if session_data and on_result:
+                        on_result(session_data)  # Hand the result to the output sink as soon as it is ready
+                    elif session_data:
+                        results.append(session_data)  # Add the processed data to the results
+                except Exception as exc:
+                    print(Fore.RED + f"Session {session_id} generated an exception: {exc}")
+            submit_next()
+
     return results
 
-# Function to split the session IDs into chunks of 1000
+# Function to split the session IDs (any iterable, consumed lazily) into chunks of 1000
 def chunk_session_ids(session_ids, chunk_size=1000):
-    for i in range(0, len(session_ids), chunk_size):
-        yield session_ids[i:i + chunk_size]
+    session_ids = iter(session_ids)
+    while True:
+        chunk = list(itertools.islice(session_ids, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+# Function to parse a "k/n" shard option (worker k of n, k counted from 0)
+def parse_shard(text):
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected k/n, got {text!r}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"k must be between 0 and n - 1, got {text!r}")
+    return index, count
+
+# Function to parse the command line options
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crawl the IRCAM dictionary and extract entries")
+    parser.add_argument("--start", type=int, default=DEFAULT_START, help="first session ID to crawl")
+    parser.add_argument("--end", type=int, default=DEFAULT_END, help="session ID to stop at (excluded)")
+    parser.add_argument("--chunk-size", type=int, default=1000,
+                        help="session IDs per chunk, each with its own log folder (memory depends on it, not on the size of the range)")
+    parser.add_argument("--shard", type=parse_shard, metavar="K/N",
+                        help="only crawl the chunks of worker K of N (chunk i of the range goes to worker i %% N), for independent workers")
+    parser.add_argument("--log-folder", help="folder of the run's outputs and logs (default: logs/<timestamp>)")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH, help="crawl journal used to resume interrupted runs")
+    parser.add_argument("--live-map", help="live map written by id_prober.py: only crawl the live (or never probed) blocks")
+    parser.add_argument("--seed-journal", action="store_true", help="add the outcomes recorded in earlier logs/ runs to the journal")
+    parser.add_argument("--retry-php-errors", action="store_true", help="crawl again the session IDs journaled with a PHP error page (transient when the site struggles)")
+    parser.add_argument("--output-format", choices=["jsonl", "json"], default="jsonl",
+                        help="jsonl: stream one compact line per session into range shards; json: one indented file per chunk")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="session IDs per JSONL shard")
+    parser.add_argument("--gzip", action="store_true", help="gzip the JSONL shards")
+    parser.add_argument("--engine", choices=["threaded", "async", "adaptive", "pipeline"], default="threaded",
+                        help="threaded: one blocking request per worker thread; async: asyncio engine with a pooled keep-alive client; "
+                             "adaptive: async engine with AIMD concurrency and retries; pipeline: download threads feeding a parsing process pool")
+    parser.add_argument("--parser", choices=PARSER_BACKENDS, default=DEFAULT_PARSER_BACKEND, help="HTML parser used on the result pages")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="simultaneous connections to the dictionary host (upper bound for the adaptive engine, download threads of the pipeline engine)")
+    parser.add_argument("--max-retries", type=int, default=3, help="retries of a session after a 5xx, timeout or connection error with the adaptive engine")
+    parser.add_argument("--php-error-retries", type=int, default=1, help="retries of a session answered with a PHP error page with the adaptive engine")
+    parser.add_argument("--target-latency", type=float, default=2.0, help="response time (seconds) above which the adaptive engine backs off")
+    parser.add_argument("--parse-workers", type=int, help="parsing processes of the pipeline engine (default: one per core)")
+    parser.add_argument("--queue-size", type=int, default=64, help="downloaded pages waiting for the parsing stage of the pipeline engine")
+    parser.add_argument("--timeout", type=float, default=30, help="request timeout in seconds")
+    parser.add_argument("--base-url", help="search page URL, e.g. http://127.0.0.1:8000/dglai/search/indexs for the stand-in server")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="raw HTML cache every fetched page is stored in")
+    parser.add_argument("--no-cache", action="store_true", help="do not store fetched pages")
+    parser.add_argument("--offline", action="store_true", help="re-extract every page of the raw HTML cache, without network access")
+    parser.add_argument("--workers", type=int, help="extraction processes for --offline (default: one per core)")
+    parser.add_argument("--verbose", action="store_true", help="print a line per session (progress, failures, unmatched abbreviations)")
+    parser.add_argument("--metrics-format", choices=["prometheus", "json", "none"], default="prometheus",
+                        help="format of the metrics file written to the run folder (metrics.prom or metrics.json)")
+    parser.add_argument("--metrics-interval", type=float, default=10, help="seconds between two writes of the metrics file")
+    return parser.parse_args()
+
+# Function to select the fetch engine
+def select_engine(args):
+    set_parser_backend(args.parser)
+    if args.offline:
+        from offline_extract import extract_sessions_offline
+        return lambda chunk, unmatched, on_result=None: extract_sessions_offline(chunk, unmatched, args.cache_dir, max_workers=args.workers,
+                                                                                   on_result=on_result, parser_backend=args.parser, verbose=args.verbose)
+
+    configure_http(args.base_url, args.timeout, pool_size=args.concurrency)
+    if not args.no_cache:
+        set_page_cache(HtmlCache(args.cache_dir))
+    if args.engine == "async":
+        from async_fetch import fetch_sessions_async_blocking
+        return lambda chunk, unmatched, on_result=None: fetch_sessions_async_blocking(chunk, unmatched, concurrency=args.concurrency, timeout=args.timeout, on_result=on_result)
+    if args.engine == "adaptive":
+        from adaptive_fetch import fetch_sessions_adaptive_blocking
+        return lambda chunk, unmatched, on_result=None: fetch_sessions_adaptive_blocking(chunk, unmatched, max_concurrency=args.concurrency, max_retries=args.max_retries,
+                                                                                           php_error_retries=args.php_error_retries,
+                                                                                           target_latency=args.target_latency, timeout=args.timeout, on_result=on_result)
+    if args.engine == "pipeline":
+        from pipeline import fetch_sessions_pipeline
+        return lambda chunk, unmatched, on_result=None: fetch_sessions_pipeline(chunk, unmatched, io_workers=args.concurrency, parse_workers=args.parse_workers,
+                                                                                  queue_size=args.queue_size, on_result=on_result, parser_backend=args.parser,
+                                                                                  verbose=args.verbose)
+    return lambda chunk, unmatched, on_result=None: fetch_sessions_parallel(chunk, unmatched, max_workers=args.concurrency, on_result=on_result)
 
 # Main execution
 if __name__ == "__main__":
-    # Split session_ids into chunks of 1000
-    for session_chunk in chunk_session_ids(session_ids):
+    args = parse_args()
+    log_folder = args.log_folder or log_folder
+    os.makedirs(log_folder, exist_ok=True)
+    set_verbose(args.verbose)
+    fetch_sessions = select_engine(args)
+
+    # Timings and counters of the run, written periodically next to the chunk logs
+    if args.metrics_format != "none":
+        exporter = MetricsExporter(f"{log_folder}/metrics.{'prom' if args.metrics_format == 'prometheus' else 'json'}", args.metrics_interval).start()
+        atexit.register(exporter.close)
+
+    # Offline mode re-extracts everything that was ever fetched
+    if args.offline:
+        session_ids = HtmlCache(args.cache_dir).session_ids()
+        set_outcome_listener(OutcomeCounter())
+    else:
+        # Skip the session IDs already extracted or known to be dead
+        journal = CrawlJournal(args.journal, retry_php_errors=args.retry_php_errors)
+        atexit.register(journal.close)  # Also flush the last batch if the run is interrupted
+        if args.seed_journal:
+            print(Fore.GREEN + f"Seeded the journal with {seed_from_logs(journal)} session outcomes from logs/")
+        live_map = LiveMap.load(args.live_map) if args.live_map else None
+
+        # Session IDs still to crawl, generated lazily so that a range can hold millions of IDs
+        # (with --shard, only the chunks of this worker: the i-th chunk_size block of the range goes to worker i % n)
+        def requested_ids():
+            for i in range(args.start, args.end):
+                if args.shard is None or (i - args.start) // args.chunk_size % args.shard[1] == args.shard[0]:
+                    yield str(i)
+
+        # Skipped IDs are counted as the range is walked, so the run starts without a pass over the whole range
+        skipped = {"count": 0}
+
+        def outstanding_ids():
+            for session_id in requested_ids():
+                if journal.is_outstanding(session_id) and (live_map is None or live_map.should_crawl(session_id)):
+                    yield session_id
+                else:
+                    skipped["count"] += 1
+
+        # Number of session IDs of the range (of this worker's chunks with --shard), from the range arithmetic
+        requested_count = max(0, args.end - args.start)
+        if args.shard is not None:
+            full_chunks, rest = divmod(requested_count, args.chunk_size)
+            requested_count = max(0, (full_chunks - args.shard[0] + args.shard[1] - 1) // args.shard[1]) * args.chunk_size
+            if full_chunks % args.shard[1] == args.shard[0]:
+                requested_count += rest
+        print(Fore.GREEN + f"{requested_count} session IDs requested, those already done or in dead blocks are skipped")
+        session_ids = outstanding_ids()
+        set_outcome_listener(OutcomeCounter(journal))
+
+    # Streaming writer for the results of the whole run
+    writer = None
+    if args.output_format == "jsonl":
+        writer = JsonlResultWriter(log_folder, shard_size=args.shard_size, compress=args.gzip)
+        atexit.register(writer.close)
+
+    # Function to journal the sessions of a result as ok, only once their entries are written
+    # (an interrupted run must not skip entries it never saved)
+    def record_written(result):
+        for session_id in result:
+            record_outcome(session_id, OUTCOME_OK)
+
+    # Function to hand a result to the writer, timing it
+    def write_result(result):
+        with metrics.time("write_seconds"):
+            writer.write(result)
+        record_written(result)
+
+    # Split session_ids into chunks (one log folder each)
+    for session_chunk in chunk_session_ids(session_ids, args.chunk_size):
         session_start = session_chunk[0]
         session_end = session_chunk[-1]
 
@@ -89,32 +252,39 @@ if __name__ == "__main__":
         chunk_folder = f"{log_folder}/{session_start}-{session_end}"
         os.makedirs(chunk_folder, exist_ok=True)
 
-        # Dictionary to store data for the current chunk
-        data = {}
-        
-        # New list for unmatched abbreviations for this chunk
-        unmatched_abbreviations = []
-
-        # Start parallel fetching for the current chunk
-        session_results = fetch_sessions_parallel(session_chunk, unmatched_abbreviations)
+        # New counter for unmatched abbreviations and new failure collector for this chunk
+        unmatched_abbreviations = UnmatchedAbbreviations()
+        failures = FailureCollector()
+        set_failure_collector(failures)
 
-        # Merge the results into the data dictionary
-        for result in session_results:
-            data.update(result)
+        # Start parallel fetching for the current chunk, streaming the results to the JSONL shards
+        chunk_started = time.perf_counter()
+        session_results = fetch_sessions(session_chunk, unmatched_abbreviations, write_result if writer else None)
+        chunk_elapsed = time.perf_counter() - chunk_started
 
         # Print separator for each session
         print(Fore.CYAN + "\n" + "=" * 50 + "\n")
+        print(Fore.GREEN + f"Fetched {len(session_chunk)} sessions with the {'offline' if args.offline else args.engine} engine in {chunk_elapsed:.1f}s ({len(session_chunk) / chunk_elapsed:.1f} sessions/s)")
 
-        # Step 5: Save the collected data to a JSON file inside the chunk folder
-        output_file = f'{chunk_folder}/extracted_data_{session_start}-{session_end}.json'
-        save_data_to_file(data, output_file)
-        print(Fore.GREEN + f"Data successfully saved to {output_file}")
+        # Step 5: Save the collected data to a JSON file inside the chunk folder (legacy format)
+        if not writer:
+            data = {}
+            for result in session_results:
+                data.update(result)
+            output_file = f'{chunk_folder}/extracted_data_{session_start}-{session_end}.json'
+            with metrics.time("write_seconds"):
+                save_data_to_file(data, output_file)
+            record_written(data)
+            print(Fore.GREEN + f"Data successfully saved to {output_file}")
+
+        for (kind, label), count in unmatched_abbreviations.totals().items():
+            metrics.increment("unmatched_abbreviations_total", count, kind=kind)
 
         # Step 6: Save unmatched abbreviations to a log file inside the chunk folder
         if unmatched_abbreviations:
             output_file_warnings = f'{chunk_folder}/abbreviations_not_found_{session_start}-{session_end}.log'
             with open(output_file_warnings, 'w', encoding='utf-8') as f:  # 'w' to create new for each chunk
-                for warning in unmatched_abbreviations:
+                for warning in unmatched_abbreviations.log_lines():
                     f.write(warning + '\n')
 
             print(Fore.GREEN + f"Unmatched abbreviations saved to {output_file_warnings}")
@@ -122,12 +292,16 @@ if __name__ == "__main__":
             print(Fore.GREEN + "No unmatched abbreviations found.")
 
         # Step 7: After processing all sessions in the chunk, save failed session retrievals to a file inside the chunk folder
-        if failed_sessions:
+        if failures:
             output_file_failures = f'{chunk_folder}/failed_sessions_{session_start}-{session_end}.log'
             with open(output_file_failures, 'w', encoding='utf-8') as f:
-                for failure in failed_sessions:
+                for failure in failures.log_lines():
                     f.write(failure + '\n')
 
-            print(Fore.GREEN + f"Failed session retrievals saved to {output_file_failures}")
+            summary = ", ".join(f"{count} {reason}" for reason, count in failures.counts())
+            print(Fore.GREEN + f"{len(failures)} failed session retrievals ({summary}) saved to {output_file_failures}")
         else:
             print(Fore.GREEN + "No failed session retrievals found.")
+
+    if not args.offline:
+        print(Fore.GREEN + f"{skipped['count']} of {requested_count} session IDs were already done or in dead blocks")
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import glob
+import gzip
+import json
+import os
+import threading
+
+# Default number of session IDs per output shard
+DEFAULT_SHARD_SIZE = 1000
+
+# Streaming writer appending each session result as one compact JSON line,
+# sharded by session ID range: <folder>/<prefix>_<first>-<last>.jsonl[.gz]
+class JsonlResultWriter:
+    def __init__(self, folder, prefix="extracted_data", shard_size=DEFAULT_SHARD_SIZE, compress=False, max_open_shards=4):
+        self.folder = folder
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.compress = compress
+        self.max_open_shards = max_open_shards
+        self.lock = threading.Lock()
+        self.open_shards = OrderedDict()
+        self.records_written = 0
+        os.makedirs(folder, exist_ok=True)
+
+    # Function to get the file name of the shard holding a session ID
+    def shard_path(self, shard):
+        first = shard * self.shard_size
+        extension = "jsonl.gz" if self.compress else "jsonl"
+        return os.path.join(self.folder, f"{self.prefix}_{first}-{first + self.shard_size - 1}.{extension}")
+
+    # Function to get the open file of a shard, closing the least recently used one if needed
+    def shard_file(self, shard):
+        if shard in self.open_shards:
+            self.open_shards.move_to_end(shard)
+            return self.open_shards[shard]
+        if len(self.open_shards) >= self.max_open_shards:
+            _, oldest = self.open_shards.popitem(last=False)
+            oldest.close()
+        path = self.shard_path(shard)
+        # Appending to a gzip file adds a new member, which readers handle transparently
+        f = gzip.open(path, 'at', encoding='utf-8') if self.compress else open(path, 'a', encoding='utf-8')
+        self.open_shards[shard] = f
+        return f
+
+    # Function to append a {session_id: entry} result (flushed right away)
+    def write(self, result):
+        for session_id, entry in result.items():
+            line = json.dumps({session_id: entry}, ensure_ascii=False, separators=(',', ':'))
+            with self.lock:
+                f = self.shard_file(int(session_id) // self.shard_size)
+                f.write(line + '\n')
+                f.flush()
+                self.records_written += 1
+
+    def close(self):
+        with self.lock:
+            for f in self.open_shards.values():
+                f.close()
+            self.open_shards.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Function to lazily yield (session_id, entry) pairs from a result file (.jsonl, .jsonl.gz or legacy .json)
+def iter_result_file(path):
+    if path.endswith(".json"):
+        with open(path, encoding='utf-8') as f:
+            yield from json.load(f).items()
+        return
+
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # Torn last line after a crash
+                yield from json.loads(line).items()
+        except EOFError:
+            pass  # Compressed shard cut short by a crash, keep what was readable
+
+# Function to lazily yield (session_id, entry) pairs from several result files
+def iter_result_records(paths):
+    for path in paths:
+        yield from iter_result_file(path)
+
+# Function to list every result file under logs/ (chunk JSON files and JSONL shards), oldest run first
+def find_result_files(logs_root="logs"):
+    paths = glob.glob(f"{logs_root}/**/extracted_data_*", recursive=True)
+    return sorted(path for path in paths if path.endswith((".json", ".jsonl", ".jsonl.gz")))
+
+# Function to list the result files of a crawl: its root output (extracted_data.json, next to the logs folder), then every run under logs_root
+def default_result_files(logs_root="logs"):
+    root_output = os.path.join(os.path.dirname(os.path.normpath(logs_root)), "extracted_data.json")
+    return ([root_output] if os.path.exists(root_output) else []) + find_result_files(logs_root)
@@ -0,0 +1,121 @@
+from jsonl_results import iter_result_records, default_result_files
+from fuzzy_search import tifinagh_to_latin
+from colorama import Fore, init
+import argparse
+import re
+import sys
+import time
+import unicodedata
+
+# Tag of a headword found as itself, and of a variant of a headword (the inflected forms are tagged with their morphology key)
+LEMMA_TAG = "lemma"
+VARIANT_TAG = "var"
+
+# Words of a Tifinagh text, and of a Latin transcription (letters with their dots and special letters)
+TIFINAGH_WORD_PATTERN = re.compile(r"[ⴰ-⵿]+")
+LATIN_WORD_PATTERN = re.compile(r"[^\W\d_]+")
+
+# Analyses of a form the dictionary does not know
+NO_ANALYSES = ()
+
+# Reverse morphology index: every surface form (headword, inflected form, variant) to its
+# (lemma session ID, tag) analyses, the headword readings first. Multi-word forms are indexed whole.
+class Lemmatizer:
+    def __init__(self, latin=False):
+        self.latin = latin
+        self.forms = {}      # Surface form -> ((session_id, tag), ...)
+        self.headwords = {}  # session_id -> headword
+        self.best = {}       # Surface form -> session ID of its first analysis
+
+    # Function to turn a form as written in the entries into a lookup key
+    def form_key(self, form):
+        form = form.strip()
+        return tifinagh_to_latin(form) if self.latin else form
+
+    # Function to index (session_id, entry) records (later records win for a session ID)
+    @classmethod
+    def build(cls, records, latin=False):
+        lemmatizer = cls(latin)
+        analyses = {}
+        for session_id, entry in sorted(dict(records).items(), key=lambda record: int(record[0])):
+            lemmatizer.headwords[session_id] = entry["mw"].strip()
+            readings = [(entry["mw"], LEMMA_TAG)]
+            readings += [(value, tag) for form in entry["morph"] for tag, values in form.items() for value in values]
+            readings += [(variant, VARIANT_TAG) for variant in entry["var"]]
+            for form, tag in readings:
+                key = lemmatizer.form_key(form)
+                if key:
+                    found = analyses.setdefault(key, [])
+                    if (session_id, tag) not in found:
+                        found.append((session_id, tag))
+
+        # Tuples are smaller than lists and shared by every token of the same form
+        for key, found in analyses.items():
+            found.sort(key=lambda analysis: analysis[1] != LEMMA_TAG)  # Stable: session ID order otherwise
+            lemmatizer.forms[key] = tuple(found)
+            lemmatizer.best[key] = found[0][0]
+        return lemmatizer
+
+    # Function to get the analyses of one form
+    def analyses(self, form):
+        return self.forms.get(form, NO_ANALYSES)
+
+    # Function to analyse a batch of tokens: one dictionary lookup each, () for unknown tokens
+    def lemmatize(self, tokens):
+        get = self.forms.get
+        return [get(token, NO_ANALYSES) for token in tokens]
+
+    # Function to get the most likely lemma session ID of each token of a batch (None for unknown tokens)
+    def lemma_ids(self, tokens):
+        return list(map(self.best.get, tokens))
+
+    # Function to split a text into the words the index is keyed on
+    def tokenize(self, text):
+        if self.latin:
+            return LATIN_WORD_PATTERN.findall(unicodedata.normalize('NFC', text))  # Dotted letters as single characters
+        return TIFINAGH_WORD_PATTERN.findall(text)
+
+    def __len__(self):
+        return len(self.forms)
+
+# Function to index every extracted entry
+def build_lemmatizer(result_files=None, latin=False):
+    return Lemmatizer.build(iter_result_records(default_result_files() if result_files is None else result_files), latin)
+
+# Function to lemmatize text lines in batches, yielding (token, analyses) pairs
+def lemmatize_lines(lemmatizer, lines, batch_size=10000):
+    batch = []
+    for line in lines:
+        batch.extend(lemmatizer.tokenize(line))
+        if len(batch) >= batch_size:
+            yield from zip(batch, lemmatizer.lemmatize(batch))
+            batch = []
+    yield from zip(batch, lemmatizer.lemmatize(batch))
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Lemmatize Tifinagh (or Latin transcribed) text with the forms of the extracted entries")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="text files (default: standard input)")
+    parser.add_argument("--latin", action="store_true", help="the text is in Latin transcription")
+    parser.add_argument("--all", action="store_true", help="print every analysis of ambiguous tokens, not only the first")
+    args = parser.parse_args()
+
+    lemmatizer = build_lemmatizer(latin=args.latin)
+    tokens = known = 0
+    started = time.perf_counter()
+    out = sys.stdout
+    for path in args.inputs:
+        f = sys.stdin if path == "-" else open(path, encoding='utf-8')
+        with f:
+            # One line per token: token, lemma session ID, lemma, tag ("-" when unknown)
+            for token, analyses in lemmatize_lines(lemmatizer, f):
+                tokens += 1
+                if not analyses:
+                    out.write(f"{token}\t-\t-\t-\n")
+                    continue
+                known += 1
+                for session_id, tag in (analyses if args.all else analyses[:1]):
+                    out.write(f"{token}\t{session_id}\t{lemmatizer.headwords[session_id]}\t{tag}\n")
+    elapsed = time.perf_counter() - started
+    print(Fore.GREEN + f"{tokens} tokens, {known} known ({known / max(1, tokens):.0%}), {tokens / max(elapsed, 1e-9) * 60:,.0f} tokens/min", file=sys.stderr)
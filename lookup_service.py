@@ -0,0 +1,235 @@
+from jsonl_results import iter_result_records, default_result_files
+from collections import OrderedDict
+from colorama import Fore, init
+from aiohttp import web
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import unicodedata
+
+DEFAULT_PORT = 8780
+
+# Default number of responses kept in the LRU cache, and seconds between two checks for new result files
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_RELOAD_INTERVAL = 10.0
+
+# Largest number of queries accepted in one batch request
+MAX_BATCH_SIZE = 1000
+
+# Kinds of lookups, as query parameters: ?mw=, ?tr=, ?form=, ?id=
+LOOKUP_KINDS = ("mw", "tr", "form", "id")
+
+# Function to turn a looked up word into an index key: same Unicode form and case, but no accent folding
+# (emphatic and plain consonants are different words in the transcriptions)
+def lookup_key(text):
+    return unicodedata.normalize('NFC', text).strip().lower()
+
+# In-memory index of every extracted entry: session ID, headword, transcription, and morphological forms and variants
+class DictionaryIndex:
+    def __init__(self):
+        self.entries = {}
+        self.by_headword = {}
+        self.by_transcription = {}
+        self.by_form = {}
+
+    # Function to index the records of result files (later records win for a session ID)
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        for session_id, entry in records:
+            index.entries[session_id] = entry
+        for session_id in sorted(index.entries, key=int):
+            entry = index.entries[session_id]
+            index.by_headword.setdefault(lookup_key(entry["mw"]), []).append(session_id)
+            index.by_transcription.setdefault(lookup_key(entry["tr"]), []).append(session_id)
+            forms = {lookup_key(value) for form in entry["morph"] for values in form.values() for value in values}
+            forms.update(lookup_key(variant) for variant in entry["var"])
+            for form in forms:
+                index.by_form.setdefault(form, []).append(session_id)
+        return index
+
+    # Function to look a word up: returns {session_id: entry}, in session ID order
+    def lookup(self, kind, word):
+        if kind == "id":
+            session_id = word.strip()
+            return {session_id: self.entries[session_id]} if session_id in self.entries else {}
+        table = {"mw": self.by_headword, "tr": self.by_transcription, "form": self.by_form}[kind]
+        return {session_id: self.entries[session_id] for session_id in table.get(lookup_key(word), ())}
+
+    def __len__(self):
+        return len(self.entries)
+
+# Least recently used cache of encoded responses
+class ResponseCache:
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.responses = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        body = self.responses.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self.responses.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, key, body):
+        self.responses[key] = body
+        if len(self.responses) > self.max_size:
+            self.responses.popitem(last=False)
+
+    def clear(self):
+        self.responses.clear()
+
+def encode_json(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+# Function to list the result files with their size and modification time, to notice new or grown ones
+def result_files_signature(logs_root="logs"):
+    signature = []
+    for path in default_result_files(logs_root):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # Replaced while listing, picked up at the next check
+        signature.append((path, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+# Function to load the index from the result files (blocking, runs in a thread)
+def load_index(logs_root="logs"):
+    signature = result_files_signature(logs_root)
+    return signature, DictionaryIndex.build(iter_result_records(path for path, _, _ in signature))
+
+# Current index of a server process, replaced as a whole on reload
+class ServiceState:
+    def __init__(self, logs_root="logs", cache_size=DEFAULT_CACHE_SIZE):
+        self.logs_root = logs_root
+        self.signature, self.index = load_index(logs_root)
+        self.cache = ResponseCache(cache_size)
+        self.reloads = 0
+
+    # Function to answer a lookup from the cache, or the index
+    def lookup_response(self, kind, word):
+        key = (kind, word)
+        body = self.cache.get(key)
+        if body is None:
+            body = encode_json(self.index.lookup(kind, word))
+            self.cache.put(key, body)
+        return body
+
+async def handle_entry(request):
+    body = request.app["state"].lookup_response("id", request.match_info["session_id"])
+    if body == b"{}":
+        raise web.HTTPNotFound(text="Unknown session ID")
+    return web.Response(body=body, content_type="application/json")
+
+async def handle_lookup(request):
+    kinds = [kind for kind in LOOKUP_KINDS if kind in request.query]
+    if len(kinds) != 1:
+        raise web.HTTPBadRequest(text=f"Give exactly one of {', '.join(LOOKUP_KINDS)}")
+    body = request.app["state"].lookup_response(kinds[0], request.query[kinds[0]])
+    return web.Response(body=body, content_type="application/json")
+
+# Batch lookups: POST {"queries": [{"mw": "ⴰⵎⴰⵏ"}, {"id": "143055"}, ...]}, answered with one result per query, in order
+async def handle_batch(request):
+    try:
+        queries = (await request.json())["queries"]
+    except (ValueError, KeyError, TypeError):
+        raise web.HTTPBadRequest(text='Expected {"queries": [{"mw": ...}, {"id": ...}, ...]}')
+    if not isinstance(queries, list) or len(queries) > MAX_BATCH_SIZE:
+        raise web.HTTPBadRequest(text=f"Expected a list of at most {MAX_BATCH_SIZE} queries")
+
+    parts = []
+    for query in queries:
+        if not isinstance(query, dict) or len(query) != 1 or next(iter(query)) not in LOOKUP_KINDS or not isinstance(next(iter(query.values())), str):
+            raise web.HTTPBadRequest(text=f"Each query must hold one of {', '.join(LOOKUP_KINDS)}")
+        kind, word = next(iter(query.items()))
+        parts.append(request.app["state"].lookup_response(kind, word))
+    return web.Response(body=b"[" + b",".join(parts) + b"]", content_type="application/json")
+
+async def handle_health(request):
+    state = request.app["state"]
+    return web.json_response({"entries": len(state.index), "result_files": len(state.signature), "reloads": state.reloads,
+                              "cache_size": len(state.cache.responses), "cache_hits": state.cache.hits, "cache_misses": state.cache.misses,
+                              "pid": os.getpid()})
+
+# Background task reloading the index when result files appear or grow under logs/
+async def reload_index(state, interval):
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            signature = await loop.run_in_executor(None, result_files_signature, state.logs_root)
+            if signature == state.signature:
+                continue
+            signature, index = await loop.run_in_executor(None, load_index, state.logs_root)
+        except (OSError, ValueError) as e:
+            print(Fore.RED + f"Could not reload the index: {e}")  # Keep serving the current one
+            continue
+        state.signature, state.index = signature, index  # Swapped at once, between two requests
+        state.cache.clear()
+        state.reloads += 1
+        print(Fore.GREEN + f"[{os.getpid()}] Reloaded {len(index)} entries from {len(signature)} result files")
+
+async def start_reloader(app):
+    app["reloader"] = asyncio.create_task(reload_index(app["state"], app["reload_interval"]))
+
+async def stop_reloader(app):
+    app["reloader"].cancel()
+
+# Function to create the service over the result files of logs_root
+def create_app(logs_root="logs", cache_size=DEFAULT_CACHE_SIZE, reload_interval=DEFAULT_RELOAD_INTERVAL):
+    app = web.Application()
+    app["state"] = ServiceState(logs_root, cache_size)
+    app["reload_interval"] = reload_interval
+    app.router.add_get("/entries/{session_id}", handle_entry)
+    app.router.add_get("/lookup", handle_lookup)
+    app.router.add_post("/batch", handle_batch)
+    app.router.add_get("/health", handle_health)
+    if reload_interval:
+        app.on_startup.append(start_reloader)
+        app.on_cleanup.append(stop_reloader)
+    return app
+
+# Function to run one server process (with several, they share the port through SO_REUSEPORT)
+def serve(host, port, logs_root, cache_size, reload_interval, reuse_port=False):
+    app = create_app(logs_root, cache_size, reload_interval)
+    print(Fore.GREEN + f"[{os.getpid()}] Serving {len(app['state'].index)} entries on http://{host}:{port}")
+    web.run_app(app, host=host, port=port, reuse_port=reuse_port, print=None)
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="HTTP lookup service over the extracted entries: /entries/<id>, /lookup?mw=|tr=|form=|id=, POST /batch, /health")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--logs-root", default="logs", help="folder of the result files (the extracted_data.json next to it is also read)")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="responses kept in the LRU cache of each process")
+    parser.add_argument("--reload-interval", type=float, default=DEFAULT_RELOAD_INTERVAL, help="seconds between checks for new result files (0 disables reloading)")
+    parser.add_argument("--workers", type=int, default=1, help="server processes sharing the port, each with its own index (one per core)")
+    args = parser.parse_args()
+
+    options = (args.host, args.port, args.logs_root, args.cache_size, args.reload_interval)
+    if args.workers == 1:
+        serve(*options)
+    else:
+        processes = [multiprocessing.Process(target=serve, args=options + (True,)) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Stop the server processes too
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
@@ -0,0 +1,202 @@
+from colorama import Fore
+from contextlib import contextmanager
+import bisect
+import json
+import os
+import threading
+import time
+
+# Upper bounds (seconds) of the buckets of the timing histograms
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+# Per-session console messages (progress, failures, warnings), off unless --verbose:
+# thousands of prints from many threads cost measurable time and the failures are in the chunk logs anyway
+verbose = False
+
+# Function to enable or disable the per-session console messages
+def set_verbose(enabled):
+    global verbose
+    verbose = enabled
+
+# Function to print a per-session message when verbose
+def verbose_print(message):
+    if verbose:
+        print(message)
+
+# Histogram of durations, counted in fixed buckets
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, counts, count, total):
+        for bucket, bucket_count in enumerate(counts):
+            self.counts[bucket] += bucket_count
+        self.count += count
+        self.sum += total
+
+    # Function to estimate a quantile from the buckets (upper bound of the bucket it falls in)
+    def quantile(self, fraction):
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[bucket] if bucket < len(self.buckets) else float("inf")
+
+# Function to build the key of a metric: label values are exported as text anyway, and a label holding
+# both ints and strings (e.g. status=200 and status="ReadTimeout") could not be sorted otherwise
+def metric_key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+# Thread-safe registry of counters and timing histograms, keyed by name and labels
+class MetricsRegistry:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    # Function to add to a counter, e.g. increment("sessions_total", outcome="ok")
+    def increment(self, name, amount=1, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    # Function to record a duration in seconds
+    def observe(self, name, seconds, **labels):
+        key = metric_key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    # Context manager timing a block of code into a histogram
+    @contextmanager
+    def time(self, name, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    # Function to take the recorded values out, e.g. to send them from a worker process to the parent
+    def drain(self):
+        with self.lock:
+            state = {
+                "counters": self.counters,
+                "histograms": {key: (histogram.counts, histogram.count, histogram.sum) for key, histogram in self.histograms.items()},
+            }
+            self.counters, self.histograms = {}, {}
+        return state
+
+    # Function to add the values drained from another registry
+    def merge(self, state):
+        with self.lock:
+            for key, amount in state["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + amount
+            for key, (counts, count, total) in state["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(self.buckets)
+                histogram.merge(counts, count, total)
+
+    # Function to format the metrics in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            declared = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} counter")
+                    declared.add(name)
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {name} histogram")
+                    declared.add(name)
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    # Function to format the metrics as JSON, with estimated quantiles for the histograms
+    def to_json(self):
+        with self.lock:
+            data = {
+                "time": time.time(),
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in sorted(self.counters.items())],
+                "histograms": [{"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                                "p50": histogram.quantile(.5), "p95": histogram.quantile(.95), "p99": histogram.quantile(.99),
+                                "buckets": dict(zip(map(str, self.buckets + ("+Inf",)), histogram.counts))}
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+        return json.dumps(data, indent=4)
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+# Registry shared by the whole process
+metrics = MetricsRegistry()
+
+# Outcome listener counting every session outcome, then passing it on (e.g. to the crawl journal)
+class OutcomeCounter:
+    def __init__(self, listener=None, registry=metrics):
+        self.listener = listener
+        self.registry = registry
+
+    def record(self, session_id, outcome):
+        self.registry.increment("sessions_total", outcome=outcome)
+        if self.listener is not None:
+            self.listener.record(session_id, outcome)
+
+# Background thread writing the registry to a file every interval seconds (Prometheus text for .prom, JSON otherwise)
+class MetricsExporter:
+    def __init__(self, path, interval=10.0, registry=metrics):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    # Function to replace the metrics file, so readers never see a half-written one
+    def write(self):
+        text = self.registry.to_prometheus() if self.path.endswith(".prom") else self.registry.to_json()
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(Fore.RED + f"Could not write the metrics to {self.path}: {e}")
+
+    # Function to stop the thread and write the final values
+    def close(self):
+        if not self.stopped.is_set():
+            self.stopped.set()
+            if self.thread.is_alive():
+                self.thread.join()
+            self.write()
@@ -3,13 +3,48 @@ import re
 
 # Delimiters for splitting text
 DELIMITERS = [',', '/', ';', '،', '؛']
+DELIMITER_PATTERN = re.compile('[{}]+'.format(''.join(map(re.escape, DELIMITERS))))
+
+# Arabic tatweel (kashida), a stretching character with no meaning
+TATWEEL = '\u0640'
+
+# Translate table dropping the combining marks (accents, harakat, hamza and madda marks once decomposed).
+# The category of a character is looked up the first time it is seen, then kept.
+class CombiningMarkTable(dict):
+    def __missing__(self, code_point):
+        value = None if unicodedata.category(chr(code_point)) == 'Mn' else code_point
+        self[code_point] = value
+        return value
+
+ACCENT_TABLE = CombiningMarkTable()
+ARABIC_TABLE = CombiningMarkTable({ord(TATWEEL): None})
+
+# Function to decompose, fold and lowercase text with a translate table (ASCII text has nothing to fold)
+def fold_text(text, table):
+    if text.isascii():
+        return text.lower()
+    return unicodedata.normalize('NFD', text).translate(table).lower()
 
 # Normalize text to remove accents and make it lowercase
 def normalize_text(text):
-    text = unicodedata.normalize('NFD', text)
-    text = ''.join([c for c in text if unicodedata.category(c) != 'Mn'])  # Remove accents
-    return text.lower().strip()  # Ensure no leading/trailing spaces
+    return fold_text(text, ACCENT_TABLE).strip()  # Ensure no leading/trailing spaces
+
+# Normalize Arabic text: harakat and hamza/madda marks go with the accents, the tatweel is dropped
+def normalize_arabic(text):
+    return fold_text(text, ARABIC_TABLE).strip()
+
+# Function to normalize a list of strings, as normalize_text does
+def normalize_texts(texts):
+    return [normalize_text(text) for text in texts]
+
+# Function to normalize a list of Arabic strings, as normalize_arabic does
+def normalize_arabic_texts(texts):
+    return [normalize_arabic(text) for text in texts]
 
 # Function to split by the custom delimiters
 def split_by_delimiters(text):
-    return [part.strip() for part in re.split(r'[{},/،؛]+'.format("|".join(map(re.escape, DELIMITERS))), text) if part.strip()]
+    return [part for part in map(str.strip, DELIMITER_PATTERN.split(text)) if part]
+
+# Function to split a list of strings by the custom delimiters, one list of parts per string
+def split_texts(texts):
+    return [split_by_delimiters(text) for text in texts]
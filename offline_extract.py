@@ -0,0 +1,31 @@
+from parser_backends import DEFAULT_PARSER_BACKEND
+from html_cache import HtmlCache
+from abbreviation_mapper import UnmatchedAbbreviations
+from pipeline import init_parse_worker, extract_page, merge_extracted_page
+from metrics import metrics
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+# Cache opened once in each worker process
+worker_cache = None
+
+# Function to open the cache inside a worker process
+def init_worker(cache_dir, parser_backend, verbose=False):
+    global worker_cache
+    worker_cache = HtmlCache(cache_dir)
+    init_parse_worker(parser_backend, verbose)
+
+# Function to re-run the extractors on one cached page (runs in a worker process)
+def extract_cached_session(session_id):
+    html = worker_cache.get(session_id)
+    if html is None:
+        return None, UnmatchedAbbreviations(), [(session_id, "cache_miss", f"Cache Error: Session ID: {session_id} - Page not found in the cache")], [], metrics.drain()
+    return extract_page(session_id, html)
+
+# Re-extract session IDs from the raw HTML cache without any network access
+def extract_sessions_offline(session_ids, unmatched_abbreviations, cache_dir, max_workers=None, on_result=None, parser_backend=DEFAULT_PARSER_BACKEND, verbose=False):
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=init_worker, initargs=(cache_dir, parser_backend, verbose)) as executor:
+        for extracted in executor.map(extract_cached_session, session_ids, chunksize=32):
+            merge_extracted_page(extracted, unmatched_abbreviations, results, on_result)
+    return results
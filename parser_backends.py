@@ -0,0 +1,52 @@
+from bs4 import BeautifulSoup, Tag, NavigableString, CData
+
+# HTML parsers the result pages can be read with:
+#   html.parser  BeautifulSoup with the pure-Python parser (no extra dependency)
+#   lxml         BeautifulSoup with the lxml C parser (pip install lxml)
+#   selectolax   lexbor C parser through selectolax, without BeautifulSoup (pip install selectolax)
+PARSER_BACKENDS = ("html.parser", "lxml", "selectolax")
+DEFAULT_PARSER_BACKEND = "html.parser"
+
+# Function to parse a page and return its result section and the result div inside it (None when missing)
+def find_result_div(html, backend=DEFAULT_PARSER_BACKEND):
+    if backend == "selectolax":
+        from selectolax.lexbor import LexborHTMLParser
+        section = LexborHTMLParser(html).css_first('section.ddoc_funfact_detail_haut')
+        return section, (section.css_first('div.result') if section else None)
+
+    soup = BeautifulSoup(html, backend)
+    section = soup.find('section', class_='ddoc_funfact_detail_haut')
+    return section, (section.find('div', class_='result') if section else None)
+
+# Function to walk a BeautifulSoup tree, calling builder.start/text/other/end for each node
+def walk_soup(node, builder):
+    for child in node.children:
+        child_type = type(child)
+        if child_type is Tag:
+            builder.start(child.name, child.get('class') or ())
+            walk_soup(child, builder)
+            builder.end()
+        elif child_type is NavigableString or child_type is CData:
+            builder.text(child)
+        else:
+            builder.other()  # Comments, doctypes, ... are not part of the text
+
+# Function to walk a selectolax (lexbor) tree the same way
+def walk_lexbor(node, builder):
+    for child in node.iter(include_text=True):
+        tag = child.tag
+        if tag == '-text':
+            builder.text(child.text_content)
+        elif tag.startswith('-'):
+            builder.other()
+        else:
+            builder.start(tag, (child.attributes.get('class') or '').split())
+            walk_lexbor(child, builder)
+            builder.end()
+
+# Function to walk the children of a result div, whatever parser produced it
+def walk_result_div(result_div, builder):
+    if isinstance(result_div, Tag):
+        walk_soup(result_div, builder)
+    else:
+        walk_lexbor(result_div, builder)
@@ -0,0 +1,123 @@
+from fetch_html import download_html, parse_result_div, FailureCollector, set_failure_collector, merge_failures, set_parser_backend, set_outcome_listener, record_outcome, OUTCOME_EXTRACT_ERROR
+from parser_backends import DEFAULT_PARSER_BACKEND
+from data_extractors import extract_entry
+from abbreviation_mapper import UnmatchedAbbreviations
+from metrics import metrics, set_verbose, verbose_print
+from colorama import Fore
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import os
+import queue
+import threading
+
+# End of the downloads marker on the hand-off queue
+DOWNLOADS_DONE = object()
+
+# Outcomes recorded inside a worker process, sent back to the parent with each result
+class OutcomeBuffer:
+    def __init__(self):
+        self.outcomes = []
+
+    def record(self, session_id, outcome):
+        self.outcomes.append((session_id, outcome))
+
+    def drain(self):
+        outcomes, self.outcomes = self.outcomes, []
+        return outcomes
+
+worker_outcomes = OutcomeBuffer()
+worker_failures = FailureCollector()
+
+# Function to prepare a parsing worker process
+def init_parse_worker(parser_backend, verbose=False):
+    set_parser_backend(parser_backend)
+    set_verbose(verbose)
+    metrics.drain()  # Forked workers start with a copy of the parent's metrics
+    set_outcome_listener(worker_outcomes)
+    set_failure_collector(worker_failures)
+
+# Function to parse a page and run the extractors on it (runs in a worker process)
+def extract_page(session_id, html):
+    # Failures, unmatched abbreviations, outcomes and timings are collected locally and sent back to the parent
+    unmatched_abbreviations = UnmatchedAbbreviations()
+    result = None
+
+    result_div = parse_result_div(session_id, html)
+    if result_div:
+        try:
+            with metrics.time("extract_seconds"):
+                result = {session_id: extract_entry(result_div, unmatched_abbreviations, session_id)}  # Journaled as ok by the consumer
+        except Exception as e:
+            print(Fore.RED + f"Error processing session_id {session_id}: {e}")
+            record_outcome(session_id, OUTCOME_EXTRACT_ERROR)
+
+    return result, unmatched_abbreviations, worker_failures.drain(), worker_outcomes.drain(), metrics.drain()
+
+# Function to merge what a worker process sent back into this process
+def merge_extracted_page(extracted, unmatched_abbreviations, results, on_result):
+    result, unmatched, failures, outcomes, timings = extracted
+    unmatched_abbreviations.merge(unmatched)
+    metrics.merge(timings)
+    merge_failures(failures)
+    for session_id, outcome in outcomes:
+        record_outcome(session_id, outcome)
+    if result and on_result:
+        on_result(result)
+    elif result:
+        results.append(result)
+
+# Function to merge the finished parsing futures
+def merge_finished(futures, unmatched_abbreviations, results, on_result):
+    for future in futures:
+        try:
+            merge_extracted_page(future.result(), unmatched_abbreviations, results, on_result)
+        except Exception as exc:
+            print(Fore.RED + f"Parsing generated an exception: {exc}")
+
+# Function to download one page into the hand-off queue (I/O stage)
+def download_to_queue(session_id, pages):
+    verbose_print(Fore.CYAN + f"Processing session_id: {session_id}")
+    html = download_html(session_id)
+    if html is not None:
+        pages.put((session_id, html))  # Blocks while the parsing stage is behind
+
+# Two-stage pipeline: I/O threads only download pages, a process pool parses them and runs the extractors
+def fetch_sessions_pipeline(session_ids, unmatched_abbreviations, io_workers=16, parse_workers=None, queue_size=64,
+                            on_result=None, parser_backend=DEFAULT_PARSER_BACKEND, verbose=False):
+    parse_workers = parse_workers or os.cpu_count()
+    pages = queue.Queue(maxsize=queue_size)
+    results = []
+
+    with ThreadPoolExecutor(max_workers=io_workers) as io_pool, \
+            ProcessPoolExecutor(max_workers=parse_workers, initializer=init_parse_worker, initargs=(parser_backend, verbose)) as parse_pool:
+        downloads = [io_pool.submit(download_to_queue, session_id, pages) for session_id in session_ids]
+
+        # Close the queue once every download has finished
+        def close_queue():
+            for future in wait(downloads).done:
+                if not future.cancelled() and future.exception():  # Downloads are cancelled on Ctrl-C
+                    print(Fore.RED + f"Download generated an exception: {future.exception()}")
+            pages.put(DOWNLOADS_DONE)
+        threading.Thread(target=close_queue, daemon=True).start()
+
+        # Feed the process pool, keeping at most two pages per worker in flight
+        in_flight = set()
+        page = None
+        try:
+            while True:
+                page = pages.get()
+                if page is DOWNLOADS_DONE:
+                    break
+                if len(in_flight) >= 2 * parse_workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    merge_finished(done, unmatched_abbreviations, results, on_result)
+                in_flight.add(parse_pool.submit(extract_page, *page))
+            merge_finished(wait(in_flight).done, unmatched_abbreviations, results, on_result)
+        except BaseException:
+            # Unblock the downloaders before the pools shut down (e.g. broken process pool, Ctrl-C)
+            for future in downloads:
+                future.cancel()
+            while page is not DOWNLOADS_DONE:
+                page = pages.get()
+            raise
+
+    return results
@@ -0,0 +1,141 @@
+from normalization_utils import normalize_text, normalize_arabic
+from jsonl_results import iter_result_records, default_result_files
+from collections import Counter
+import argparse
+import bisect
+import heapq
+import math
+import re
+
+# Words of a normalized text (French or Arabic)
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Weight of a word depending on where it appears: a sense of the entry counts more than a related phrase
+FIELD_WEIGHTS = {"sens": 1.0, "rp": 0.5}
+
+# BM25 ranking parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Function to split a French text into accent-folded words
+def french_tokens(text):
+    return TOKEN_PATTERN.findall(normalize_text(text))
+
+# Function to split an Arabic text into words without diacritics or tatweel
+def arabic_tokens(text):
+    return TOKEN_PATTERN.findall(normalize_arabic(text))
+
+# Function to list the weighted words of an entry's French and Arabic senses and related phrases
+def entry_terms(entry):
+    terms = Counter()
+    for sense in entry["sens"]:
+        for text in sense.get("fr", []):
+            for token in french_tokens(text):
+                terms[token] += FIELD_WEIGHTS["sens"]
+        for text in sense.get("ar", []):
+            for token in arabic_tokens(text):
+                terms[token] += FIELD_WEIGHTS["sens"]
+    for phrase in entry["rp"]:
+        for token in french_tokens(phrase.get("fr", "")) + arabic_tokens(phrase.get("ar", "")):
+            terms[token] += FIELD_WEIGHTS["rp"]
+    return terms
+
+# Inverted index from French/Arabic words to the entries they translate, ranked with BM25.
+# Postings are (document number, weighted term frequency) lists; documents are numbered in insertion order.
+class ReverseIndex:
+    def __init__(self):
+        self.session_ids = []
+        self.headwords = []
+        self.lengths = []
+        self.postings = {}
+        self.terms = []
+
+    # Function to index one entry
+    def add(self, session_id, entry):
+        document = len(self.session_ids)
+        terms = entry_terms(entry)
+        self.session_ids.append(session_id)
+        self.headwords.append(entry["mw"])
+        self.lengths.append(sum(terms.values()))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, []).append((document, frequency))
+
+    # Function to sort the vocabulary for prefix queries, once every entry is added
+    def finish(self):
+        self.terms = sorted(self.postings)
+        self.average_length = sum(self.lengths) / max(1, len(self.lengths))
+        return self
+
+    # Function to index (session_id, entry) records (later records win for a session ID)
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        for session_id, entry in dict(records).items():
+            index.add(session_id, entry)
+        return index.finish()
+
+    # Function to list the indexed words matching a query word (every word it starts when prefix is set)
+    def expand(self, term, prefix=False):
+        if not prefix:
+            return [term] if term in self.postings else []
+        position = bisect.bisect_left(self.terms, term)
+        expanded = []
+        while position < len(self.terms) and self.terms[position].startswith(term):
+            expanded.append(self.terms[position])
+            position += 1
+        return expanded
+
+    # Function to score the documents containing one query word (best expansion for prefix words)
+    def score_term(self, term, prefix=False):
+        scores = {}
+        count = len(self.session_ids)
+        for expanded in self.expand(term, prefix):
+            postings = self.postings[expanded]
+            idf = math.log(1 + (count - len(postings) + .5) / (len(postings) + .5))
+            for document, frequency in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[document] / self.average_length)
+                score = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                if score > scores.get(document, 0):
+                    scores[document] = score
+        return scores
+
+    # Function to search French/Arabic words, e.g. "cuisine prépar*" (a trailing * matches any word starting with it).
+    # Returns up to limit (session_id, headword, score) tuples, best first; with require_all, every word must match.
+    def search(self, query, limit=20, require_all=True):
+        term_scores = []
+        for word in query.split():
+            prefix = word.endswith('*')
+            tokens = arabic_tokens(word.rstrip('*'))  # Also folds French accents
+            for position, token in enumerate(tokens):
+                term_scores.append(self.score_term(token, prefix and position == len(tokens) - 1))
+        if not term_scores:
+            return []
+
+        # Start from the rarest word, so intersections stay small
+        term_scores.sort(key=len)
+        totals = dict(term_scores[0])
+        for scores in term_scores[1:]:
+            if require_all:
+                totals = {document: total + scores[document] for document, total in totals.items() if document in scores}
+            else:
+                for document, score in scores.items():
+                    totals[document] = totals.get(document, 0) + score
+
+        best = heapq.nlargest(limit, totals.items(), key=lambda item: item[1])
+        return [(self.session_ids[document], self.headwords[document], score) for document, score in best]
+
+# Function to index every extracted entry
+def build_reverse_index(result_files=None):
+    return ReverseIndex.build(iter_result_records(default_result_files() if result_files is None else result_files))
+
+# Main execution
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the Tifinagh entries translated by French or Arabic words")
+    parser.add_argument("query", help='words to look for, e.g. "cuisine" or "طبخ", with a trailing * for a prefix')
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--any", action="store_true", help="rank entries matching any of the words, not only all of them")
+    args = parser.parse_args()
+
+    index = build_reverse_index()
+    for session_id, headword, score in index.search(args.query, args.limit, require_all=not args.any):
+        print(f"{score:6.2f}  {session_id}  {headword}")
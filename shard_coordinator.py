@@ -0,0 +1,349 @@
+from jsonl_results import JsonlResultWriter, iter_result_records, find_result_files
+from colorama import Fore, init
+import argparse
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# Default number of session IDs per shard and lease duration (seconds)
+DEFAULT_SHARD_SIZE = 10000
+DEFAULT_LEASE_SECONDS = 300
+
+INDEX_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "index.py")
+
+# Work queue on a directory shared by every worker (local disk or a network share):
+#   plan.json              the range and its shards, written once
+#   leases/<shard>.lease   claimed shard: {"worker", "expires"}, created with O_EXCL so only one worker gets it
+#   done/<shard>.done      completed shard
+#   shards/<shard>/        log folder and crawl journal of the shard
+# Lease expiry compares wall clocks: the hosts must be roughly in sync (well under the lease duration)
+class ShardQueue:
+    def __init__(self, folder):
+        self.folder = folder
+        self.plan_path = os.path.join(folder, "plan.json")
+        self.leases_folder = os.path.join(folder, "leases")
+        self.done_folder = os.path.join(folder, "done")
+        self.shards_folder = os.path.join(folder, "shards")
+
+    # Function to write the plan of a range, or check that it matches the existing one
+    def create_plan(self, start, end, shard_size=DEFAULT_SHARD_SIZE):
+        plan = {"start": start, "end": end, "shard_size": shard_size}
+        for folder in (self.folder, self.leases_folder, self.done_folder, self.shards_folder):
+            os.makedirs(folder, exist_ok=True)
+        try:
+            fd = os.open(self.plan_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            existing = self.load_plan()
+            if existing != plan:
+                raise ValueError(f"{self.folder} already holds another plan: {existing}")
+            return plan
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(plan, f)
+        return plan
+
+    def load_plan(self):
+        with open(self.plan_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    # Function to list the shards of the plan as (name, first session ID, end session ID excluded)
+    def shards(self):
+        plan = self.load_plan()
+        shards = []
+        for first in range(plan["start"], plan["end"], plan["shard_size"]):
+            end = min(first + plan["shard_size"], plan["end"])
+            shards.append((f"{first}-{end - 1}", first, end))
+        return shards
+
+    def lease_path(self, shard):
+        return os.path.join(self.leases_folder, f"{shard}.lease")
+
+    def done_path(self, shard):
+        return os.path.join(self.done_folder, f"{shard}.done")
+
+    def shard_folder(self, shard):
+        return os.path.join(self.shards_folder, shard)
+
+    def is_done(self, shard):
+        return os.path.exists(self.done_path(shard))
+
+    # Function to read a lease (None if there is none or it was being replaced)
+    def read_lease(self, shard):
+        try:
+            with open(self.lease_path(shard), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # Function to claim a shard: True if this worker now holds its lease
+    def claim(self, shard, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        if self.is_done(shard):
+            return False
+        path = self.lease_path(shard)
+        for _ in range(2):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self.reclaim_expired(shard, worker, lease_seconds):
+                    return False
+                continue  # The expired lease was moved aside, try again
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"worker": worker, "expires": time.time() + lease_seconds}, f)
+            if self.is_done(shard):  # Completed between the check and the claim
+                self.release(shard, worker)
+                return False
+            return True
+        return False
+
+    # Function to move an expired lease aside (a crashed worker): only one worker wins the rename.
+    # An unreadable lease is expired after lease_seconds, the lease duration of the workers.
+    def reclaim_expired(self, shard, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        path = self.lease_path(shard)
+        lease = self.read_lease(shard)
+        if lease is None:
+            # Unreadable: being written right now, or torn by a crash long ago
+            try:
+                if time.time() - os.path.getmtime(path) < lease_seconds:
+                    return False
+            except FileNotFoundError:
+                return True
+        elif lease["expires"] > time.time():
+            return False
+
+        aside = f"{path}.expired.{worker}"
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return True  # Another worker reclaimed it first
+        # Another worker may have renewed or re-created the lease since it was read: put a live one back
+        moved = self.read_lease_file(aside)
+        if moved is not None and moved != lease and moved["expires"] > time.time():
+            try:
+                os.link(aside, path)
+            except FileExistsError:
+                pass
+            os.remove(aside)
+            return False
+        os.remove(aside)
+        print(Fore.YELLOW + f"Reclaimed the expired lease of shard {shard}" + (f" from {lease['worker']}" if lease else ""))
+        return True
+
+    def read_lease_file(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    # Function to extend a lease held by this worker: False if it was lost (expired and reclaimed).
+    # The lease is renamed aside first, so a worker reclaiming it at the same time finds it gone instead of
+    # having its new lease overwritten, and the renewed lease is linked in place only if no other one was created.
+    def renew(self, shard, worker, lease_seconds=DEFAULT_LEASE_SECONDS):
+        path = self.lease_path(shard)
+        aside = f"{path}.renew.{worker}"
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return False  # Reclaimed by another worker
+        moved = self.read_lease_file(aside)
+        if moved is None or moved["worker"] != worker:
+            # Another worker's lease: put it back
+            try:
+                os.link(aside, path)
+            except FileExistsError:
+                pass
+            os.remove(aside)
+            return False
+        temp_path = f"{path}.{worker}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"worker": worker, "expires": time.time() + lease_seconds}, f)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            return False  # Claimed by another worker while the lease was aside
+        finally:
+            os.remove(temp_path)
+            os.remove(aside)
+        lease = self.read_lease(shard)
+        return lease is not None and lease["worker"] == worker
+
+    # Function to give a lease back so that another worker can claim the shard
+    def release(self, shard, worker):
+        lease = self.read_lease(shard)
+        if lease is not None and lease["worker"] == worker:
+            try:
+                os.remove(self.lease_path(shard))
+            except FileNotFoundError:
+                pass
+
+    # Function to mark a shard complete and drop its lease
+    def complete(self, shard, worker):
+        temp_path = f"{self.done_path(shard)}.{worker}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"worker": worker, "completed": time.time()}, f)
+        os.replace(temp_path, self.done_path(shard))
+        self.release(shard, worker)
+
+    # Function to describe every shard: done, leased (by whom, for how long) or pending
+    def status(self):
+        now = time.time()
+        for shard, first, end in self.shards():
+            if self.is_done(shard):
+                yield shard, "done", None
+                continue
+            lease = self.read_lease(shard)
+            if lease is None:
+                yield shard, "pending", None
+            elif lease["expires"] > now:
+                yield shard, "leased", f"{lease['worker']}, {lease['expires'] - now:.0f}s left"
+            else:
+                yield shard, "expired", lease["worker"]
+
+# Background thread renewing a lease every third of its duration while the shard runs
+class LeaseRenewer:
+    def __init__(self, queue, shard, worker, lease_seconds, on_lost):
+        self.queue = queue
+        self.shard = shard
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.on_lost = on_lost
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.lease_seconds / 3):
+            try:
+                renewed = self.queue.renew(self.shard, self.worker, self.lease_seconds)
+            except OSError as e:
+                print(Fore.RED + f"Could not renew the lease of shard {self.shard}: {e}")
+                continue  # Retried at the next renewal, the lease has not expired yet
+            if not renewed:
+                print(Fore.RED + f"Lost the lease of shard {self.shard}, stopping it")
+                self.lost = True
+                self.on_lost()
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+# Function to crawl one claimed shard with index.py, renewing its lease: True if it completed
+def run_shard(queue, shard, first, end, worker, lease_seconds, index_args):
+    folder = queue.shard_folder(shard)
+    command = [sys.executable, INDEX_SCRIPT, "--start", str(first), "--end", str(end),
+               "--log-folder", folder, "--journal", os.path.join(folder, "crawl_journal.tsv")] + index_args
+    process = subprocess.Popen(command)
+    renewer = LeaseRenewer(queue, shard, worker, lease_seconds, on_lost=process.terminate).start()
+    try:
+        returncode = process.wait()
+    except KeyboardInterrupt:
+        process.terminate()
+        process.wait()
+        raise
+    finally:
+        renewer.stop()
+    return returncode == 0 and not renewer.lost
+
+# Function to claim and crawl shards until none is left (with wait, also wait for other workers' leases to complete or expire)
+def work(queue, worker, lease_seconds=DEFAULT_LEASE_SECONDS, index_args=(), wait=False):
+    failed = set()  # Shards that failed in this worker, left to the others
+    completed = 0
+    while True:
+        claimed_any = False
+        for shard, first, end in queue.shards():
+            if queue.is_done(shard):
+                continue
+            if shard in failed or not queue.claim(shard, worker, lease_seconds):
+                continue
+            claimed_any = True
+            print(Fore.CYAN + f"{worker} crawling shard {shard}")
+            try:
+                succeeded = run_shard(queue, shard, first, end, worker, lease_seconds, list(index_args))
+            except KeyboardInterrupt:
+                queue.release(shard, worker)
+                raise
+            if succeeded:
+                queue.complete(shard, worker)
+                completed += 1
+                print(Fore.GREEN + f"Shard {shard} complete")
+            else:
+                queue.release(shard, worker)
+                failed.add(shard)
+                print(Fore.RED + f"Shard {shard} failed, released for another worker")
+        remaining = [shard for shard, _, _ in queue.shards() if not queue.is_done(shard)]
+        if not remaining or (not claimed_any and not wait):
+            return completed, len(remaining)
+        if not claimed_any:
+            if set(remaining) <= failed:
+                return completed, len(remaining)  # Only shards this worker already failed are left
+            time.sleep(min(lease_seconds / 2, 30))
+
+# Function to merge the outputs of every shard, in shard order then session ID order, into one folder
+# (the same shard outputs always give the same files, whichever worker crawled them and in which order)
+def merge(queue, output_folder, compress=False):
+    incomplete = [shard for shard, _, _ in queue.shards() if not queue.is_done(shard)]
+    temp_folder = f"{output_folder.rstrip('/')}.tmp"
+    shutil.rmtree(temp_folder, ignore_errors=True)
+    merged = 0
+    with JsonlResultWriter(temp_folder, compress=compress) as writer:
+        for shard, _, _ in queue.shards():
+            # A retried session may appear more than once: the last record wins, as in the journal
+            records = dict(iter_result_records(find_result_files(queue.shard_folder(shard))))
+            for session_id in sorted(records, key=int):
+                writer.write({session_id: records[session_id]})
+            merged += len(records)
+    shutil.rmtree(output_folder, ignore_errors=True)
+    os.replace(temp_folder, output_folder)
+    return merged, incomplete
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Split a session ID range into shards that several processes or hosts crawl from a shared queue folder")
+    parser.add_argument("--queue", required=True, help="queue folder shared by the workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init_parser = commands.add_parser("init", help="split a range into shards")
+    init_parser.add_argument("--start", type=int, required=True, help="first session ID")
+    init_parser.add_argument("--end", type=int, required=True, help="session ID to stop at (excluded)")
+    init_parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="session IDs per shard")
+
+    work_parser = commands.add_parser("work", help="claim and crawl shards until none is left; arguments after -- go to index.py")
+    work_parser.add_argument("--worker", default=f"{socket.gethostname()}-{os.getpid()}", help="worker name written in the leases")
+    work_parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="lease duration in seconds, renewed every third of it")
+    work_parser.add_argument("--wait", action="store_true", help="keep waiting for the shards leased by other workers, to take them over if they expire")
+    work_parser.add_argument("index_args", nargs=argparse.REMAINDER, help="options passed to index.py, e.g. -- --engine async --concurrency 32")
+
+    commands.add_parser("status", help="show the state of every shard")
+
+    merge_parser = commands.add_parser("merge", help="merge the shard outputs into one folder of JSONL shards")
+    merge_parser.add_argument("--output", help="output folder (default: <queue>/merged)")
+    merge_parser.add_argument("--gzip", action="store_true", help="gzip the merged shards")
+    args = parser.parse_args()
+
+    queue = ShardQueue(args.queue)
+    if args.command == "init":
+        plan = queue.create_plan(args.start, args.end, args.shard_size)
+        print(Fore.GREEN + f"{len(queue.shards())} shards of {plan['shard_size']} session IDs in {args.queue}")
+    elif args.command == "work":
+        index_args = args.index_args[1:] if args.index_args[:1] == ["--"] else args.index_args
+        completed, pending = work(queue, args.worker, args.lease, index_args, args.wait)
+        print(Fore.GREEN + f"{args.worker} completed {completed} shards, {pending} not done")
+    elif args.command == "status":
+        for shard, state, detail in queue.status():
+            print(f"{shard:>24} {state:8} {detail or ''}")
+    else:
+        output_folder = args.output or os.path.join(args.queue, "merged")
+        merged, incomplete = merge(queue, output_folder, compress=args.gzip)
+        if incomplete:
+            print(Fore.YELLOW + f"{len(incomplete)} shards not complete yet, merged what they extracted so far: {', '.join(incomplete)}")
+        print(Fore.GREEN + f"Merged {merged} entries into {output_folder}")
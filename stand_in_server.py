@@ -0,0 +1,353 @@
+from abbreviation_mapper import MORPH_ABBREVIATIONS, POS_ABBREVIATIONS
+from jsonl_results import iter_result_records, default_result_files
+from fuzzy_search import TIFINAGH_LETTERS, tifinagh_to_latin
+from html_cache import HtmlCache
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from collections import Counter
+from html import escape
+from colorama import Fore, init
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+# Reverse abbreviation tables to render labels the way the site displays them
+POS_LABELS = {abbrev: label for label, abbrev in POS_ABBREVIATIONS.items()}
+MORPH_LABELS = {abbrev: label for label, abbrev in MORPH_ABBREVIATIONS.items()}
+
+# Page served for session IDs that do not exist (what the real site returns)
+PHP_ERROR_PAGE = """<html><body>
+<div style="border:1px solid #990000;padding-left:20px;margin:0 0 10px 0;">
+<h4>A PHP Error was encountered</h4>
+<p>Severity: Notice</p>
+<p>Message:  Trying to get property of non-object</p>
+</div>
+</body></html>"""
+
+# Folder of the crawler, holding extracted_data.json and logs/ (the server may be started from another folder)
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Function to load extracted entries from the result files to replay
+def load_entries(root=ROOT):
+    return dict(iter_result_records(default_result_files(os.path.join(root, "logs"))))
+
+# Function to turn an abbreviation back into its displayed label (unmatched labels are kept as-is)
+def display_label(labels, abbrev):
+    return labels[abbrev].capitalize() if abbrev in labels else abbrev
+
+# Function to render a result page for an extracted entry
+def render_result_page(entry):
+    pos_text = " et ".join(display_label(POS_LABELS, pos) for pos in entry["pos"])
+    variants = ", ".join(entry["var"])
+    lines = [
+        "<html><head><meta charset=\"utf-8\"></head><body>",
+        "<section class=\"ddoc_funfact_detail_haut\"><div class=\"result\">",
+        f"<h5 class=\"titreamz\"><b>{escape(entry['mw'])}</b> <i>[{escape(entry['tr'])}]</i> {escape(pos_text)} {escape(variants)}</h5>",
+    ]
+
+    # Morphology list
+    if entry["morph"]:
+        lines.append("<ul class=\"titreamz\">")
+        for form in entry["morph"]:
+            for key, values in form.items():
+                label = display_label(MORPH_LABELS, key)
+                lines.append(f"<li>{escape(label)} : <b>{escape(', '.join(values))}</b></li>")
+        lines.append("</ul>")
+
+    # Senses list
+    lines.append("<ul>")
+    for number, sense in enumerate(entry["sens"], start=1):
+        lines.append(f"<li><span>Sens {number}</span> {escape(', '.join(sense['fr']))}<br>{escape('، '.join(sense['ar']))}</li>")
+    lines.append("</ul>")
+
+    # Related phrases list
+    if entry["rp"]:
+        lines.append("<ul>")
+        for phrase in entry["rp"]:
+            lines.append(f"<li><b>{escape(phrase['zgh'])}</b><br>{escape(phrase['fr'])}<br>{escape(phrase['ar'])}</li>")
+        lines.append("</ul>")
+
+    lines.append("</div></section></body></html>")
+    return "\n".join(lines)
+
+# Page with the result section but without the result div
+NO_RESULT_PAGE = """<html><body>
+<section class="ddoc_funfact_detail_haut"><div class="message">Aucun résultat</div></section>
+</body></html>"""
+
+# Session IDs saved as HTML fixtures: the README samples and pages with many related phrases,
+# several variants or POS tags, unmatched morphology labels, verbs and no senses
+FIXTURE_SESSION_IDS = ["134417", "147756", "142203", "136591", "138080", "135105", "132336",
+                       "141919", "141018", "143055", "130402", "129573", "129496", "130218", "130194", "144265"]
+
+# Function to save rendered result pages (plus a PHP error and a missing result page) as fixtures
+def write_fixtures(entries, folder="fixtures", session_ids=FIXTURE_SESSION_IDS):
+    os.makedirs(folder, exist_ok=True)
+    pages = {f"{session_id}.html": render_result_page(entries[session_id]) for session_id in session_ids if session_id in entries}
+    pages["php_error.html"] = PHP_ERROR_PAGE
+    pages["no_result.html"] = NO_RESULT_PAGE
+    for filename, html in pages.items():
+        with open(os.path.join(folder, filename), 'w', encoding='utf-8') as f:
+            f.write(html)
+    return len(pages)
+
+# Function to load recorded pages to replay: a raw HTML cache folder (with its index.tsv) or a folder of <session_id>.html files
+def load_recorded_pages(folder):
+    if os.path.exists(os.path.join(folder, "index.tsv")):
+        return HtmlCache(folder)  # Read from disk on each request
+    pages = {}
+    for path in glob.glob(os.path.join(folder, "*.html")):
+        session_id = os.path.splitext(os.path.basename(path))[0]
+        if session_id.isdigit():
+            with open(path, encoding='utf-8') as f:
+                pages[session_id] = f.read()
+    return pages
+
+# Function to make up an entry for a session ID, always the same for the same ID: a random Tifinagh headword
+# with the senses, morphology and related phrases of one of the templates (the extracted entries, in session ID order),
+# so the pages have realistic sizes
+def synthesize_entry(session_id, templates):
+    rng = random.Random(int(session_id) if session_id.isdigit() else session_id)
+    letters = sorted(TIFINAGH_LETTERS)
+    headword = ''.join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+    if templates:
+        template = rng.choice(templates)
+    else:
+        template = {"pos": ["n"], "var": [], "morph": [], "sens": [{"fr": ["mot"], "ar": ["كلمة"]}], "rp": []}
+    return dict(template, mw=headword, tr=tifinagh_to_latin(headword))
+
+# Latency distributions of --latency, as name: (parameters, function drawing seconds from a random generator)
+LATENCY_DISTRIBUTIONS = {
+    "fixed": (1, lambda rng, seconds: seconds),
+    "uniform": (2, lambda rng, low, high: rng.uniform(low, high)),
+    "exponential": (1, lambda rng, mean: rng.expovariate(1 / mean)),
+    "lognormal": (2, lambda rng, median, sigma: rng.lognormvariate(math.log(median), sigma)),
+}
+
+# Function to parse a latency distribution argument, e.g. "lognormal:0.2,0.6" (median 200 ms, long tail)
+def parse_latency(text):
+    name, _, parameters = text.partition(":")
+    try:
+        count, _ = LATENCY_DISTRIBUTIONS[name]
+        values = tuple(float(value) for value in parameters.split(","))
+    except (KeyError, ValueError):
+        raise argparse.ArgumentTypeError(f"expected one of {', '.join(LATENCY_DISTRIBUTIONS)} with its parameters, e.g. lognormal:0.2,0.6")
+    if len(values) != count or min(values) < 0:
+        raise argparse.ArgumentTypeError(f"{name} takes {count} non-negative parameter(s)")
+    if name in ("exponential", "lognormal") and values[0] == 0:
+        raise argparse.ArgumentTypeError(f"the {'mean' if name == 'exponential' else 'median'} of {name} must be positive")
+    if name == "uniform" and values[0] > values[1]:
+        raise argparse.ArgumentTypeError("uniform takes LOW,HIGH with LOW <= HIGH")
+    return name, values
+
+# Function to parse a fault injection rate
+def parse_rate(text):
+    rate = float(text)
+    if not 0 <= rate <= 1:
+        raise argparse.ArgumentTypeError("expected a rate between 0 and 1")
+    return rate
+
+# Function to tell the outcome a crawler should record for a served page
+def page_outcome(html):
+    if "A PHP Error was encountered" in html:
+        return "php_error"
+    if 'class="result"' not in html:
+        return "no_result"
+    return "ok"
+
+# Counts of the responses served, and the (kind, expected outcome) of the last response of each session
+class StandInStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.responses = Counter()
+        self.sessions = {}
+        self.attempts = Counter()
+
+    # Function to number the requests of a session (1 for the first)
+    def next_attempt(self, session_id):
+        with self.lock:
+            self.attempts[session_id] += 1
+            return self.attempts[session_id]
+
+    def record(self, session_id, kind, outcome):
+        with self.lock:
+            self.responses[kind] += 1
+            self.sessions[session_id] = (kind, outcome)
+
+    def to_json(self, sessions=False):
+        with self.lock:
+            data = {"requests": sum(self.responses.values()), "responses": dict(self.responses)}
+            if sessions:
+                data["sessions"] = dict(self.sessions)
+        return json.dumps(data)
+
+# Request handler answering /dglai/search/indexs?session=<id> like the real site, and /stand-in/stats
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    entries = {}
+    templates = []
+    recorded = []
+    synthesize_rate = 0.0
+    connect_delay = 0.0
+    delay = 0.0
+    latency = None
+    etag = False
+
+    # Fault injection: shares of the requests answered with a 5xx, a PHP error page or a page without div.result
+    server_error_rate = 0.0
+    server_error_status = 503
+    php_error_rate = 0.0
+    no_result_rate = 0.0
+    seed = None
+    stats = StandInStats()
+
+    # Simulate connection setup cost (TCP/TLS handshake) once per connection
+    def setup(self):
+        super().setup()
+        if self.connect_delay:
+            time.sleep(self.connect_delay)
+
+    # Function to find the page of a session: recorded, rendered from its entry, synthesized, or the PHP error page
+    def find_page(self, session_id):
+        for pages in self.recorded:
+            html = pages.get(session_id)
+            if html is not None:
+                return "recorded", html
+        entry = self.entries.get(session_id)
+        if entry:
+            return "entry", render_result_page(entry)
+        if self.synthesize_rate and session_id.isdigit() and random.Random(-int(session_id)).random() < self.synthesize_rate:
+            return "synthesized", render_result_page(synthesize_entry(session_id, self.templates))
+        return "php_error", PHP_ERROR_PAGE
+
+    # Function to get the random draws of a request: with a seed, they only depend on it, the session ID and the attempt
+    # number, not on the order in which the handler threads serve the requests
+    def request_rng(self, session_id):
+        if self.seed is None:
+            return random.Random()
+        return random.Random(f"{self.seed}:{session_id}:{self.stats.next_attempt(session_id)}")
+
+    def send_body(self, status, body, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/stand-in/stats":
+            body = self.stats.to_json("sessions" in parse_qs(url.query, keep_blank_values=True)).encode('utf-8')
+            self.send_body(200, body, [("Content-Type", "application/json")])
+            return
+
+        session_id = parse_qs(url.query).get("session", [""])[0]
+        rng = self.request_rng(session_id)
+        wait = self.delay
+        if self.latency:
+            name, parameters = self.latency
+            wait += LATENCY_DISTRIBUTIONS[name][1](rng, *parameters)
+        if wait:
+            time.sleep(wait)
+
+        # Injected faults, drawn for every request (a retry may succeed)
+        draw = rng.random()
+        if draw < self.server_error_rate:
+            self.stats.record(session_id, "server_error", f"http_{self.server_error_status}")
+            self.send_body(self.server_error_status, b"Service Unavailable", [("Content-Type", "text/plain")])
+            return
+        draw -= self.server_error_rate
+        if draw < self.php_error_rate:
+            kind, html = "injected_php_error", PHP_ERROR_PAGE
+        elif draw - self.php_error_rate < self.no_result_rate:
+            kind, html = "injected_no_result", NO_RESULT_PAGE
+        else:
+            kind, html = self.find_page(session_id)
+        body = html.encode('utf-8')
+
+        # Conditional requests, when enabled: answer 304 without a body if the page did not change
+        headers = [("Content-Type", "text/html; charset=utf-8")]
+        if self.etag:
+            etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.stats.record(session_id, "not_modified", page_outcome(html))
+                self.send_body(304, b"", [("ETag", etag)])
+                return
+            headers.append(("ETag", etag))
+        self.stats.record(session_id, kind, page_outcome(html))
+        self.send_body(200, body, headers)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to start the stand-in server (returns the server, call serve_forever on it).
+# recorded: folders of pages to replay first; synthesize_rate: share of the other session IDs given a made-up entry;
+# latency: (distribution, parameters) added to delay; rates are shares of the requests answered with each fault.
+def create_server(host="127.0.0.1", port=8000, entries=None, connect_delay=0.0, delay=0.0, etag=False, recorded=(),
+                  synthesize_rate=0.0, latency=None, server_error_rate=0.0, server_error_status=503, php_error_rate=0.0,
+                  no_result_rate=0.0, seed=None):
+    if server_error_rate + php_error_rate + no_result_rate > 1:
+        raise ValueError("The fault injection rates add up to more than 1")
+    entries = load_entries() if entries is None else entries
+    handler = type("ConfiguredStandInHandler", (StandInHandler,), {
+        "entries": entries,
+        "templates": [entries[session_id] for session_id in sorted(entries, key=int)],
+        "recorded": [load_recorded_pages(folder) for folder in recorded],
+        "synthesize_rate": synthesize_rate,
+        "connect_delay": connect_delay,
+        "delay": delay,
+        "latency": latency,
+        "etag": etag,
+        "server_error_rate": server_error_rate,
+        "server_error_status": server_error_status,
+        "php_error_rate": php_error_rate,
+        "no_result_rate": no_result_rate,
+        "seed": seed,
+        "stats": StandInStats(),
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+# Main execution
+if __name__ == "__main__":
+    init(autoreset=True)
+    parser = argparse.ArgumentParser(description="Local stand-in for the IRCAM dictionary site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--connect-delay", type=float, default=0.05, help="seconds added once per new connection")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--latency", type=parse_latency, metavar="DIST:PARAMS",
+                        help="random latency added to every request: fixed:S, uniform:LOW,HIGH, exponential:MEAN or lognormal:MEDIAN,SIGMA (seconds)")
+    parser.add_argument("--etag", action="store_true", help="send ETags and answer conditional requests with 304 Not Modified")
+    parser.add_argument("--replay", action="append", default=[], metavar="FOLDER",
+                        help="replay recorded pages first: a raw HTML cache folder or a folder of <session_id>.html files (repeatable)")
+    parser.add_argument("--synthesize", type=parse_rate, default=0.0, metavar="RATE",
+                        help="share of the session IDs without a page given a made-up entry (1: every ID), instead of a PHP error")
+    parser.add_argument("--server-error-rate", type=parse_rate, default=0.0, help="share of the requests answered with --server-error-status")
+    parser.add_argument("--server-error-status", type=int, default=503)
+    parser.add_argument("--php-error-rate", type=parse_rate, default=0.0, help="share of the requests answered with a PHP error page")
+    parser.add_argument("--no-result-rate", type=parse_rate, default=0.0, help="share of the requests answered with a page without div.result")
+    parser.add_argument("--seed", type=int, help="seed of the latency and fault draws, made per session ID and attempt")
+    parser.add_argument("--write-fixtures", metavar="FOLDER", help="save the fixture pages to FOLDER and exit")
+    args = parser.parse_args()
+
+    if args.write_fixtures:
+        print(Fore.GREEN + f"Saved {write_fixtures(load_entries(), args.write_fixtures)} fixture pages to {args.write_fixtures}")
+        raise SystemExit
+
+    try:
+        server = create_server(args.host, args.port, connect_delay=args.connect_delay, delay=args.delay, etag=args.etag, recorded=args.replay,
+                               synthesize_rate=args.synthesize, latency=args.latency, server_error_rate=args.server_error_rate,
+                               server_error_status=args.server_error_status, php_error_rate=args.php_error_rate,
+                               no_result_rate=args.no_result_rate, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    recorded = sum(len(pages) for pages in server.RequestHandlerClass.recorded)
+    print(Fore.GREEN + f"Serving {len(server.RequestHandlerClass.entries)} entries and {recorded} recorded pages on http://{args.host}:{args.port}/dglai/search/indexs")
+    server.serve_forever()
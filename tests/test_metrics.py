@@ -0,0 +1,22 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import MetricsRegistry
+
+# A status label holds HTTP codes (ints) and exception names (strings) in the same run
+def test_mixed_label_values_export():
+    registry = MetricsRegistry()
+    registry.increment("http_responses_total", status=200)
+    registry.increment("http_responses_total", status="ReadTimeout")
+    registry.increment("http_responses_total", status=200)
+    registry.observe("http_request_seconds", 0.1, status=404)
+    registry.observe("http_request_seconds", 0.2, status="ConnectionError")
+
+    text = registry.to_prometheus()
+    assert 'http_responses_total{status="200"} 2' in text
+    assert 'http_responses_total{status="ReadTimeout"} 1' in text
+    counters = {counter["labels"]["status"]: counter["value"] for counter in json.loads(registry.to_json())["counters"]}
+    assert counters == {"200": 2, "ReadTimeout": 1}